@@ -6,6 +6,8 @@ Developed by Jinyuan Sun and Yifan Deng.
 import sys
 import subprocess
 import json
+import threading
+import time
 import urllib.request
 from importlib import metadata
 from packaging import version
@@ -111,6 +113,169 @@ if str(PACKAGE_ROOT) not in sys.path:
 pymolfold.plugin.__init_plugin__()
 
 
+TERMINAL_STATES = ("loaded", "done", "failed", "cancelled")
+
+
+class _JobSignals(QtCore.QObject):
+    """Emitted from pool threads; Qt queues the slots onto the GUI thread."""
+
+    status = QtCore.Signal(int, str, str)  # job key, status, message
+
+
+class _JobRunnable(QtCore.QRunnable):
+    def __init__(self, manager, key, fn):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.manager = manager
+        self.key = key
+        self.fn = fn
+
+    def run(self):
+        from pymolfold.background import RUNNER
+        from pymolfold.jobs import JOBS
+
+        manager = self.manager
+        if not manager.mark_started(self.key):
+            return  # cancelled while queued
+        try:
+            outcome = self.fn()
+            # Prediction commands return the id of a background job (a list of
+            # ids for FASTA input); follow them until their results are loaded
+            job_ids = outcome if isinstance(outcome, list) else [outcome]
+            job_ids = [i for i in job_ids if isinstance(i, str) and JOBS.get(i)]
+            if not job_ids:
+                status, message = "done", ""
+            else:
+                manager.attach(self.key, job_ids)
+                finished = []
+                for job_id in job_ids:
+                    finished.append(RUNNER.wait(job_id))
+                    if len(job_ids) > 1:
+                        progress = f"{len(finished)}/{len(job_ids)} finished"
+                        manager.signals.status.emit(self.key, "running", progress)
+                loaded = sum(1 for job in finished if job and job.state == "loaded")
+                if len(job_ids) == 1 and finished[0] is not None:
+                    status, message = finished[0].state, finished[0].message
+                else:
+                    status = "loaded" if loaded == len(job_ids) else "done"
+                    status = "failed" if loaded == 0 else status
+                    message = f"{loaded}/{len(job_ids)} loaded"
+        except Exception as e:
+            status, message = "failed", str(e)
+        manager.signals.status.emit(self.key, status, message)
+
+
+class DialogJobManager(QtCore.QObject):
+    """Bounded, cancellable queue of the dialog's actions on a QThreadPool.
+
+    At most ``max_concurrent`` actions run at a time; the rest wait in the
+    pool's queue. Status updates arrive through ``changed`` on the GUI thread.
+    """
+
+    changed = QtCore.Signal()
+    message = QtCore.Signal(str)
+
+    def __init__(self, max_concurrent=2, parent=None):
+        super().__init__(parent)
+        self.pool = QtCore.QThreadPool()
+        self.pool.setMaxThreadCount(max_concurrent)
+        self.signals = _JobSignals()
+        self.signals.status.connect(self._on_status)
+        self.jobs = {}
+        self._runnables = {}
+        self._lock = threading.Lock()
+        self._next_key = 0
+
+    def set_max_concurrent(self, value):
+        self.pool.setMaxThreadCount(max(1, int(value)))
+
+    def submit(self, kind, name, fn):
+        with self._lock:
+            key = self._next_key
+            self._next_key += 1
+            self.jobs[key] = {
+                "kind": kind,
+                "name": name,
+                "status": "queued",
+                "message": "",
+                "submitted": time.time(),
+                "started": None,
+                "finished": None,
+                "runner_ids": [],
+            }
+        runnable = _JobRunnable(self, key, fn)
+        self._runnables[key] = runnable
+        self.pool.start(runnable)
+        self.message.emit(f"[{kind}] {name}: queued")
+        self.changed.emit()
+        return key
+
+    def mark_started(self, key):
+        """Called from the pool thread; False if the job was cancelled"""
+        with self._lock:
+            job = self.jobs.get(key)
+            if job is None or job["status"] != "queued":
+                return False
+            job["status"] = "running"
+            job["started"] = time.time()
+        self.signals.status.emit(key, "running", "")
+        return True
+
+    def attach(self, key, runner_ids):
+        """Remember the background jobs a pool thread is following"""
+        with self._lock:
+            self.jobs[key]["runner_ids"] = list(runner_ids)
+
+    def cancel(self, key):
+        from pymolfold.background import RUNNER
+
+        with self._lock:
+            job = self.jobs.get(key)
+            if job is None or job["status"] in TERMINAL_STATES:
+                return False
+            status, runner_ids = job["status"], job["runner_ids"]
+            if status == "queued":
+                job["status"] = "cancelled"
+        if status == "queued":
+            runnable = self._runnables.get(key)
+            if runnable is not None and hasattr(self.pool, "tryTake"):
+                self.pool.tryTake(runnable)
+            self._on_status(key, "cancelled", "Cancelled before start")
+            return True
+        if runner_ids:
+            return any([RUNNER.cancel(i) for i in runner_ids])
+        self.message.emit(f"Job {key} cannot be cancelled while running")
+        return False
+
+    def clear_finished(self):
+        with self._lock:
+            finished = [k for k, j in self.jobs.items() if j["status"] in TERMINAL_STATES]
+            for key in finished:
+                del self.jobs[key]
+                self._runnables.pop(key, None)
+        self.changed.emit()
+
+    def elapsed(self, job):
+        if job["started"] is None:
+            return 0.0
+        return (job["finished"] or time.time()) - job["started"]
+
+    def _on_status(self, key, status, message):
+        with self._lock:
+            job = self.jobs.get(key)
+            if job is None:
+                return
+            if job["status"] in TERMINAL_STATES and status != job["status"]:
+                return
+            job["status"] = status
+            job["message"] = message
+            if status in TERMINAL_STATES:
+                job["finished"] = time.time()
+                self._runnables.pop(key, None)
+        self.message.emit(f"[{job['kind']}] {job['name']}: {status} {message}".rstrip())
+        self.changed.emit()
+
+
 class PymolFoldDialog(QtWidgets.QDialog):
     """
     Qt-based GUI front-end for the PymolFold command-line plugin.
@@ -121,8 +286,9 @@ class PymolFoldDialog(QtWidgets.QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle("PymolFold – Structure Prediction")
-        self.resize(700, 500)
+        self.resize(700, 650)
 
+        self.jobs = DialogJobManager(max_concurrent=2, parent=self)
         self._build_ui()
         self._connect_signals()
 
@@ -145,10 +311,18 @@ class PymolFoldDialog(QtWidgets.QDialog):
         pred_layout = QtWidgets.QGridLayout(pred_widget)
 
         row = 0
-        pred_layout.addWidget(QtWidgets.QLabel("Amino acid sequence:"), row, 0, 1, 3)
+        pred_layout.addWidget(
+            QtWidgets.QLabel("Amino acid sequence, FASTA text or FASTA file path:"),
+            row,
+            0,
+            1,
+            3,
+        )
         row += 1
         self.seq_edit = QtWidgets.QPlainTextEdit()
-        self.seq_edit.setPlaceholderText("Enter amino acid sequence here…")
+        self.seq_edit.setPlaceholderText(
+            "Enter an amino acid sequence, or several as FASTA (>id lines)…"
+        )
         self.seq_edit.setTabChangesFocus(True)
         pred_layout.addWidget(self.seq_edit, row, 0, 1, 3)
 
@@ -156,7 +330,7 @@ class PymolFoldDialog(QtWidgets.QDialog):
         pred_layout.addWidget(QtWidgets.QLabel("Name (optional):"), row, 0)
         self.name_edit = QtWidgets.QLineEdit()
         self.name_edit.setPlaceholderText(
-            "If empty, name will be derived from sequence"
+            "If empty, derived from the sequence (group name for FASTA input)"
         )
         pred_layout.addWidget(self.name_edit, row, 1, 1, 2)
 
@@ -261,6 +435,36 @@ class PymolFoldDialog(QtWidgets.QDialog):
 
         tabs.addTab(settings_widget, "Settings")
 
+        # --- Jobs ---
+        jobs_box = QtWidgets.QGroupBox("Jobs")
+        jobs_layout = QtWidgets.QVBoxLayout(jobs_box)
+        self.jobs_table = QtWidgets.QTableWidget(0, 5)
+        self.jobs_table.setHorizontalHeaderLabels(
+            ["Job", "Name", "Status", "Elapsed", "Result"]
+        )
+        self.jobs_table.horizontalHeader().setStretchLastSection(True)
+        self.jobs_table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.jobs_table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        jobs_layout.addWidget(self.jobs_table)
+
+        jobs_buttons = QtWidgets.QHBoxLayout()
+        jobs_buttons.addWidget(QtWidgets.QLabel("Max concurrent:"))
+        self.max_jobs_spin = QtWidgets.QSpinBox()
+        self.max_jobs_spin.setRange(1, 16)
+        self.max_jobs_spin.setValue(self.jobs.pool.maxThreadCount())
+        jobs_buttons.addWidget(self.max_jobs_spin)
+        jobs_buttons.addStretch()
+        self.cancel_job_btn = QtWidgets.QPushButton("Cancel selected")
+        jobs_buttons.addWidget(self.cancel_job_btn)
+        self.clear_jobs_btn = QtWidgets.QPushButton("Clear finished")
+        jobs_buttons.addWidget(self.clear_jobs_btn)
+        jobs_layout.addLayout(jobs_buttons)
+        layout.addWidget(jobs_box)
+
+        # Refresh elapsed times of running jobs
+        self.jobs_timer = QtCore.QTimer(self)
+        self.jobs_timer.setInterval(1000)
+
         # --- Log output ---
         self.log_edit = QtWidgets.QPlainTextEdit()
         self.log_edit.setReadOnly(True)
@@ -285,6 +489,14 @@ class PymolFoldDialog(QtWidgets.QDialog):
         self.set_api_btn.clicked.connect(self.on_set_api_key)
         self.open_webui_btn.clicked.connect(self.on_open_webui)
 
+        self.cancel_job_btn.clicked.connect(self.on_cancel_jobs)
+        self.clear_jobs_btn.clicked.connect(self.jobs.clear_finished)
+        self.max_jobs_spin.valueChanged.connect(self.jobs.set_max_concurrent)
+        self.jobs.changed.connect(self._refresh_jobs_table)
+        self.jobs.message.connect(self.append_log)
+        self.jobs_timer.timeout.connect(self._refresh_jobs_table)
+        self.jobs_timer.start()
+
         self.predictor_combo.currentIndexChanged.connect(self._on_predictor_changed)
         self._on_predictor_changed(self.predictor_combo.currentIndex())
 
@@ -296,6 +508,29 @@ class PymolFoldDialog(QtWidgets.QDialog):
             self.log_edit.verticalScrollBar().maximum()
         )
 
+    def _refresh_jobs_table(self):
+        jobs = list(self.jobs.jobs.items())
+        self.jobs_table.setRowCount(len(jobs))
+        for row, (key, job) in enumerate(jobs):
+            values = [
+                f"{key} {job['kind']}",
+                job["name"],
+                job["status"],
+                f"{self.jobs.elapsed(job):.0f} s",
+                job["message"],
+            ]
+            for col, value in enumerate(values):
+                item = QtWidgets.QTableWidgetItem(value)
+                item.setData(QtCore.Qt.UserRole, key)
+                self.jobs_table.setItem(row, col, item)
+
+    def on_cancel_jobs(self):
+        rows = {index.row() for index in self.jobs_table.selectedIndexes()}
+        for row in rows:
+            item = self.jobs_table.item(row, 0)
+            if item is not None:
+                self.jobs.cancel(item.data(QtCore.Qt.UserRole))
+
     def _on_predictor_changed(self, idx: int):
         """Enable/disable ESM-3 specific settings."""
         is_esm3 = self.predictor_combo.currentText() == "ESM-3"
@@ -316,39 +551,40 @@ class PymolFoldDialog(QtWidgets.QDialog):
         name = self.name_edit.text().strip() or None
         predictor = self.predictor_combo.currentText()
 
-        self.append_log(f"Starting prediction with {predictor}…")
-
-        # Run in a background thread so the GUI doesn't freeze.
-        def worker():
-            try:
-                if predictor == "ESM-3":
-                    temperature = float(self.temp_spin.value())
-                    num_steps = int(self.num_steps_spin.value())
-                    model_name = (
-                        self.model_name_edit.text().strip() or "esm3-medium-2024-08"
-                    )
-                    self.append_log("Calling query_esm3(...)")
-                    pymolfold.plugin.query_esm3(
-                        sequence=seq,
-                        name=name,
-                        temperature=temperature,
-                        num_steps=num_steps,
-                        model_name=model_name,
-                    )
-                elif predictor == "ESMFold":
-                    self.append_log("Calling query_esmfold(...)")
-                    pymolfold.plugin.query_esmfold(sequence=seq, name=name)
-                else:
-                    self.append_log("Calling query_boltz_monomer(...)")
-                    pymolfold.plugin.query_boltz_monomer(sequence=seq, name=name)
+        if predictor == "ESM-3":
+            temperature = float(self.temp_spin.value())
+            num_steps = int(self.num_steps_spin.value())
+            model_name = self.model_name_edit.text().strip() or "esm3-medium-2024-08"
+
+            def run():
+                return pymolfold.plugin.query_esm3(
+                    sequence=seq,
+                    name=name,
+                    temperature=temperature,
+                    num_steps=num_steps,
+                    model_name=model_name,
+                )
 
-                self.append_log("Prediction finished. Check PyMOL viewer and console.")
-            except Exception as e:
-                self.append_log(f"Error: {e}")
+        elif predictor == "ESMFold":
 
-        import threading
+            def run():
+                return pymolfold.plugin.query_esmfold(sequence=seq, name=name)
 
-        threading.Thread(target=worker, daemon=True).start()
+        else:
+
+            def run():
+                return pymolfold.plugin.query_boltz_monomer(sequence=seq, name=name)
+
+        try:
+            records = pymolfold.utils.read_fasta_input(seq)
+        except OSError as e:
+            QtWidgets.QMessageBox.warning(self, "Cannot read FASTA file", str(e))
+            return
+        if records is not None:
+            label = f"{name or 'fasta'} ({len(records)} sequences)"
+        else:
+            label = name or seq[:10]
+        self.jobs.submit(predictor, label, run)
 
     def on_fetch_af(self):
         uniprot_id = self.af_uniprot_edit.text().strip()
@@ -358,18 +594,9 @@ class PymolFoldDialog(QtWidgets.QDialog):
             )
             return
 
-        self.append_log(f"Fetching AlphaFold model for {uniprot_id}…")
-
-        def worker():
-            try:
-                pymolfold.plugin.fetch_af(uniprot_id)
-                self.append_log("AlphaFold model loaded into PyMOL.")
-            except Exception as e:
-                self.append_log(f"Error fetching AF model: {e}")
-
-        import threading
-
-        threading.Thread(target=worker, daemon=True).start()
+        self.jobs.submit(
+            "AlphaFold", uniprot_id, lambda: pymolfold.plugin.fetch_af(uniprot_id)
+        )
 
     def on_fetch_am(self):
         name = self.am_name_edit.text().strip()
@@ -379,18 +606,9 @@ class PymolFoldDialog(QtWidgets.QDialog):
             )
             return
 
-        self.append_log(f"Fetching AlphaMissense structure for {name}…")
-
-        def worker():
-            try:
-                pymolfold.plugin.query_am_hegelab(name)
-                self.append_log("AlphaMissense structure loaded into PyMOL.")
-            except Exception as e:
-                self.append_log(f"Error fetching AlphaMissense structure: {e}")
-
-        import threading
-
-        threading.Thread(target=worker, daemon=True).start()
+        self.jobs.submit(
+            "AlphaMissense", name, lambda: pymolfold.plugin.query_am_hegelab(name)
+        )
 
     def on_browse_workdir(self):
         path = QtWidgets.QFileDialog.getExistingDirectory(
@@ -434,18 +652,7 @@ class PymolFoldDialog(QtWidgets.QDialog):
         Calls your existing `init_boltz2_gui` / foldingui function which launches the
         FastAPI + Streamlit UI in a browser.
         """
-        self.append_log("Launching Streamlit UI (foldingui)…")
-
-        def worker():
-            try:
-                pymolfold.plugin.init_boltz2_gui()
-                self.append_log("Streamlit UI requested (check browser).")
-            except Exception as e:
-                self.append_log(f"Error launching Streamlit UI: {e}")
-
-        import threading
-
-        threading.Thread(target=worker, daemon=True).start()
+        self.jobs.submit("foldingui", "Streamlit UI", pymolfold.plugin.init_boltz2_gui)
 
 
 def show_pymolfold_dialog():
@@ -0,0 +1,206 @@
+"""Ensemble analysis of models of the same sequence.
+
+Diffusion samples, repeated ESM-3 samples or batch predictions of one sequence
+are compared as an ensemble of ``N`` models with ``L`` matching atoms (usually
+CA) each, stored as one ``N x L x 3`` array:
+
+* ``superpose`` fits every model onto a reference with a batched Kabsch
+  algorithm (one stacked SVD of ``N`` 3 x 3 matrices);
+* ``rmsf`` gives the per-residue fluctuation around the mean structure;
+* ``rmsd_matrix`` gives the all-vs-all RMSD after optimal superposition: the
+  cross-covariances of all pairs come from one matrix product and their
+  singular values from stacked SVDs, so there is no per-pair loop;
+* ``cluster`` groups models by RMSD (GROMOS method) and picks the central
+  model of each cluster as its representative.
+
+1,000 models of 500 residues take a few seconds in total.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_CUTOFF = 2.0
+# Pairs whose cross-covariance is decomposed at once in rmsd_matrix
+_PAIR_CHUNK = 1 << 18
+
+
+def _check_ensemble(coords) -> np.ndarray:
+    coords = np.asarray(coords, dtype=float)
+    if coords.ndim != 3 or coords.shape[2] != 3:
+        raise ValueError(f"Expected N x L x 3 coordinates, got shape {coords.shape}")
+    if coords.shape[1] < 3:
+        raise ValueError("Models need at least three atoms to be superposed")
+    return coords
+
+
+def batch_kabsch(
+    mobile: np.ndarray, target: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Optimal rigid transforms superposing each of ``mobile`` onto ``target``
+
+    Args:
+        mobile: N x L x 3 coordinates to move
+        target: L x 3 (shared) or N x L x 3 reference coordinates
+
+    Returns:
+        (N x 3 x 3 rotations, N x 3 translations) such that
+        ``mobile[i] @ rotations[i].T + translations[i]`` is superposed, as with
+        ``pymolfold.structure.kabsch``
+    """
+    mobile_center = mobile.mean(axis=1, keepdims=True)
+    target_center = target.mean(axis=-2, keepdims=True)
+    h = np.swapaxes(mobile - mobile_center, 1, 2) @ (target - target_center)
+    u, _, vt = np.linalg.svd(h)
+    v, ut = np.swapaxes(vt, 1, 2), np.swapaxes(u, 1, 2)
+    # Flip the last axis where the best orthogonal fit is a reflection
+    d = np.sign(np.linalg.det(v @ ut))
+    v[:, :, 2] *= np.where(d == 0, 1.0, d)[:, None]
+    rotations = v @ ut
+    translations = (
+        target_center - mobile_center @ np.swapaxes(rotations, 1, 2)
+    ).reshape(-1, 3)
+    return rotations, translations
+
+
+def superpose(
+    coords: np.ndarray, reference: int = 0, iterations: int = 1
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Superpose all models onto a reference model
+
+    Args:
+        coords: N x L x 3 coordinates
+        reference: Index of the model to superpose onto
+        iterations: Further fits onto the mean of the superposed models, which
+            removes the bias towards the reference in RMSF
+
+    Returns:
+        (superposed N x L x 3 coordinates, rotations, translations), the
+        transforms mapping the input models onto the superposed ones. The
+        result is expressed in the frame of the reference model, which keeps
+        its input coordinates.
+    """
+    coords = _check_ensemble(coords)
+    target = coords[reference]
+    for _ in range(max(1, int(iterations) + 1)):
+        rotations, translations = batch_kabsch(coords, target)
+        target = (
+            coords @ np.swapaxes(rotations, 1, 2) + translations[:, None, :]
+        ).mean(axis=0)
+    # Undo the reference's own transform for every model, a rigid motion of
+    # the whole ensemble that leaves the reference where it was
+    ref_rotation, ref_translation = rotations[reference], translations[reference]
+    rotations = ref_rotation.T @ rotations
+    translations = (translations - ref_translation) @ ref_rotation
+    aligned = coords @ np.swapaxes(rotations, 1, 2) + translations[:, None, :]
+    return aligned, rotations, translations
+
+
+def rmsf(aligned: np.ndarray) -> np.ndarray:
+    """Per-atom RMS fluctuation around the mean of superposed models (length L)"""
+    aligned = _check_ensemble(aligned)
+    deviation = aligned - aligned.mean(axis=0)
+    return np.sqrt((deviation**2).sum(axis=2).mean(axis=0))
+
+
+def rmsd_matrix(coords: np.ndarray) -> np.ndarray:
+    """All-vs-all RMSD after optimal superposition of every pair (N x N)
+
+    For centered models ``a`` and ``b`` with cross-covariance ``H = a.T @ b``
+    and singular values ``s1 >= s2 >= s3``, the minimal squared deviation is
+    ``|a|^2 + |b|^2 - 2 (s1 + s2 + sign(det H) s3)``, so no rotation has to be
+    built or applied.
+    """
+    coords = _check_ensemble(coords)
+    n, length, _ = coords.shape
+    centered = coords - coords.mean(axis=1, keepdims=True)
+    norms = (centered**2).sum(axis=(1, 2))
+    # Cross-covariance of every pair from one (3N x L) @ (L x 3N) product
+    flat = centered.transpose(0, 2, 1).reshape(n * 3, length)
+    cov = (flat @ flat.T).reshape(n, 3, n, 3).transpose(0, 2, 1, 3)
+
+    rows, cols = np.triu_indices(n, k=1)
+    out = np.zeros((n, n))
+    for start in range(0, len(rows), _PAIR_CHUNK):
+        i = rows[start : start + _PAIR_CHUNK]
+        j = cols[start : start + _PAIR_CHUNK]
+        h = cov[i, j]
+        s = np.linalg.svd(h, compute_uv=False)
+        s[:, 2] *= np.where(np.linalg.det(h) < 0, -1.0, 1.0)
+        msd = (norms[i] + norms[j] - 2.0 * s.sum(axis=1)) / length
+        out[i, j] = out[j, i] = np.sqrt(np.maximum(msd, 0.0))
+    return out
+
+
+def cluster(
+    matrix: np.ndarray, cutoff: float = DEFAULT_CUTOFF
+) -> Tuple[np.ndarray, List[int]]:
+    """Cluster models by RMSD with the GROMOS method
+
+    The model with the most neighbours within ``cutoff`` becomes the center of
+    the first cluster, which holds it and those neighbours; the clustered models
+    are removed and the step repeats until every model is assigned.
+
+    Args:
+        matrix: N x N RMSD matrix, see ``rmsd_matrix``
+        cutoff: Neighbour cutoff in Angstrom
+
+    Returns:
+        (cluster index of every model, largest cluster first; center model of
+        each cluster)
+    """
+    neighbours = np.asarray(matrix) <= cutoff
+    labels = np.full(len(neighbours), -1)
+    centers: List[int] = []
+    remaining = np.ones(len(neighbours), dtype=bool)
+    while remaining.any():
+        counts = (neighbours[:, remaining]).sum(axis=1)
+        counts[~remaining] = -1
+        center = int(np.argmax(counts))
+        members = neighbours[center] & remaining
+        labels[members] = len(centers)
+        centers.append(center)
+        remaining &= ~members
+    return labels, centers
+
+
+def analyze_ensemble(
+    coords: np.ndarray,
+    reference: int = 0,
+    cutoff: float = DEFAULT_CUTOFF,
+) -> Dict[str, np.ndarray]:
+    """Superpose, compute RMSF and RMSD matrix, and cluster an ensemble
+
+    Returns:
+        Dictionary with 'aligned', 'rotations', 'translations', 'rmsf',
+        'rmsd_to_reference', 'rmsd_matrix', 'labels' and 'centers'
+    """
+    aligned, rotations, translations = superpose(coords, reference)
+    matrix = rmsd_matrix(coords)
+    labels, centers = cluster(matrix, cutoff)
+    return {
+        "aligned": aligned,
+        "rotations": rotations,
+        "translations": translations,
+        "rmsf": rmsf(aligned),
+        "rmsd_to_reference": matrix[reference],
+        "rmsd_matrix": matrix,
+        "labels": labels,
+        "centers": np.array(centers),
+    }
+
+
+def summarize_clusters(
+    labels: np.ndarray, centers: List[int], names: Optional[List[str]] = None
+) -> List[Dict[str, object]]:
+    """One row per cluster: size and representative model"""
+    rows = []
+    for index, center in enumerate(centers):
+        rows.append(
+            {
+                "cluster": index + 1,
+                "size": int((labels == index).sum()),
+                "representative": names[center] if names else int(center),
+            }
+        )
+    return rows
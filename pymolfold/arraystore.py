@@ -0,0 +1,443 @@
+"""Memory-mapped columnar store of batch prediction arrays.
+
+Structure files are the primary output, but comparing thousands of them means
+parsing thousands of text files. When enabled for a batch (``pf_arrays``), each
+saved model is also appended to a few flat ``.npy`` columns in
+``pymolfold_arrays/<batch>/`` of the working directory:
+
+* ``coords.npy``: atom coordinates, float32, ``atoms x 3``
+* ``plddt.npy``: per-residue pLDDT (0-100), float16
+* ``residue_atom.npy``: per residue, the index of its CA atom (or first atom)
+  within the model, int32
+* ``pae.npy`` / ``pde.npy``: flattened Boltz-2 PAE/PDE matrices, float16, when
+  the response provides them
+
+The columns are ragged, so models of different lengths share one batch; the
+``index.sqlite`` table maps every model to its slices. Columns are opened with
+``numpy.load(mmap_mode="r")``, so reading one model or stacking a few hundred
+(``ArrayStore.stack``, ready for ``pymolfold.analysis``) touches only those
+bytes.
+"""
+
+import re
+import sqlite3
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .catalog import normalize_sequence, sequence_hash
+from .locking import file_lock
+
+ARRAYS_DIRNAME = "pymolfold_arrays"
+INDEX_FILENAME = "index.sqlite"
+LOCK_FILENAME = "append.lock"
+# Fixed-size .npy header, rewritten in place as rows are appended
+_HEADER_SIZE = 128
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS models (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created REAL NOT NULL,
+    name TEXT,
+    predictor TEXT,
+    seq_hash TEXT,
+    sequence TEXT,
+    sample INTEGER NOT NULL,
+    path TEXT,
+    atom_offset INTEGER NOT NULL,
+    n_atoms INTEGER NOT NULL,
+    residue_offset INTEGER NOT NULL,
+    n_residues INTEGER NOT NULL,
+    plddt REAL,
+    pae_offset INTEGER,
+    pae_size INTEGER,
+    pde_offset INTEGER,
+    pde_size INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_models_seq ON models (seq_hash);
+CREATE INDEX IF NOT EXISTS idx_models_name ON models (name);
+"""
+
+
+class _Column:
+    """Append-only ``.npy`` file of rows with a fixed trailing shape
+
+    Other processes may append to the same file: ``rows`` is only a cached
+    count, refreshed from the header before appending (under the store's file
+    lock) and whenever a read needs rows past it.
+    """
+
+    def __init__(self, path: Path, dtype, shape: Tuple[int, ...] = ()):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.shape = shape
+        self._row_bytes = self.dtype.itemsize * int(np.prod(shape, dtype=int))
+        self._mmap: Optional[np.ndarray] = None
+        self.rows = 0
+        try:
+            with open(path, "xb") as handle:
+                self._write_header(handle)
+        except FileExistsError:
+            self.refresh()
+
+    def refresh(self) -> int:
+        """Re-read the row count from the header"""
+        with open(self.path, "rb") as handle:
+            np.lib.format.read_magic(handle)
+            self.rows = np.lib.format.read_array_header_1_0(handle)[0][0]
+        return self.rows
+
+    def _write_header(self, handle):
+        header = repr(
+            {
+                "descr": np.lib.format.dtype_to_descr(self.dtype),
+                "fortran_order": False,
+                "shape": (self.rows, *self.shape),
+            }
+        ).encode("latin1")
+        header += b" " * (_HEADER_SIZE - 10 - len(header) - 1) + b"\n"
+        handle.seek(0)
+        handle.write(b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header)
+
+    def append(self, values) -> int:
+        """Append rows and return the offset of the first one
+
+        The caller holds the store's file lock.
+        """
+        values = np.ascontiguousarray(values, dtype=self.dtype).reshape(
+            -1, *self.shape
+        )
+        offset = self.refresh()
+        with open(self.path, "r+b") as handle:
+            handle.seek(_HEADER_SIZE + offset * self._row_bytes)
+            handle.write(values.tobytes())
+            # The header is written last: a crash leaves unreferenced bytes only
+            self.rows += len(values)
+            self._write_header(handle)
+        return offset
+
+    def read(self, rows: int = 0) -> np.ndarray:
+        """Read-only memory map of all rows (remapped after appends)
+
+        Args:
+            rows: Number of rows the caller needs; the header is re-read when
+                the cached count is smaller (appended by another process)
+        """
+        if rows > self.rows:
+            self.refresh()
+        if self.rows == 0:
+            return np.empty((0, *self.shape), dtype=self.dtype)
+        if self._mmap is None or len(self._mmap) != self.rows:
+            self._mmap = np.load(self.path, mmap_mode="r")
+        return self._mmap
+
+
+def parse_structure(text: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Atom coordinates and per-residue B-factors of a PDB or mmCIF string
+
+    Returns:
+        (atoms x 3 float32 coordinates, per-residue B-factor of the CA atom or
+        else the first atom, per-residue index of that atom)
+    """
+    if text.startswith("data_"):
+        atoms = _mmcif_atoms(text)
+    else:
+        atoms = (
+            (
+                (line[21], line[22:26].strip(), line[26:27].strip()),
+                line[12:16].strip(),
+                (float(line[30:38]), float(line[38:46]), float(line[46:54])),
+                float(line[60:66] or 0.0),
+            )
+            for line in text.splitlines()
+            if line.startswith(("ATOM", "HETATM"))
+        )
+    coords, bfactors, residue_atom = [], [], []
+    last = None
+    for index, (key, atom_name, xyz, b) in enumerate(atoms):
+        coords.append(xyz)
+        if key != last:
+            last = key
+            bfactors.append(b)
+            residue_atom.append(index)
+        elif atom_name == "CA":
+            bfactors[-1] = b
+            residue_atom[-1] = index
+    return (
+        np.array(coords, dtype=np.float32).reshape(-1, 3),
+        np.array(bfactors, dtype=np.float32),
+        np.array(residue_atom, dtype=np.int32),
+    )
+
+
+def _mmcif_atoms(text: str):
+    """Atoms of the ``_atom_site`` loop of an mmCIF string"""
+    columns: List[str] = []
+    for line in text.splitlines():
+        if line.startswith("_atom_site."):
+            columns.append(line.split()[0][len("_atom_site.") :])
+            continue
+        if not columns or not line.strip():
+            continue
+        if line.startswith(("#", "loop_", "_")):
+            break
+        row = dict(zip(columns, line.split()))
+        yield (
+            (
+                row.get("auth_asym_id", row.get("label_asym_id")),
+                row.get("auth_seq_id", row.get("label_seq_id")),
+                row.get("pdbx_PDB_ins_code", "").strip("?."),
+            ),
+            row.get("label_atom_id", row.get("auth_atom_id", "")).strip('"'),
+            (float(row["Cartn_x"]), float(row["Cartn_y"]), float(row["Cartn_z"])),
+            float(row.get("B_iso_or_equiv", 0.0)),
+        )
+
+
+def _sample_matrix(value: Any, sample: int) -> Optional[np.ndarray]:
+    """Square matrix of one sample from a per-sample (or single) response field"""
+    if value is None:
+        return None
+    try:
+        array = np.asarray(value, dtype=np.float32)
+    except ValueError:  # ragged
+        return None
+    if array.ndim == 3 and sample < len(array):
+        array = array[sample]
+    elif array.ndim != 2 or sample != 0:
+        return None
+    if array.shape[0] != array.shape[1]:
+        return None
+    return array
+
+
+class ArrayStore:
+    """Columnar arrays and index of the models of one batch
+
+    Args:
+        directory: Batch directory, created if needed
+    """
+
+    COLUMNS = {
+        "coords": (np.float32, (3,)),
+        "plddt": (np.float16, ()),
+        "residue_atom": (np.int32, ()),
+        "pae": (np.float16, ()),
+        "pde": (np.float16, ()),
+    }
+
+    def __init__(self, directory: Union[str, Path]):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._columns = {
+            name: _Column(self.directory / f"{name}.npy", dtype, shape)
+            for name, (dtype, shape) in self.COLUMNS.items()
+        }
+        self._conn = sqlite3.connect(
+            str(self.directory / INDEX_FILENAME), check_same_thread=False
+        )
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.executescript(_SCHEMA)
+            self._conn.commit()
+
+    def add(
+        self,
+        structure: str,
+        name: Optional[str] = None,
+        sequence: str = "",
+        predictor: Optional[str] = None,
+        sample: int = 0,
+        path: Optional[Union[str, Path]] = None,
+        pae: Optional[np.ndarray] = None,
+        pde: Optional[np.ndarray] = None,
+    ) -> int:
+        """Append one model (PDB or mmCIF text) and return its index id"""
+        coords, bfactors, residue_atom = parse_structure(structure)
+        if len(bfactors) and bfactors.max() <= 1.0:
+            bfactors = bfactors * 100.0
+        with self._lock, file_lock(self.directory / LOCK_FILENAME):
+            row = {
+                "created": time.time(),
+                "name": name,
+                "predictor": predictor,
+                "seq_hash": sequence_hash(sequence) if sequence else None,
+                "sequence": normalize_sequence(sequence) if sequence else None,
+                "sample": sample,
+                "path": str(Path(path).resolve()) if path else None,
+                "atom_offset": self._columns["coords"].append(coords),
+                "n_atoms": len(coords),
+                "residue_offset": self._columns["plddt"].append(bfactors),
+                "n_residues": len(bfactors),
+                "plddt": float(bfactors.mean()) if len(bfactors) else None,
+            }
+            self._columns["residue_atom"].append(residue_atom)
+            for key, matrix in (("pae", pae), ("pde", pde)):
+                if matrix is not None:
+                    row[f"{key}_offset"] = self._columns[key].append(matrix.ravel())
+                    row[f"{key}_size"] = len(matrix)
+            columns = ", ".join(row)
+            cursor = self._conn.execute(
+                f"INSERT INTO models ({columns}) VALUES ({', '.join('?' * len(row))})",
+                list(row.values()),
+            )
+            self._conn.commit()
+            return cursor.lastrowid
+
+    def add_result(
+        self,
+        result,
+        paths: Sequence[Union[str, Path]],
+        name: Optional[str] = None,
+        predictor: Optional[str] = None,
+    ) -> List[int]:
+        """Append the saved structures of a ``PredictionResult``"""
+        pae, pde = result.get("pae"), result.get("pde")
+        ids = []
+        for sample, (payload, path) in enumerate(zip(result.structures, paths)):
+            ids.append(
+                self.add(
+                    payload.text,
+                    name=name or Path(path).stem,
+                    sequence=result.get("sequence") or "",
+                    predictor=predictor,
+                    sample=sample,
+                    path=path,
+                    pae=_sample_matrix(pae, sample),
+                    pde=_sample_matrix(pde, sample),
+                )
+            )
+        return ids
+
+    def rows(
+        self, name: str = "", sequence: str = "", limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Index rows, oldest first, by name (wildcards allowed) or sequence"""
+        clauses, args = [], []
+        if name:
+            clauses.append("name GLOB ?")
+            args.append(name)
+        if sequence:
+            clauses.append("seq_hash = ?")
+            args.append(sequence_hash(sequence))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = f"SELECT * FROM models {where} ORDER BY id"
+        if limit:
+            sql += " LIMIT ?"
+            args.append(int(limit))
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, args).fetchall()]
+
+    def row(self, model_id: int) -> Dict[str, Any]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM models WHERE id = ?", (int(model_id),)
+            ).fetchone()
+        if row is None:
+            raise KeyError(model_id)
+        return dict(row)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM models").fetchone()[0]
+
+    def _slice(self, column: str, offset: int, size: int) -> np.ndarray:
+        with self._lock:
+            data = self._columns[column].read(offset + size)
+        return data[offset : offset + size]
+
+    def coords(self, model_id: int, representative: bool = False) -> np.ndarray:
+        """Atom coordinates of a model (a memory-mapped view)
+
+        Args:
+            representative: Only the CA atom (or first atom) of every residue
+        """
+        row = self.row(model_id)
+        coords = self._slice("coords", row["atom_offset"], row["n_atoms"])
+        if representative:
+            atoms = self._slice(
+                "residue_atom", row["residue_offset"], row["n_residues"]
+            )
+            coords = coords[atoms]
+        return coords
+
+    def plddt(self, model_id: int) -> np.ndarray:
+        """Per-residue pLDDT (0-100) of a model"""
+        row = self.row(model_id)
+        return self._slice("plddt", row["residue_offset"], row["n_residues"])
+
+    def pae(self, model_id: int) -> Optional[np.ndarray]:
+        return self._matrix("pae", model_id)
+
+    def pde(self, model_id: int) -> Optional[np.ndarray]:
+        return self._matrix("pde", model_id)
+
+    def _matrix(self, column: str, model_id: int) -> Optional[np.ndarray]:
+        row = self.row(model_id)
+        size = row[f"{column}_size"]
+        if size is None:
+            return None
+        flat = self._slice(column, row[f"{column}_offset"], size * size)
+        return flat.reshape(size, size)
+
+    def stack(
+        self, model_ids: Optional[Sequence[int]] = None, representative: bool = True
+    ) -> np.ndarray:
+        """``models x atoms x 3`` coordinates of models of the same sequence
+
+        Args:
+            model_ids: Models to stack (default: all)
+            representative: Only the CA atom (or first atom) of every residue,
+                as expected by ``pymolfold.analysis``
+        """
+        if model_ids is None:
+            model_ids = [row["id"] for row in self.rows()]
+        models = [self.coords(i, representative) for i in model_ids]
+        if len({len(m) for m in models}) > 1:
+            raise ValueError("Models differ in their number of atoms")
+        return np.stack(models) if models else np.empty((0, 0, 3), np.float32)
+
+    def plddt_matrix(self, model_ids: Optional[Sequence[int]] = None) -> np.ndarray:
+        """``models x residues`` pLDDT of models of the same length"""
+        if model_ids is None:
+            model_ids = [row["id"] for row in self.rows()]
+        profiles = [self.plddt(i) for i in model_ids]
+        if len({len(p) for p in profiles}) > 1:
+            raise ValueError("Models differ in their number of residues")
+        return np.stack(profiles) if profiles else np.empty((0, 0), np.float16)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def batch_directory(workdir: Union[str, Path], batch: str) -> Path:
+    name = re.sub(r"[^\w.-]", "_", batch).strip(".") or "batch"
+    return (Path(workdir).expanduser() / ARRAYS_DIRNAME / name).resolve()
+
+
+def list_batches(workdir: Union[str, Path]) -> List[str]:
+    """Batches with arrays in a working directory"""
+    root = Path(workdir).expanduser() / ARRAYS_DIRNAME
+    if not root.is_dir():
+        return []
+    return sorted(p.name for p in root.iterdir() if (p / INDEX_FILENAME).exists())
+
+
+_stores: Dict[Path, ArrayStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_array_store(workdir: Union[str, Path], batch: str) -> ArrayStore:
+    """Return the shared store of a batch, opening it on first use"""
+    directory = batch_directory(workdir, batch)
+    with _stores_lock:
+        store = _stores.get(directory)
+        if store is None:
+            store = _stores[directory] = ArrayStore(directory)
+        return store
@@ -0,0 +1,275 @@
+"""Background execution of plugin commands.
+
+One long-lived asyncio event loop runs in a daemon thread, next to a bounded
+thread pool for blocking work (HTTP clients, model SDKs, PXMeter). Commands
+submit their work here and return a job id at once; progress is tracked in
+``pymolfold.jobs.JOBS``. Jobs wait for a slot of the priority scheduler
+(``pymolfold.scheduler``) before they run, so interactive work goes ahead of
+batches. Whatever has to touch the PyMOL session afterwards (loading, coloring,
+printing) runs as a callback on PyMOL's main thread.
+"""
+
+import asyncio
+import functools
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from .jobs import JOBS, Job
+from .scheduler import SCHEDULER, check_priority
+
+logger = logging.getLogger(__name__)
+
+
+class MainThreadDispatcher:
+    """Run callbacks on the thread that called ``install`` (PyMOL's GUI thread)
+
+    Callbacks are queued; with Qt available a queued signal wakes the GUI
+    thread to run them. Without a GUI (``pymol -c``) there is no event loop to
+    wake, so callbacks run right away in the calling thread, which is safe as
+    PyMOL's API serializes access to the session itself.
+    """
+
+    def __init__(self):
+        self._queue: "queue.Queue[Callable[[], Any]]" = queue.Queue()
+        self._relay = None
+        self._thread_id: Optional[int] = None
+
+    def install(self) -> bool:
+        """Bind the dispatcher to the current thread
+
+        Returns:
+            False without a running Qt application (Qt missing, or headless
+            ``pymol -c``), in which case callbacks run right away
+        """
+        try:
+            from pymol.Qt import QtCore
+        except Exception:
+            return False
+        if QtCore.QCoreApplication.instance() is None:
+            return False
+
+        class _Relay(QtCore.QObject):
+            wake = QtCore.Signal()
+
+        self._relay = _Relay()
+        self._relay.wake.connect(self.drain)
+        self._thread_id = threading.get_ident()
+        return True
+
+    def call(self, fn: Callable, *args, **kwargs):
+        callback = functools.partial(fn, *args, **kwargs)
+        if self._relay is None or threading.get_ident() == self._thread_id:
+            callback()
+            return
+        self._queue.put(callback)
+        self._relay.wake.emit()
+
+    def drain(self):
+        """Run every queued callback (GUI thread only)"""
+        if self._thread_id is not None and threading.get_ident() != self._thread_id:
+            return
+        while True:
+            try:
+                callback = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                callback()
+            except Exception:
+                logger.exception("Main-thread callback failed")
+
+
+class BackgroundRunner:
+    """Persistent event loop plus worker pool shared by all plugin commands
+
+    Jobs of one kind can be capped with ``set_limit`` (e.g. to respect the
+    concurrency a remote API tolerates); jobs over the cap stay queued and are
+    started by priority class (see ``pymolfold.scheduler``).
+    """
+
+    def __init__(self, max_workers: int = 8, scheduler=SCHEDULER):
+        self.max_workers = max_workers
+        self.scheduler = scheduler
+        self.dispatcher = MainThreadDispatcher()
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._futures: Dict[str, Future] = {}
+        self._done: Dict[str, threading.Event] = {}
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """The background event loop, started on first use"""
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="pymolfold"
+                )
+                self._loop = asyncio.new_event_loop()
+                self._loop.set_default_executor(self._executor)
+                threading.Thread(
+                    target=self._loop.run_forever,
+                    name="pymolfold-loop",
+                    daemon=True,
+                ).start()
+            return self._loop
+
+    def set_limit(self, kind: str, limit: int):
+        """Run at most ``limit`` jobs of ``kind`` at the same time"""
+        self.scheduler.set_limit(kind, limit)
+
+    def set_priority(self, job_id: str, priority: str) -> bool:
+        """Move a queued job to another priority class; False if not queued"""
+        priority = check_priority(priority)
+        if not self.scheduler.set_priority(job_id, priority):
+            return False
+        return JOBS.set_priority(job_id, priority)
+
+    def submit(
+        self,
+        kind: str,
+        name: str,
+        work: Callable,
+        *args,
+        on_done: Optional[Callable[[Any], Any]] = None,
+        priority: str = "interactive",
+        **kwargs,
+    ) -> str:
+        """Run ``work(*args, progress=..., **kwargs)`` in the background
+
+        Args:
+            kind: Job kind shown in the job list (e.g. 'esmfold')
+            name: Job name (usually the output name)
+            work: Coroutine function (run on the event loop) or plain function
+                (run in the worker pool); it receives a ``progress`` callback
+            on_done: Called on the main thread with the result of ``work``; its
+                return value, if a string, becomes the final job message
+            priority: 'interactive', 'batch' or 'prefetch'
+
+        Returns:
+            Job id
+        """
+        job = JOBS.create(kind, name, priority=check_priority(priority))
+        loop = self.loop
+        with self._lock:
+            self._done[job.id] = threading.Event()
+        future = asyncio.run_coroutine_threadsafe(
+            self._execute(job.id, work, args, kwargs, on_done), loop
+        )
+        with self._lock:
+            if job.id in self._done:  # not finished already
+                self._futures[job.id] = future
+        return job.id
+
+    async def _execute(self, job_id, work, args, kwargs, on_done):
+        progress = JOBS.progress_callback(job_id)
+        try:
+            job = JOBS.get(job_id)
+            async with self.scheduler.slot(job.kind, job.priority, tag=job_id):
+                progress("running", "Started")
+                if asyncio.iscoroutinefunction(work):
+                    result = await work(*args, progress=progress, **kwargs)
+                else:
+                    call = functools.partial(work, *args, progress=progress, **kwargs)
+                    loop = asyncio.get_running_loop()
+                    result = await self._run_blocking(loop.run_in_executor(None, call))
+        except asyncio.CancelledError:
+            JOBS.cancel(job_id)
+            self._complete(job_id)
+            raise
+        except Exception as e:
+            error = str(getattr(e, "detail", e))
+            JOBS.fail(job_id, error)
+            job = JOBS.get(job_id)
+            print(f"[{job.kind}] {job.name} failed: {error}")
+            self._complete(job_id)
+            return
+
+        if on_done is None:
+            JOBS.finish(job_id, result=result)
+            self._complete(job_id)
+        else:
+            self.dispatcher.call(self._deliver, job_id, on_done, result)
+
+    @staticmethod
+    async def _run_blocking(future: asyncio.Future) -> Any:
+        """Await an executor call, holding the caller's slot until it returns
+
+        A worker thread cannot be interrupted: on cancellation the call keeps
+        running (and using the provider), so the slot is only released, and
+        the cancellation raised, once the thread is done.
+        """
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            while not future.done():
+                try:
+                    await asyncio.wait({future})
+                except asyncio.CancelledError:
+                    pass
+            raise
+
+    def _deliver(self, job_id: str, on_done: Callable, result: Any):
+        """Main-thread part of a job: load the result into the session"""
+        try:
+            job = JOBS.get(job_id)
+            if job is None or job.done:
+                return
+            message = on_done(result)
+            JOBS.finish(
+                job_id,
+                result=result if isinstance(result, (dict, list)) else None,
+                message=message if isinstance(message, str) else "",
+            )
+        except Exception as e:
+            JOBS.fail(job_id, str(e))
+            print(f"Could not load results of job {job_id}: {e}")
+        finally:
+            self._complete(job_id)
+
+    def _complete(self, job_id: str):
+        with self._lock:
+            self._futures.pop(job_id, None)
+            # Waiters hold their own reference to the event
+            event = self._done.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job; False if it already finished
+
+        A running blocking call cannot be interrupted: the job is reported as
+        cancelled at once, but it keeps its scheduler slot until the call
+        returns, and the result is then dropped.
+        """
+        future = self._futures.get(job_id)
+        cancelled = JOBS.cancel(job_id)
+        if future is not None:
+            future.cancel()
+        if cancelled:
+            self._complete(job_id)
+        return cancelled
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[Job]:
+        """Block until a job is done, running main-thread callbacks meanwhile"""
+        event = self._done.get(job_id)
+        if event is not None:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not event.wait(0.05):
+                self.dispatcher.drain()
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+        self.dispatcher.drain()
+        return JOBS.get(job_id)
+
+    def active(self):
+        """Ids of jobs submitted here that have not finished yet"""
+        with self._lock:
+            return list(self._done)
+
+
+RUNNER = BackgroundRunner()
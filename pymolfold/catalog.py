@@ -0,0 +1,206 @@
+"""SQLite catalog of the predictions saved in a working directory.
+
+Every call to ``StructurePredictor.save_structures`` adds one row holding the
+full input sequence (and its hash), the predictor, its parameters, confidence
+and affinity summaries, the saved files and the wall-clock time of the
+prediction. Lookups by sequence, name or predictor are served from indexes,
+so they stay fast however many predictions a working directory holds.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+CATALOG_FILENAME = "pymolfold_catalog.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created REAL NOT NULL,
+    name TEXT,
+    predictor TEXT NOT NULL,
+    seq_hash TEXT NOT NULL,
+    sequence TEXT NOT NULL,
+    length INTEGER NOT NULL,
+    params TEXT,
+    plddt REAL,
+    plddts TEXT,
+    affinity TEXT,
+    paths TEXT NOT NULL,
+    duration REAL
+);
+CREATE INDEX IF NOT EXISTS idx_predictions_seq ON predictions (seq_hash, predictor);
+CREATE INDEX IF NOT EXISTS idx_predictions_name ON predictions (name);
+CREATE INDEX IF NOT EXISTS idx_predictions_predictor
+    ON predictions (predictor, plddt);
+"""
+
+_JSON_COLUMNS = ("params", "plddts", "affinity", "paths")
+
+
+def normalize_sequence(sequence: str) -> str:
+    """Upper-case the sequence and drop whitespace so equal inputs hash equally"""
+    return "".join(sequence.split()).upper()
+
+
+def sequence_hash(sequence: str) -> str:
+    """SHA-256 hex digest of the normalized sequence"""
+    return hashlib.sha256(normalize_sequence(sequence).encode("utf-8")).hexdigest()
+
+
+def _plddt_percent(value: Optional[float]) -> Optional[float]:
+    """Report pLDDT on the 0-100 scale whatever scale the predictor used"""
+    if value is None:
+        return None
+    value = float(value)
+    return value * 100 if value <= 1.0 else value
+
+
+class Catalog:
+    """Thread-safe handle on the catalog database of one working directory"""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+            self._conn.commit()
+
+    def record(
+        self,
+        sequence: str,
+        predictor: str,
+        paths: Sequence[Union[str, Path]],
+        name: Optional[str] = None,
+        params: Optional[Dict[str, Any]] = None,
+        plddts: Optional[Sequence[Optional[float]]] = None,
+        affinity: Optional[Dict[str, Any]] = None,
+        duration: Optional[float] = None,
+    ) -> int:
+        """Add one prediction to the catalog and return its row id
+
+        Args:
+            sequence: Full input sequence (chains separated by ':')
+            predictor: Predictor name, e.g. 'ESMFoldPredictor'
+            paths: Saved structure files
+            name: Output name used for the files
+            params: Prediction parameters
+            plddts: Mean pLDDT of each saved structure
+            affinity: Affinity summary returned by the predictor
+            duration: Wall-clock seconds spent predicting
+        """
+        sequence = normalize_sequence(sequence)
+        plddts = [_plddt_percent(v) for v in (plddts or [])]
+        known = [v for v in plddts if v is not None]
+        row = (
+            time.time(),
+            name,
+            predictor,
+            sequence_hash(sequence),
+            sequence,
+            len(sequence.replace(":", "")),
+            json.dumps(params or {}, default=str, sort_keys=True),
+            max(known) if known else None,
+            json.dumps(plddts),
+            json.dumps(affinity) if affinity else None,
+            json.dumps([str(Path(p).resolve()) for p in paths]),
+            duration,
+        )
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO predictions (created, name, predictor, seq_hash, sequence,"
+                " length, params, plddt, plddts, affinity, paths, duration)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                row,
+            )
+            self._conn.commit()
+            return cursor.lastrowid
+
+    def find(
+        self,
+        query: str = "",
+        predictor: str = "",
+        min_plddt: Optional[float] = None,
+        limit: int = 50,
+    ) -> List[Dict[str, Any]]:
+        """Look up predictions by sequence or name
+
+        Args:
+            query: Exact sequence, or an output name (shell-style wildcards allowed)
+            predictor: Restrict to one predictor (case-insensitive substring)
+            min_plddt: Only return predictions with at least this pLDDT (0-100)
+            limit: Maximum number of rows, newest first
+
+        Returns:
+            List of prediction dictionaries
+        """
+        clauses, args = [], []
+        query = (query or "").strip()
+        if query:
+            clauses.append("(seq_hash = ? OR name GLOB ?)")
+            args += [sequence_hash(query), query]
+        if predictor:
+            clauses.append("predictor LIKE ?")
+            args.append(f"%{predictor}%")
+        if min_plddt is not None:
+            clauses.append("plddt >= ?")
+            args.append(float(min_plddt))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = f"SELECT * FROM predictions {where} ORDER BY id DESC LIMIT ?"
+        args.append(int(limit))
+        with self._lock:
+            rows = self._conn.execute(sql, args).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    def lookup(
+        self, sequence: str, predictor: str, params: Optional[Dict[str, Any]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Most recent prediction of ``sequence`` by ``predictor`` (and same params)"""
+        sql = "SELECT * FROM predictions WHERE seq_hash = ? AND predictor = ?"
+        args: List[Any] = [sequence_hash(sequence), predictor]
+        if params is not None:
+            sql += " AND params = ?"
+            args.append(json.dumps(params, default=str, sort_keys=True))
+        sql += " ORDER BY id DESC LIMIT 1"
+        with self._lock:
+            row = self._conn.execute(sql, args).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        entry = dict(row)
+        for column in _JSON_COLUMNS:
+            if entry.get(column):
+                entry[column] = json.loads(entry[column])
+        return entry
+
+
+_catalogs: Dict[Path, Catalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(workdir: Union[str, Path]) -> Catalog:
+    """Return the shared catalog of a working directory, opening it on first use"""
+    path = (Path(workdir).expanduser() / CATALOG_FILENAME).resolve()
+    with _catalogs_lock:
+        catalog = _catalogs.get(path)
+        if catalog is None:
+            catalog = _catalogs[path] = Catalog(path)
+        return catalog
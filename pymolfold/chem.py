@@ -0,0 +1,45 @@
+"""Ligand validation and canonicalization helpers.
+
+RDKit is imported lazily on the first SMILES that needs parsing, so code paths
+that only deal with polymers or CCD ligands never pay for the import.
+"""
+
+from functools import lru_cache
+from typing import Optional
+
+SMILES_CACHE_SIZE = 65536
+
+
+@lru_cache(maxsize=SMILES_CACHE_SIZE)
+def canonicalize_smiles(smiles: str) -> Optional[str]:
+    """Return the RDKit canonical SMILES, or None if the input does not parse
+
+    Results are memoized by the raw input string, so repeated ligands (and
+    screening lists) are parsed once per process.
+
+    Args:
+        smiles: SMILES string as entered by the user
+
+    Returns:
+        Canonical isomeric SMILES, or None for invalid input
+    """
+    smiles = (smiles or "").strip()
+    if not smiles:
+        return None
+
+    from rdkit import Chem, RDLogger
+
+    RDLogger.DisableLog("rdApp.*")
+    try:
+        mol = Chem.MolFromSmiles(smiles)
+    except Exception:
+        return None
+    if mol is None:
+        return None
+    return Chem.MolToSmiles(mol, canonical=True)
+
+
+def is_valid_smiles(smiles: str) -> bool:
+    """Check whether a SMILES string can be parsed by RDKit"""
+    return canonicalize_smiles(smiles) is not None
+
@@ -0,0 +1,259 @@
+"""Cached, concurrent downloads of structure files.
+
+Files are kept in a local cache directory together with a small sidecar holding
+the ``ETag`` and ``Last-Modified`` headers of the response, so a cached file is
+revalidated with a conditional request (``304 Not Modified`` costs no body) or
+used as-is when offline. A mirror directory can be given as an additional
+source: files found there are used without touching the network.
+"""
+
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+AF_URL = "https://alphafold.ebi.ac.uk/files/{filename}"
+AF_VERSION = 6
+AM_HEGELAB_URL = "https://alphamissense.hegelab.org/structure/{name}"
+DEFAULT_CACHE_DIR = os.environ.get(
+    "PYMOLFOLD_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "pymolfold")
+)
+AF_CACHE_DIR = os.path.join(DEFAULT_CACHE_DIR, "alphafold")
+AM_CACHE_DIR = os.path.join(DEFAULT_CACHE_DIR, "alphamissense")
+
+
+def alphafold_filename(uniprot_id: str, version: int = AF_VERSION) -> str:
+    return f"AF-{uniprot_id.strip().upper()}-F1-model_v{int(version)}.pdb"
+
+
+def parse_ids(ids: Union[str, Iterable[str]]) -> List[str]:
+    """Split IDs given as a list, a comma/space separated string or a file path
+
+    Files may hold one ID per line (or several separated by commas or spaces);
+    lines starting with '#' are ignored. Duplicates are dropped, order is kept.
+    """
+    if isinstance(ids, str):
+        path = Path(ids.strip()).expanduser()
+        try:
+            is_file = bool(ids.strip()) and path.is_file()
+        except OSError:  # e.g. a long ID list is not a valid file name
+            is_file = False
+        if is_file:
+            lines = path.read_text().splitlines()
+            text = " ".join(l for l in lines if not l.lstrip().startswith("#"))
+        else:
+            text = ids
+        ids = text.replace(",", " ").split()
+    seen = {}
+    for i in ids:
+        i = i.strip()
+        if i:
+            seen.setdefault(i, None)
+    return list(seen)
+
+
+class StructureCache:
+    """Download files into a cache directory with HTTP revalidation
+
+    Args:
+        cache_dir: Directory holding the cached files
+        mirror_dir: Optional directory searched for a file before downloading it
+        max_workers: Number of concurrent downloads (and pooled connections)
+        timeout: Connect/read timeout of each request in seconds
+        retries: Retries on connection errors and 429/5xx responses
+    """
+
+    def __init__(
+        self,
+        cache_dir: Union[str, Path] = DEFAULT_CACHE_DIR,
+        mirror_dir: Optional[Union[str, Path]] = None,
+        max_workers: int = 8,
+        timeout: float = 30.0,
+        retries: int = 3,
+    ):
+        self.cache_dir = Path(cache_dir).expanduser()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.mirror_dir = Path(mirror_dir).expanduser() if mirror_dir else None
+        self.max_workers = max(1, int(max_workers))
+        self.timeout = timeout
+        self._local = threading.local()
+        self._retry = Retry(
+            total=retries,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=("GET", "HEAD"),
+        )
+        self._adapter = HTTPAdapter(
+            pool_connections=self.max_workers,
+            pool_maxsize=self.max_workers,
+            max_retries=self._retry,
+        )
+
+    @property
+    def session(self) -> requests.Session:
+        # Sessions are not thread-safe; each worker gets one sharing the pool
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            session.mount("https://", self._adapter)
+            session.mount("http://", self._adapter)
+        return session
+
+    def path_for(self, filename: str) -> Path:
+        return self.cache_dir / filename
+
+    def _meta_path(self, filename: str) -> Path:
+        return self.cache_dir / f".{filename}.meta.json"
+
+    def _read_meta(self, filename: str) -> Dict[str, str]:
+        try:
+            return json.loads(self._meta_path(filename).read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def cached(self, filename: str) -> Optional[Path]:
+        """Path of ``filename`` in the mirror or cache, without any network access"""
+        if self.mirror_dir is not None:
+            mirrored = self.mirror_dir / filename
+            if mirrored.is_file():
+                return mirrored
+        path = self.path_for(filename)
+        return path if path.is_file() else None
+
+    def fetch(self, url: str, filename: str, revalidate: bool = True) -> Path:
+        """Return a local copy of ``url`` stored as ``filename``
+
+        A mirrored file is used as-is. A cached file is revalidated with its
+        ETag/Last-Modified unless ``revalidate`` is False; if revalidation fails
+        (e.g. offline) the cached copy is returned.
+        """
+        if self.mirror_dir is not None:
+            mirrored = self.mirror_dir / filename
+            if mirrored.is_file():
+                return mirrored
+
+        path = self.path_for(filename)
+        headers = {}
+        if path.is_file():
+            if not revalidate:
+                return path
+            meta = self._read_meta(filename)
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        try:
+            response = self.session.get(
+                url, headers=headers, timeout=self.timeout, stream=True
+            )
+            if response.status_code == 304 and path.is_file():
+                response.close()
+                return path
+            response.raise_for_status()
+        except requests.exceptions.RequestException:
+            if path.is_file():
+                return path
+            raise
+
+        self._write(path, response)
+        meta = {
+            "url": response.url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+        self._meta_path(filename).write_text(json.dumps(meta))
+        return path
+
+    def _write(self, path: Path, response: requests.Response):
+        # Write to a temporary file first so a failed download never leaves a
+        # truncated file in the cache
+        fd, tmp = tempfile.mkstemp(dir=str(self.cache_dir), suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                for chunk in response.iter_content(chunk_size=1 << 16):
+                    handle.write(chunk)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        finally:
+            response.close()
+
+    def fetch_many(
+        self, items: Iterable[Tuple[str, str]], revalidate: bool = True
+    ) -> Dict[str, Union[Path, Exception]]:
+        """Fetch ``(url, filename)`` pairs concurrently
+
+        Returns:
+            Dictionary mapping each filename to its local path, or to the
+            exception raised while fetching it
+        """
+        items = list(items)
+        results: Dict[str, Union[Path, Exception]] = {}
+
+        def work(item):
+            url, filename = item
+            try:
+                return filename, self.fetch(url, filename, revalidate=revalidate)
+            except Exception as e:
+                return filename, e
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for filename, outcome in pool.map(work, items):
+                results[filename] = outcome
+        return results
+
+
+def fetch_alphafold(
+    ids: Union[str, Iterable[str]],
+    cache: Optional[StructureCache] = None,
+    version: int = AF_VERSION,
+    revalidate: bool = True,
+) -> Dict[str, Union[Path, Exception]]:
+    """Download AlphaFold DB models for many UniProt IDs
+
+    Returns:
+        Dictionary mapping each UniProt ID to its local file, or to the exception
+        raised while downloading it
+    """
+    cache = cache or StructureCache(AF_CACHE_DIR)
+    ids = parse_ids(ids)
+    filenames = {i: alphafold_filename(i, version) for i in ids}
+    fetched = cache.fetch_many(
+        [(AF_URL.format(filename=f), f) for f in filenames.values()],
+        revalidate=revalidate,
+    )
+    return {i: fetched[f] for i, f in filenames.items()}
+
+
+def fetch_alphamissense(
+    names: Union[str, Iterable[str]],
+    cache: Optional[StructureCache] = None,
+    revalidate: bool = False,
+) -> Dict[str, Union[Path, Exception]]:
+    """Download AlphaMissense structures from hegelab for many UniProt IDs
+
+    The service redirects to the actual data file; the redirect is followed
+    within the same request. Structures are cached by name and, unless
+    ``revalidate`` is set, served from the cache without any network access.
+
+    Returns:
+        Dictionary mapping each name to its local file, or to the exception
+        raised while downloading it
+    """
+    cache = cache or StructureCache(AM_CACHE_DIR)
+    names = parse_ids(names)
+    fetched = cache.fetch_many(
+        [(AM_HEGELAB_URL.format(name=n), f"{n}.pdb") for n in names],
+        revalidate=revalidate,
+    )
+    return {n: fetched[f"{n}.pdb"] for n in names}
@@ -1,17 +1,34 @@
+import numpy as np
 import streamlit as st
 import requests
-import json
+import importlib.util
 import os
 import re
-from rdkit import Chem
 import warnings
 
+from ccd_index import load_index
+
+# chem.py has no package imports; load it by path so the app neither imports
+# the PyMOL plugin through the pymolfold package nor puts the plugin modules
+# on the import path
+_CHEM_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "chem.py"
+)
+_chem_spec = importlib.util.spec_from_file_location("pymolfold_chem", _CHEM_PATH)
+_chem = importlib.util.module_from_spec(_chem_spec)
+_chem_spec.loader.exec_module(_chem)
+canonicalize_smiles = _chem.canonicalize_smiles
+is_valid_smiles = _chem.is_valid_smiles
+
 warnings.filterwarnings("ignore")
 
 # --- Constants and Examples ---
 ESMFOLD_API_URL = "https://api.esmatlas.com/foldSequence/v1/pdb/"
 ESM3_API_URL = "https://forge.evolutionaryscale.ai/"
 BOLTZ2_API_URL = "https://health.api.nvidia.com/v1/biology/mit/boltz2/predict"
+PLUGIN_SERVER_URL = "http://127.0.0.1:5002"
+JOB_POLL_SECONDS = 2
+TERMINAL_JOB_STATES = {"loaded", "failed", "cancelled"}
 
 EXAMPLES = [
     {
@@ -78,9 +95,14 @@ EXAMPLES = [
     },
 ]
 
-EXIST_CCD = json.load(
-    open(os.path.join(os.path.dirname(__file__), "ccd_keys.json"), "rb")
-)
+CCD_SUGGESTION_LIMIT = 8
+
+
+@st.cache_resource(show_spinner=False)
+def get_ccd_index():
+    """Process-wide CCD index, shared by all sessions and reruns."""
+    return load_index()
+
 
 # --- Session State Initialization ---
 if "entities" not in st.session_state:
@@ -102,6 +124,8 @@ if "running" not in st.session_state:
     st.session_state.running = False
 if "current_tab" not in st.session_state:
     st.session_state.current_tab = "Boltz-2"
+if "job_ids" not in st.session_state:
+    st.session_state.job_ids = []
 
 
 def is_valid_dna(seq: str) -> bool:
@@ -118,16 +142,23 @@ def is_valid_protein(seq: str) -> bool:
 
 
 def check_CCD(s: str) -> bool:
-    return s in EXIST_CCD
+    return s.strip().upper() in get_ccd_index()
+
+
+def render_ccd_suggestions(value: str):
+    """Show prefix matches below a CCD input until it holds a known code."""
+    value = (value or "").strip()
+    if not value or check_CCD(value):
+        return
+    matches = get_ccd_index().complete(value, limit=CCD_SUGGESTION_LIMIT)
+    if matches:
+        st.caption("Suggestions: " + ", ".join(matches))
+    else:
+        st.caption(f"No CCD code starts with '{value.upper()}'.")
 
 
 def check_SMILES(s: str) -> bool:
-    try:
-        if Chem.MolFromSmiles(s) is None:
-            return False
-    except Exception:
-        return False
-    return True
+    return is_valid_smiles(s)
 
 
 # --- Callback Functions ---
@@ -223,6 +254,9 @@ def render_modifications(entity, entity_index):
                 placeholder="eg ATP",
                 help="Input a CCD for the modification.",
             )
+            render_ccd_suggestions(
+                st.session_state.get(f"mod_ccd_{entity_index}_{mod_index}", "")
+            )
         with mod_cols[2]:
             st.button(
                 "🗑️",
@@ -331,6 +365,7 @@ def render_ligand_ccd_card(entity, index):
             key=f"ccd_{index}",
             placeholder="eg = ATP (adenosine triphosphate)",
         )
+        render_ccd_suggestions(st.session_state.get(f"ccd_{index}", ""))
 
 
 def render_ligand_smiles_card(entity, index):
@@ -366,6 +401,8 @@ def gather_submission_data():
 
     if st.session_state.get("diffusion_samples"):
         submission["diffusion_samples"] = st.session_state.diffusion_samples
+    submission["multistate"] = st.session_state.get("boltz_multistate", True)
+    submission["msa_max_depth"] = st.session_state.get("msa_max_depth", 1024)
 
     for i, entity in enumerate(st.session_state.entities):
         entity_data = {"type": entity["type"], "chain_id": entity["chain_id"]}
@@ -378,7 +415,9 @@ def gather_submission_data():
             for mod_i in range(len(entity.get("modifications", []))):
                 mod_data = {
                     "residue_index": st.session_state.get(f"mod_idx_{i}_{mod_i}"),
-                    "ccd": st.session_state.get(f"mod_ccd_{i}_{mod_i}", ""),
+                    "ccd": st.session_state.get(f"mod_ccd_{i}_{mod_i}", "")
+                    .strip()
+                    .upper(),
                 }
                 mods.append(mod_data)
             entity_data["modifications"] = mods
@@ -390,7 +429,9 @@ def gather_submission_data():
             for mod_i in range(len(entity.get("modifications", []))):
                 mod_data = {
                     "residue_index": st.session_state.get(f"mod_idx_{i}_{mod_i}"),
-                    "ccd": st.session_state.get(f"mod_ccd_{i}_{mod_i}", ""),
+                    "ccd": st.session_state.get(f"mod_ccd_{i}_{mod_i}", "")
+                    .strip()
+                    .upper(),
                 }
                 mods.append(mod_data)
             entity_data["modifications"] = mods
@@ -402,13 +443,17 @@ def gather_submission_data():
             for mod_i in range(len(entity.get("modifications", []))):
                 mod_data = {
                     "residue_index": st.session_state.get(f"mod_idx_{i}_{mod_i}"),
-                    "ccd": st.session_state.get(f"mod_ccd_{i}_{mod_i}", ""),
+                    "ccd": st.session_state.get(f"mod_ccd_{i}_{mod_i}", "")
+                    .strip()
+                    .upper(),
                 }
                 mods.append(mod_data)
             entity_data["modifications"] = mods
 
         elif entity["type"] == "Ligand (CCD)":
-            entity_data["ccd_string"] = st.session_state.get(f"ccd_{i}", "")
+            entity_data["ccd_string"] = (
+                st.session_state.get(f"ccd_{i}", "").strip().upper()
+            )
 
         elif entity["type"] == "Ligand (SMILES)":
             entity_data["smiles_string"] = st.session_state.get(f"smi_{i}", "")
@@ -444,10 +489,20 @@ def run_submission():
             errors.append(
                 f"Ligand (CCD) Chain {ent['chain_id']} is invalid CCD string."
             )
-        elif t == "Ligand (SMILES)" and not check_SMILES(ent.get("smiles_string", "")):
-            errors.append(
-                f"Ligand (SMILES) Chain {ent['chain_id']} is not a valid SMILES."
-            )
+        elif t == "Ligand (SMILES)":
+            canonical = canonicalize_smiles(ent.get("smiles_string", ""))
+            if canonical is None:
+                errors.append(
+                    f"Ligand (SMILES) Chain {ent['chain_id']} is not a valid SMILES."
+                )
+            else:
+                ent["smiles_string"] = canonical
+        for mod in ent.get("modifications", []):
+            if not check_CCD(mod.get("ccd", "")):
+                errors.append(
+                    f"Modification at residue {mod.get('residue_index')} of Chain "
+                    f"{ent['chain_id']} is invalid CCD string."
+                )
     st.session_state.final_data = final_data
     st.session_state.run_errors = errors
     st.session_state.run_submitted = True
@@ -467,16 +522,19 @@ def run_submission():
             "selected_ligand": st.session_state.get("affinity_ligand_select"),
         }
         final_data["binding_affinity_settings"] = affinity_settings
+    submit_job("/jobs/boltz2", {"sub_data": final_data})
+
+
+def submit_job(endpoint: str, payload: dict):
+    """Queue a job on the local plugin server; returns as soon as it is accepted."""
     try:
-        resp = requests.post(
-            "http://127.0.0.1:5002/run_boltz2",
-            json={"sub_data": final_data},
-            timeout=400,
-        )
+        resp = requests.post(f"{PLUGIN_SERVER_URL}{endpoint}", json=payload, timeout=10)
         if resp.status_code == 200:
+            job_id = resp.json()["job_id"]
+            st.session_state.job_ids.append(job_id)
             st.session_state.run_success = True
             st.session_state.run_server_msg = (
-                "Submission sent to PyMOL plugin successfully!"
+                f"Job {job_id} queued. Results are loaded into PyMOL when ready."
             )
         else:
             st.session_state.run_server_msg = f"Plugin server error: {resp.text}"
@@ -486,6 +544,61 @@ def run_submission():
         st.session_state.running = False
 
 
+def fetch_jobs(job_ids):
+    """Poll the plugin server for the state of the given jobs."""
+    if not job_ids:
+        return []
+    try:
+        resp = requests.get(
+            f"{PLUGIN_SERVER_URL}/jobs", params={"ids": ",".join(job_ids)}, timeout=5
+        )
+        resp.raise_for_status()
+        return resp.json()
+    except Exception:
+        return None
+
+
+def format_seconds(value):
+    if value is None:
+        return "–"
+    minutes, seconds = divmod(int(value), 60)
+    return f"{minutes}:{seconds:02d}"
+
+
+def render_jobs(polling: bool = False):
+    """Table of this session's jobs, refreshed while any of them is running."""
+    jobs = fetch_jobs(st.session_state.job_ids)
+    if jobs is None:
+        st.warning("Could not reach the local plugin server for job status.")
+        return
+    if not jobs:
+        return
+    if polling and all(j["state"] in TERMINAL_JOB_STATES for j in jobs):
+        # Everything finished: rerun the whole page once to stop polling
+        st.rerun()
+    st.subheader("Jobs")
+    st.dataframe(
+        [
+            {
+                "Job": job["id"],
+                "Model": job["kind"],
+                "Name": job["name"],
+                "State": job["state"],
+                "Elapsed": format_seconds(job["elapsed"]),
+                "ETA": format_seconds(job["eta"]),
+                "Message": job["message"],
+            }
+            for job in reversed(jobs)
+        ],
+        use_container_width=True,
+        hide_index=True,
+    )
+    if st.button("Clear finished jobs"):
+        active = {j["id"] for j in jobs if j["state"] not in TERMINAL_JOB_STATES}
+        st.session_state.job_ids = [i for i in st.session_state.job_ids if i in active]
+        st.rerun()
+
+
 def run_esm_submission(model_type: str):
     st.session_state.running = True
     st.session_state.run_errors = []
@@ -496,19 +609,18 @@ def run_esm_submission(model_type: str):
     if model_type == "esmfold":
         sequence = st.session_state.get("esmfold_sequence", "")
         name = st.session_state.get("esmfold_name", "esmfold_prediction")
-        endpoint = "/run_esmfold"
-        if len(sequence) > 400:
-            st.session_state.run_errors.append(
-                "ESMFold only supports sequences up to 400 amino acids."
-            )
-            st.session_state.running = False
-            return
+        endpoint = "/jobs/esmfold"
         payload = {"sequence": sequence, "name": name}
     elif model_type == "esm3":
         sequence = st.session_state.get("esm3_sequence", "")
         name = st.session_state.get("esm3_name", "esm3_prediction")
-        endpoint = "/run_esm3"
-        payload = {"sequence": sequence, "name": name}
+        endpoint = "/jobs/esm3"
+        payload = {
+            "sequence": sequence,
+            "name": name,
+            "num_samples": st.session_state.get("esm3_num_samples", 1),
+            "multistate": st.session_state.get("esm3_multistate", True),
+        }
     else:
         st.session_state.run_errors.append(f"Unknown model type: {model_type}")
         st.session_state.running = False
@@ -523,23 +635,7 @@ def run_esm_submission(model_type: str):
         st.session_state.running = False
         return
 
-    try:
-        resp = requests.post(
-            f"http://127.0.0.1:5002{endpoint}",
-            json=payload,
-            timeout=400,
-        )
-        if resp.status_code == 200:
-            st.session_state.run_success = True
-            st.session_state.run_server_msg = (
-                "✅ Prediction successful! The result has been loaded into PyMOL."
-            )
-        else:
-            st.session_state.run_server_msg = f"Prediction failed: {resp.text}"
-    except Exception as e:
-        st.session_state.run_server_msg = f"Could not contact local plugin server: {e}"
-    finally:
-        st.session_state.running = False
+    submit_job(endpoint, payload)
 
 
 # --- Main Application UI ---
@@ -547,7 +643,9 @@ st.set_page_config(page_title="PymolFold-Interface", layout="wide")
 
 st.title("PymolFold Interface")
 
-tab1, tab2, tab3 = st.tabs(["Boltz-2", "ESMFold", "ESM3"])
+tab1, tab2, tab3, tab4, tab5 = st.tabs(
+    ["Boltz-2", "ESMFold", "ESM3", "Catalog", "Arrays"]
+)
 
 with tab1:
     st.header("Boltz-2")
@@ -576,6 +674,22 @@ with tab1:
         step=1,
         key="diffusion_samples",
     )
+    st.checkbox(
+        "Load samples as states of one object",
+        value=True,
+        key="boltz_multistate",
+        help="Samples are ordered by pLDDT, best first. Use pf_split_state to extract one.",
+    )
+    st.number_input(
+        "Maximum MSA depth",
+        min_value=0,
+        max_value=16384,
+        value=1024,
+        step=256,
+        key="msa_max_depth",
+        help="MSAs are filtered by identity (90%) and coverage (50%) and "
+        "subsampled to this many sequences before submission. 0 keeps the full MSA.",
+    )
     # --- Example Dialog Logic ---
     if st.session_state.get("show_examples_dialog", False):
         st.dialog("Select an Example")
@@ -670,7 +784,7 @@ with tab2:
         **ESMFold** is a fast, accurate model for predicting the structure of single protein chains. You can use it without any API Key.
         - **Official Website**: [ESM Metagenomic Atlas](https://esmatlas.com/)
         - **API URL**: `{ESMFOLD_API_URL}`
-        - **Limitation**: Only supports sequences up to 400 amino acids.
+        - **Limitation**: The API folds up to 400 amino acids at once. Longer sequences are folded in overlapping windows that are stitched together, which gives a fast but approximate model.
         """
     )
     st.text_input(
@@ -712,6 +826,22 @@ with tab3:
         height=200,
         placeholder="Enter protein sequence here...",
     )
+    esm3_cols = st.columns(2)
+    with esm3_cols[0]:
+        st.number_input(
+            "Number of samples",
+            min_value=1,
+            max_value=10,
+            value=1,
+            step=1,
+            key="esm3_num_samples",
+        )
+    with esm3_cols[1]:
+        st.checkbox(
+            "Load samples as states of one object",
+            value=True,
+            key="esm3_multistate",
+        )
     st.button(
         "Run ESM3",
         type="primary",
@@ -720,6 +850,169 @@ with tab3:
         args=("esm3",),
     )
 
+with tab4:
+    st.header("Prediction Catalog")
+    st.markdown(
+        "Search every prediction saved in the plugin's working directory by "
+        "sequence or by name (wildcards such as `*` are allowed)."
+    )
+    catalog_cols = st.columns([6, 2, 2])
+    catalog_query = catalog_cols[0].text_input(
+        "Sequence or name", key="catalog_query", placeholder="e.g. MKT* or a sequence"
+    )
+    catalog_predictor = catalog_cols[1].selectbox(
+        "Predictor",
+        ["", "ESMFold", "ESM3", "Boltz2"],
+        key="catalog_predictor",
+        format_func=lambda x: x or "Any",
+    )
+    catalog_min_plddt = catalog_cols[2].number_input(
+        "Min pLDDT", min_value=0.0, max_value=100.0, value=0.0, key="catalog_plddt"
+    )
+    try:
+        resp = requests.get(
+            f"{PLUGIN_SERVER_URL}/catalog",
+            params={
+                "query": catalog_query,
+                "predictor": catalog_predictor,
+                "min_plddt": catalog_min_plddt or None,
+                "limit": 200,
+            },
+            timeout=5,
+        )
+        resp.raise_for_status()
+        catalog_rows = resp.json()
+    except Exception as e:
+        catalog_rows = []
+        st.warning(f"Could not query the catalog on the local plugin server: {e}")
+    if catalog_rows:
+        st.dataframe(
+            [
+                {
+                    "ID": row["id"],
+                    "Name": row["name"],
+                    "Predictor": row["predictor"],
+                    "Length": row["length"],
+                    "pLDDT": row["plddt"],
+                    "Time (s)": row["duration"],
+                    "Files": ", ".join(row["paths"] or []),
+                }
+                for row in catalog_rows
+            ],
+            use_container_width=True,
+            hide_index=True,
+        )
+    else:
+        st.info("No matching predictions.")
+
+with tab5:
+    st.header("Batch Arrays")
+    st.markdown(
+        "Per-residue pLDDT and PAE of batch predictions, read from the memory-mapped "
+        "arrays written with `pf_arrays on` (no structure files are parsed)."
+    )
+    try:
+        resp = requests.get(f"{PLUGIN_SERVER_URL}/arrays", timeout=5)
+        resp.raise_for_status()
+        array_batches = resp.json()
+    except Exception as e:
+        array_batches = []
+        st.warning(f"Could not list batch arrays on the local plugin server: {e}")
+    if array_batches:
+        batch_sizes = {b["batch"]: b["models"] for b in array_batches}
+        array_batch = st.selectbox(
+            "Batch",
+            list(batch_sizes),
+            key="array_batch",
+            format_func=lambda b: f"{b} ({batch_sizes[b]} models)",
+        )
+        try:
+            resp = requests.get(f"{PLUGIN_SERVER_URL}/arrays/{array_batch}", timeout=10)
+            resp.raise_for_status()
+            array_rows = resp.json()
+        except Exception as e:
+            array_rows = []
+            st.warning(f"Could not read the batch index: {e}")
+        st.dataframe(
+            [
+                {
+                    "ID": row["id"],
+                    "Name": row["name"],
+                    "Predictor": row["predictor"],
+                    "Residues": row["n_residues"],
+                    "Atoms": row["n_atoms"],
+                    "pLDDT": row["plddt"],
+                    "PAE": row["pae_size"] is not None,
+                }
+                for row in array_rows
+            ],
+            use_container_width=True,
+            hide_index=True,
+        )
+        labels = {row["id"]: row["name"] or str(row["id"]) for row in array_rows}
+        selected = st.multiselect(
+            "Models to compare",
+            list(labels),
+            default=list(labels)[:5],
+            format_func=lambda i: f"{i}: {labels[i]}",
+            key="array_models",
+        )
+        if selected:
+            try:
+                resp = requests.get(
+                    f"{PLUGIN_SERVER_URL}/arrays/{array_batch}/plddt",
+                    params={"ids": ",".join(map(str, selected))},
+                    timeout=10,
+                )
+                resp.raise_for_status()
+                profiles = resp.json()
+            except Exception as e:
+                profiles = {}
+                st.warning(f"Could not read pLDDT arrays: {e}")
+            length = max((len(p) for p in profiles.values()), default=0)
+            st.line_chart(
+                [
+                    {
+                        "residue": r + 1,
+                        **{
+                            f"{i}: {labels[int(i)]}": p[r]
+                            for i, p in profiles.items()
+                            if r < len(p)
+                        },
+                    }
+                    for r in range(length)
+                ],
+                x="residue",
+            )
+            pae_sizes = {row["id"]: row["pae_size"] for row in array_rows}
+            with_pae = [i for i in selected if pae_sizes.get(i) is not None]
+            if with_pae:
+                pae_model = st.selectbox(
+                    "PAE of model",
+                    with_pae,
+                    format_func=lambda i: f"{i}: {labels[i]}",
+                    key="array_pae_model",
+                )
+                try:
+                    resp = requests.get(
+                        f"{PLUGIN_SERVER_URL}/arrays/{array_batch}/{pae_model}/pae",
+                        timeout=10,
+                    )
+                    resp.raise_for_status()
+                    pae = np.asarray(resp.json(), dtype=float)
+                    high = float(pae.max()) or 1.0
+                    # Dark is confident (low expected error), as usual for PAE plots
+                    st.image(
+                        pae / high,
+                        caption=f"PAE (0 to {high:.1f} A)",
+                        clamp=True,
+                        width=400,
+                    )
+                except Exception as e:
+                    st.warning(f"Could not read the PAE matrix: {e}")
+    else:
+        st.info("No batch arrays yet. Run `pf_arrays on` in PyMOL, then a batch.")
+
 # Unified status / results area (moved outside footer columns)
 if st.session_state.get("running"):
     st.info("Running simulation...")
@@ -735,6 +1028,13 @@ elif st.session_state.get("run_submitted"):
             if st.session_state.run_server_msg:
                 st.warning(st.session_state.run_server_msg)
 
+# Job progress, polled from the plugin server while jobs are running
+_job_states = fetch_jobs(st.session_state.job_ids) or []
+_jobs_active = any(j["state"] not in TERMINAL_JOB_STATES for j in _job_states)
+st.fragment(run_every=JOB_POLL_SECONDS if _jobs_active else None)(render_jobs)(
+    polling=_jobs_active
+)
+
 # Optional: allow user to inspect submission JSON
 if st.session_state.get("final_data") and st.checkbox("Show submission JSON"):
     st.json(st.session_state.final_data)
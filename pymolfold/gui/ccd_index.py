@@ -0,0 +1,109 @@
+"""Indexed lookup of RCSB CCD component codes for the Streamlit UI.
+
+The codes ship as ``ccd_keys.json``. A compact binary copy (``ccd_keys.bin``:
+a magic header followed by the zlib-compressed, sorted, newline-separated
+codes) is preferred when present because it loads in a few milliseconds and
+needs no sorting. If the binary file is missing or older than the JSON file it
+is rebuilt on first use.
+"""
+
+import json
+import os
+import zlib
+from bisect import bisect_left
+from typing import Iterable, List, Optional
+
+GUI_DIR = os.path.dirname(os.path.abspath(__file__))
+CCD_JSON_PATH = os.path.join(GUI_DIR, "ccd_keys.json")
+CCD_BIN_PATH = os.path.join(GUI_DIR, "ccd_keys.bin")
+CCD_BIN_MAGIC = b"PFCCD1\n"
+
+
+class CCDIndex:
+    """Set membership plus a sorted prefix index over CCD codes."""
+
+    __slots__ = ("_codes", "_sorted")
+
+    def __init__(self, codes: Iterable[str], presorted: bool = False):
+        self._sorted = list(codes) if presorted else sorted(set(codes))
+        self._codes = frozenset(self._sorted)
+
+    def __len__(self) -> int:
+        return len(self._sorted)
+
+    def __contains__(self, code: str) -> bool:
+        return code in self._codes
+
+    def complete(self, prefix: str, limit: int = 10) -> List[str]:
+        """Return up to ``limit`` codes starting with ``prefix`` (case-insensitive).
+
+        Args:
+            prefix: Partial CCD code typed by the user
+            limit: Maximum number of suggestions
+
+        Returns:
+            Matching codes in sorted order
+        """
+        prefix = (prefix or "").strip().upper()
+        if not prefix:
+            return []
+        start = bisect_left(self._sorted, prefix)
+        matches = []
+        for code in self._sorted[start : start + limit]:
+            if not code.startswith(prefix):
+                break
+            matches.append(code)
+        return matches
+
+
+def write_binary(codes: Iterable[str], path: str = CCD_BIN_PATH) -> str:
+    """Write codes to the compact binary format and return the path."""
+    payload = "\n".join(sorted(set(codes))).encode("ascii")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(CCD_BIN_MAGIC)
+        f.write(zlib.compress(payload, 9))
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_binary(path: str = CCD_BIN_PATH) -> Optional[List[str]]:
+    """Read sorted codes from the binary format, or None if unusable."""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    if not data.startswith(CCD_BIN_MAGIC):
+        return None
+    try:
+        payload = zlib.decompress(data[len(CCD_BIN_MAGIC) :])
+    except zlib.error:
+        return None
+    return payload.decode("ascii").split("\n") if payload else []
+
+
+def load_index(json_path: str = CCD_JSON_PATH, bin_path: str = CCD_BIN_PATH) -> CCDIndex:
+    """Load the CCD index, preferring (and refreshing) the binary key file."""
+    bin_fresh = os.path.exists(bin_path) and (
+        not os.path.exists(json_path)
+        or os.path.getmtime(bin_path) >= os.path.getmtime(json_path)
+    )
+    if bin_fresh:
+        codes = read_binary(bin_path)
+        if codes is not None:
+            return CCDIndex(codes, presorted=True)
+
+    with open(json_path, "rb") as f:
+        index = CCDIndex(json.load(f))
+    try:
+        write_binary(index._sorted, bin_path)
+    except OSError:
+        # Read-only installs simply keep using the JSON file
+        pass
+    return index
+
+
+if __name__ == "__main__":
+    with open(CCD_JSON_PATH, "rb") as f:
+        print(f"Wrote {write_binary(json.load(f))}")
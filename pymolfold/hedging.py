@@ -0,0 +1,231 @@
+"""Hedged requests for tail-latency control.
+
+ESMFold atlas latency varies a lot and a few requests hang far longer than the
+median. In hedging mode a request that has not answered within a delay taken
+from the backend's own latency history (by default its 95th percentile) is also
+sent to a secondary backend; the first good answer wins and the other attempt
+is cancelled (or, if already running, its answer is discarded once its own
+timeout expires).
+
+Latencies and hedging outcomes are kept per backend in a small JSON file in the
+cache directory, so the delay follows real latency history across sessions and
+the hedge rate can be inspected (``pf_latency``).
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+from .fetch import DEFAULT_CACHE_DIR
+
+LATENCY_FILENAME = "latency.json"
+DEFAULT_PERCENTILE = 95.0
+DEFAULT_DELAY = 30.0
+MIN_DELAY = 2.0
+MAX_DELAY = 300.0
+MIN_SAMPLES = 10
+COUNTERS = ("requests", "hedged", "hedge_wins", "fallbacks", "failures")
+
+_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="pymolfold-hedge")
+
+
+class LatencyTracker:
+    """Recent latencies and hedging counters per backend, persisted as JSON"""
+
+    def __init__(
+        self, path: Optional[Union[str, Path]] = None, history_size: int = 200
+    ):
+        self.path = Path(path).expanduser() if path else None
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, deque] = defaultdict(
+            lambda: deque(maxlen=history_size)
+        )
+        self._counters: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: dict.fromkeys(COUNTERS, 0)
+        )
+        self._load()
+
+    def _load(self):
+        if self.path is None:
+            return
+        try:
+            data = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return
+        for backend, values in data.get("latencies", {}).items():
+            self._latencies[backend].extend(float(v) for v in values)
+        for backend, counters in data.get("counters", {}).items():
+            self._counters[backend].update(counters)
+
+    def _save(self):
+        # Called with the lock held
+        if self.path is None:
+            return
+        data = {
+            "latencies": {
+                k: [round(v, 3) for v in d] for k, d in self._latencies.items()
+            },
+            "counters": dict(self._counters),
+        }
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=str(self.path.parent), suffix=".tmp")
+            with os.fdopen(fd, "w") as handle:
+                json.dump(data, handle)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+    def record(self, backend: str, seconds: float):
+        """Add the latency of a successful request"""
+        with self._lock:
+            self._latencies[backend].append(seconds)
+            self._save()
+
+    def count(self, backend: str, event: str):
+        with self._lock:
+            self._counters[backend][event] += 1
+            self._save()
+
+    def percentile(self, backend: str, q: float) -> Optional[float]:
+        """``q``-th percentile of recent latencies; None with too little history"""
+        with self._lock:
+            values = sorted(self._latencies.get(backend, ()))
+        if len(values) < MIN_SAMPLES:
+            return None
+        rank = (len(values) - 1) * min(max(q, 0.0), 100.0) / 100.0
+        low = int(rank)
+        high = min(low + 1, len(values) - 1)
+        return values[low] + (values[high] - values[low]) * (rank - low)
+
+    def delay(
+        self,
+        backend: str,
+        q: float = DEFAULT_PERCENTILE,
+        default: float = DEFAULT_DELAY,
+    ) -> float:
+        """Seconds to wait for ``backend`` before hedging"""
+        value = self.percentile(backend, q)
+        if value is None:
+            return default
+        return min(max(value, MIN_DELAY), MAX_DELAY)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Latency percentiles, counters and hedge/win rates per backend"""
+        with self._lock:
+            backends = sorted(set(self._latencies) | set(self._counters))
+        out = {}
+        for backend in backends:
+            with self._lock:
+                counters = dict.fromkeys(COUNTERS, 0)
+                counters.update(self._counters.get(backend, {}))
+                samples = len(self._latencies.get(backend, ()))
+            requests = counters["requests"]
+            out[backend] = {
+                "samples": samples,
+                "p50": self.percentile(backend, 50),
+                "p95": self.percentile(backend, 95),
+                **counters,
+                "hedge_rate": counters["hedged"] / requests if requests else None,
+                "hedge_win_rate": (
+                    counters["hedge_wins"] / counters["hedged"]
+                    if counters["hedged"]
+                    else None
+                ),
+            }
+        return out
+
+
+_tracker: Optional[LatencyTracker] = None
+_tracker_lock = threading.Lock()
+
+
+def get_latency_tracker() -> LatencyTracker:
+    """Shared tracker stored in the PymolFold cache directory"""
+    global _tracker
+    with _tracker_lock:
+        if _tracker is None:
+            _tracker = LatencyTracker(Path(DEFAULT_CACHE_DIR) / LATENCY_FILENAME)
+        return _tracker
+
+
+def hedged_call(
+    primary: Tuple[str, Callable[[], Any]],
+    secondary: Tuple[str, Callable[[], Any]],
+    delay: Optional[float] = None,
+    tracker: Optional[LatencyTracker] = None,
+) -> Tuple[Any, str]:
+    """Call ``primary``; after ``delay`` seconds also call ``secondary``
+
+    Both are ``(backend, fn)`` pairs. If the primary fails before the delay,
+    the secondary is started at once as a fallback.
+
+    Args:
+        delay: Seconds before hedging; defaults to the primary backend's
+            latency percentile (see ``LatencyTracker.delay``)
+
+    Returns:
+        (result of the first successful call, its backend)
+
+    Raises:
+        The primary's exception if every attempt failed
+    """
+    tracker = tracker or get_latency_tracker()
+    name = primary[0]
+    if delay is None:
+        delay = tracker.delay(name)
+    tracker.count(name, "requests")
+
+    def launch(backend, fn, started=None):
+        # Latency is timed from when a pool thread picks the call up, so time
+        # spent queued behind other folds does not count against the backend
+        def timed():
+            if started is not None:
+                started.set()
+            start = time.perf_counter()
+            value = fn()
+            tracker.record(backend, time.perf_counter() - start)
+            return value
+
+        return _POOL.submit(timed)
+
+    started = threading.Event()
+    first = launch(*primary, started)
+    roles = {first: "primary"}
+    # The hedging delay also starts once the primary is actually running
+    while not started.wait(0.1):
+        if first.done():
+            break
+    finished, _ = wait([first], timeout=delay)
+    hedged = not finished
+    if hedged:
+        tracker.count(name, "hedged")
+        roles[launch(*secondary)] = "secondary"
+
+    errors = []
+    pending = set(roles)
+    while pending:
+        finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in finished:
+            if future.exception() is None:
+                for other in pending:
+                    other.cancel()
+                if hedged and roles[future] == "secondary":
+                    tracker.count(name, "hedge_wins")
+                backend = primary[0] if roles[future] == "primary" else secondary[0]
+                return future.result(), backend
+            errors.append(future.exception())
+            if len(roles) == 1:
+                # The primary failed before the delay expired
+                tracker.count(name, "fallbacks")
+                fallback = launch(*secondary)
+                roles[fallback] = "secondary"
+                pending.add(fallback)
+    tracker.count(name, "failures")
+    raise errors[0]
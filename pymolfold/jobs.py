@@ -0,0 +1,179 @@
+"""Bookkeeping for prediction jobs that run in the background.
+
+A job moves through a small set of states (queued -> running/msa -> predicting ->
+polling -> downloading -> saving -> loaded) and ends in one of the terminal
+states. The registry is shared by the local server and the plugin so every
+front end sees the same view of running work.
+"""
+
+import statistics
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+JOB_STATES = (
+    "queued",
+    "running",
+    "msa",
+    "predicting",
+    "polling",
+    "downloading",
+    "saving",
+    "loaded",
+    "failed",
+    "cancelled",
+)
+TERMINAL_STATES = frozenset({"loaded", "failed", "cancelled"})
+
+
+@dataclass
+class Job:
+    """A single prediction job and its progress"""
+
+    id: str
+    kind: str
+    name: str
+    priority: str = "interactive"
+    state: str = "queued"
+    message: str = ""
+    created: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    result: Any = None
+    error: Optional[str] = None
+
+    @property
+    def done(self) -> bool:
+        return self.state in TERMINAL_STATES
+
+    def elapsed(self) -> float:
+        """Seconds since the job started running (or was queued)"""
+        start = self.started or self.created
+        end = self.finished or time.time()
+        return max(0.0, end - start)
+
+    def to_dict(self, eta: Optional[float] = None) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "name": self.name,
+            "priority": self.priority,
+            "state": self.state,
+            "message": self.message,
+            "elapsed": round(self.elapsed(), 1),
+            "eta": None if eta is None else round(eta, 1),
+            "error": self.error,
+            "result": self.result if isinstance(self.result, (dict, list)) else None,
+        }
+
+
+class JobRegistry:
+    """Thread-safe registry of jobs with duration history for ETA estimates"""
+
+    def __init__(self, max_finished: int = 200, history_size: int = 50):
+        self._lock = threading.RLock()
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._durations = defaultdict(lambda: deque(maxlen=history_size))
+        self._max_finished = max_finished
+
+    def create(self, kind: str, name: str, priority: str = "interactive") -> Job:
+        job = Job(id=uuid.uuid4().hex[:12], kind=kind, name=name, priority=priority)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self, ids: Optional[List[str]] = None) -> List[Job]:
+        with self._lock:
+            if ids is None:
+                return list(self._jobs.values())
+            return [self._jobs[i] for i in ids if i in self._jobs]
+
+    def update(self, job_id: str, state: str, message: str = ""):
+        """Move a job to a new (non-terminal) state"""
+        if state not in JOB_STATES:
+            raise ValueError(f"Unknown job state: {state}")
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.done:
+                return
+            if job.started is None and state != "queued":
+                job.started = time.time()
+            job.state = state
+            job.message = message
+
+    def set_priority(self, job_id: str, priority: str) -> bool:
+        """Record a new priority class of a job that has not finished"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.done:
+                return False
+            job.priority = priority
+            return True
+
+    def finish(self, job_id: str, result: Any = None, message: str = ""):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.done:
+                return
+            job.state = "loaded"
+            job.result = result
+            job.message = message
+            job.finished = time.time()
+            self._durations[job.kind].append(job.elapsed())
+
+    def fail(self, job_id: str, error: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.done:
+                return
+            job.state = "failed"
+            job.error = error
+            job.message = error
+            job.finished = time.time()
+
+    def cancel(self, job_id: str) -> bool:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.done:
+                return False
+            job.state = "cancelled"
+            job.message = "Cancelled"
+            job.finished = time.time()
+            return True
+
+    def eta(self, job: Job) -> Optional[float]:
+        """Estimated seconds remaining, from the median of past durations"""
+        if job.done:
+            return 0.0
+        with self._lock:
+            history = list(self._durations[job.kind])
+        if not history:
+            return None
+        return max(0.0, statistics.median(history) - job.elapsed())
+
+    def snapshot(self, ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        return [job.to_dict(eta=self.eta(job)) for job in self.list(ids)]
+
+    def progress_callback(self, job_id: str):
+        """Return a ``callback(state, message="")`` bound to one job"""
+
+        def callback(state: str, message: str = ""):
+            self.update(job_id, state, message)
+
+        return callback
+
+    def _prune(self):
+        finished = [j.id for j in self._jobs.values() if j.done]
+        for job_id in finished[: max(0, len(finished) - self._max_finished)]:
+            del self._jobs[job_id]
+
+
+JOBS = JobRegistry()
@@ -0,0 +1,51 @@
+"""Advisory inter-process file locks (``fcntl``, or ``msvcrt`` on Windows).
+
+Locks belong to the open file and are dropped by the operating system when
+the process holding them exits, so a crash never leaves a stale lock behind.
+"""
+
+import contextlib
+from pathlib import Path
+from typing import Iterator, Union
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def lock(handle, blocking: bool = True) -> bool:
+    """Exclusively lock an open file; False if ``blocking`` is off and it is taken"""
+    try:
+        if fcntl is not None:
+            flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+            fcntl.flock(handle.fileno(), flags)
+        else:
+            handle.seek(0)
+            mode = msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK
+            msvcrt.locking(handle.fileno(), mode, 1)
+    except OSError:
+        if blocking:
+            raise
+        return False
+    return True
+
+
+def unlock(handle):
+    if fcntl is not None:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+    else:
+        handle.seek(0)
+        msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextlib.contextmanager
+def file_lock(path: Union[str, Path]) -> Iterator[None]:
+    """Hold an exclusive lock on ``path`` (created if needed) for the block"""
+    with open(path, "a+") as handle:
+        lock(handle)
+        try:
+            yield
+        finally:
+            unlock(handle)
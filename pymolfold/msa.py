@@ -0,0 +1,245 @@
+"""Redundancy, coverage and depth filtering of a3m multiple sequence alignments.
+
+Alignments from the MSA server can hold tens of thousands of homologs, most of
+them near-duplicates. Before they are inlined into a Boltz request they are
+reduced greedily, in the server's (e-value) order, much like ``hhfilter``:
+
+* sequences covering less than ``min_coverage`` of the query are dropped,
+* a sequence more than ``max_seq_id`` identical to one already kept is dropped,
+* filtering stops once ``max_depth`` sequences (query included) are kept.
+
+Records are parsed lazily and processed in blocks; each block is encoded as a
+``uint8`` array and compared to the kept sequences with one-hot matrix
+products, so no per-pair Python loop is involved.
+"""
+
+import io
+import string
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+ALPHABET = "ACDEFGHIKLMNPQRSTVWY"
+GAP = 0
+UNKNOWN = len(ALPHABET) + 1
+NUM_CLASSES = len(ALPHABET) + 1  # residues incl. unknown; gaps are not encoded
+
+_LOOKUP = np.full(256, UNKNOWN, dtype=np.uint8)
+for _code, _letter in enumerate(ALPHABET, start=1):
+    _LOOKUP[ord(_letter)] = _code
+_LOOKUP[ord("-")] = GAP
+# Lower-case letters and '.' are insertions relative to the query
+_DROP_INSERTIONS = str.maketrans("", "", string.ascii_lowercase + ".")
+
+BLOCK_SIZE = 512
+
+
+@dataclass
+class MSAFilterStats:
+    n_input: int = 0
+    n_kept: int = 0
+    bytes_in: int = 0
+    bytes_out: int = 0
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.bytes_in - self.bytes_out
+
+    def __add__(self, other: "MSAFilterStats") -> "MSAFilterStats":
+        return MSAFilterStats(
+            self.n_input + other.n_input,
+            self.n_kept + other.n_kept,
+            self.bytes_in + other.bytes_in,
+            self.bytes_out + other.bytes_out,
+        )
+
+    def __str__(self) -> str:
+        return (
+            f"{self.n_input} -> {self.n_kept} sequences, "
+            f"{self.bytes_saved / 1e6:.2f} MB saved"
+        )
+
+
+def iter_a3m(source: Union[str, Iterable[str]]) -> Iterator[Tuple[str, str]]:
+    """Yield ``(header, sequence)`` records of an a3m alignment one at a time
+
+    Args:
+        source: a3m text, or any iterable of lines such as an open file
+    """
+    lines = io.StringIO(source) if isinstance(source, str) else source
+    header, chunks = None, []
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith(">"):
+            if header is not None:
+                yield header, "".join(chunks)
+            header, chunks = line[1:], []
+        elif header is not None:
+            chunks.append(line.strip())
+    if header is not None:
+        yield header, "".join(chunks)
+
+
+def encode(sequences: List[str], length: int) -> np.ndarray:
+    """Encode aligned a3m sequences (insertions removed) as an N x L uint8 array"""
+    aligned = [s.translate(_DROP_INSERTIONS).upper() for s in sequences]
+    if any(len(s) != length for s in aligned):
+        raise ValueError("Aligned sequences must all match the query length")
+    buffer = np.frombuffer("".join(aligned).encode("ascii", "replace"), np.uint8)
+    return _LOOKUP[buffer].reshape(len(aligned), length)
+
+
+def _one_hot(codes: np.ndarray) -> np.ndarray:
+    classes = np.arange(1, NUM_CLASSES + 1, dtype=np.uint8)
+    return (codes[:, :, None] == classes).reshape(len(codes), -1).astype(np.float32)
+
+
+def filter_a3m(
+    a3m: str,
+    max_seq_id: float = 0.9,
+    min_coverage: float = 0.5,
+    max_depth: int = 1024,
+) -> Tuple[str, MSAFilterStats]:
+    """Filter an a3m alignment; the first record (the query) is always kept
+
+    Args:
+        a3m: Alignment text
+        max_seq_id: Drop sequences more identical than this to a kept one (0-1)
+        min_coverage: Drop sequences aligned to less than this fraction of the query
+        max_depth: Maximum number of sequences kept, query included
+
+    Returns:
+        (filtered a3m text, statistics)
+    """
+    stats = MSAFilterStats(n_input=a3m.count(">"), bytes_in=len(a3m.encode()))
+    records = iter_a3m(a3m)
+    query = next(records, None)
+    if query is None:
+        stats.bytes_out = stats.bytes_in
+        return a3m, stats
+
+    length = len(query[1].translate(_DROP_INSERTIONS))
+    kept: List[Tuple[str, str]] = [query]
+    query_codes = encode([query[1]], length)
+    kept_blocks = [_one_hot(query_codes)]
+    kept_lengths = [np.count_nonzero(query_codes, axis=1)]
+
+    def process(block: List[Tuple[str, str]]):
+        # Malformed records (wrong aligned length) are dropped individually
+        valid = [
+            r for r in block if len(r[1].translate(_DROP_INSERTIONS)) == length
+        ]
+        if not valid:
+            return
+        codes = encode([s for _, s in valid], length)
+        residues = np.count_nonzero(codes, axis=1)
+        covered = residues >= min_coverage * length
+        valid = [r for r, ok in zip(valid, covered) if ok]
+        codes, residues = codes[covered], residues[covered]
+        if not valid:
+            return
+
+        one_hot = _one_hot(codes)
+        redundant = np.zeros(len(valid), dtype=bool)
+        for kept_hot, kept_len in zip(kept_blocks, kept_lengths):
+            matches = one_hot @ kept_hot.T
+            identity = matches / np.maximum(np.minimum.outer(residues, kept_len), 1)
+            redundant |= (identity > max_seq_id).any(axis=1)
+
+        # Greedy selection inside the block, in input order
+        candidates = np.flatnonzero(~redundant)
+        internal = one_hot[candidates] @ one_hot[candidates].T
+        internal /= np.maximum(
+            np.minimum.outer(residues[candidates], residues[candidates]), 1
+        )
+        accepted: List[int] = []
+        for i in range(len(candidates)):
+            if len(kept) + len(accepted) >= max_depth:
+                break
+            if not accepted or not (internal[i, accepted] > max_seq_id).any():
+                accepted.append(i)
+        if accepted:
+            rows = candidates[accepted]
+            kept.extend(valid[r] for r in rows)
+            kept_blocks.append(one_hot[rows])
+            kept_lengths.append(residues[rows])
+
+    block: List[Tuple[str, str]] = []
+    for record in records:
+        if len(kept) >= max_depth:
+            break
+        block.append(record)
+        if len(block) == BLOCK_SIZE:
+            process(block)
+            block = []
+    if block and len(kept) < max_depth:
+        process(block)
+
+    out = "".join(f">{header}\n{sequence}\n" for header, sequence in kept)
+    stats.n_kept = len(kept)
+    stats.bytes_out = len(out.encode())
+    return out, stats
+
+
+def filter_alignments(
+    alignments: Dict[str, Dict[str, Dict[str, str]]],
+    max_seq_id: float = 0.9,
+    min_coverage: float = 0.5,
+    max_depth: Optional[int] = 1024,
+) -> Tuple[Dict[str, Dict[str, Dict[str, str]]], MSAFilterStats]:
+    """Filter every a3m alignment of an MSA-search result
+
+    Args:
+        alignments: ``{database: {format: {"alignment": text, "format": fmt}}}``
+            as returned by the ColabFold MSA search
+        max_depth: Maximum depth of each alignment; ``None`` or 0 disables filtering
+
+    Returns:
+        (filtered alignments, combined statistics)
+    """
+    total = MSAFilterStats()
+    if not max_depth:
+        return alignments, total
+    filtered = {}
+    for database, formats in alignments.items():
+        filtered[database] = {}
+        for fmt, entry in formats.items():
+            if fmt == "a3m" and entry.get("alignment"):
+                text, stats = filter_a3m(
+                    entry["alignment"],
+                    max_seq_id=max_seq_id,
+                    min_coverage=min_coverage,
+                    max_depth=max_depth,
+                )
+                entry = dict(entry, alignment=text)
+                total = total + stats
+            filtered[database][fmt] = entry
+    return filtered, total
+
+
+def replace_query(
+    alignments: Dict[str, Dict[str, Dict[str, str]]], sequence: str
+) -> Dict[str, Dict[str, Dict[str, str]]]:
+    """Alignments with the query record replaced by a variant of the same length
+
+    Point mutants of a protein share the homologs of the wild type, so its MSA
+    can be reused with the mutant as the query instead of searching again.
+    """
+    out = {}
+    for database, formats in alignments.items():
+        out[database] = {}
+        for fmt, entry in formats.items():
+            if fmt == "a3m" and entry.get("alignment"):
+                records = iter_a3m(entry["alignment"])
+                header, query = next(records)
+                if len(query) != len(sequence):
+                    raise ValueError("The new query must match the query length")
+                lines = [f">{header}", sequence]
+                for header, aligned in records:
+                    lines += [f">{header}", aligned]
+                entry = dict(entry, alignment="\n".join(lines) + "\n")
+            out[database][fmt] = entry
+    return out
@@ -0,0 +1,544 @@
+"""Saturation mutagenesis scans: every single-point mutant of a residue range.
+
+A scan folds the wild type and each of the 19 substitutions at every position
+of the range, then compares every mutant with the wild type:
+
+* ``plddt_delta``: change of the mean pLDDT
+* ``local_plddt_delta``: change of the mean pLDDT within ``window`` residues
+  of the mutated site
+* ``rmsd``: CA RMSD to the wild type after superposition
+* ``local_rmsd``: CA RMSD of the residues within ``window`` of the site, with
+  the whole chain superposed
+
+Mutants are folded concurrently; each waits for a slot of the shared scheduler
+(``esmfold`` or ``boltz2``), so a scan stays within the provider limit.
+Mutants already in the working directory catalog are not folded again. Boltz-2
+scans search the wild-type MSA once and give every mutant that MSA with the
+mutant as its query.
+
+Everything lives in ``scan_<name>/`` of the working directory:
+
+* ``results.jsonl``: one line per folded mutant (the checkpoint); running the
+  same scan again only folds mutants without a successful line
+* ``mutants.csv``: the metrics of every mutant
+* ``msa.json``: the wild-type MSA of Boltz-2 scans
+* ``heatmap_<metric>.png``: amino acid x position heatmap, see ``plot_heatmap``
+"""
+
+import asyncio
+import csv
+import inspect
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .arraystore import parse_structure
+from .catalog import get_catalog, normalize_sequence
+from .msa import ALPHABET, replace_query
+from .scheduler import SCHEDULER
+from .structure import kabsch
+
+AMINO_ACIDS = ALPHABET
+CHECKPOINT_FILENAME = "results.jsonl"
+MSA_FILENAME = "msa.json"
+TABLE_FILENAME = "mutants.csv"
+WILD_TYPE = "WT"
+DEFAULT_WINDOW = 5
+METRICS = ("plddt_delta", "local_plddt_delta", "rmsd", "local_rmsd")
+TABLE_COLUMNS = (
+    "mutation",
+    "position",
+    "wild_type",
+    "mutant",
+    "plddt",
+    *METRICS,
+    "path",
+    "cached",
+    "status",
+    "error",
+)
+# Scheduler kind of each predictor class
+PROVIDERS = {"ESMFoldPredictor": "esmfold", "Boltz2Predictor": "boltz2"}
+
+
+def single_mutants(
+    sequence: str, start: int = 1, end: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """Every single amino acid substitution in residues ``start``-``end``
+
+    Args:
+        sequence: Wild-type sequence
+        start: First residue (1-based)
+        end: Last residue, inclusive (default: the last residue)
+
+    Returns:
+        Dictionaries with 'mutation' (e.g. 'A23G'), 'position', 'wild_type',
+        'mutant' and 'sequence', position by position
+    """
+    end = len(sequence) if not end else int(end)
+    start = int(start)
+    if not 1 <= start <= end <= len(sequence):
+        raise ValueError(
+            f"Residue range {start}-{end} is outside the sequence (1-{len(sequence)})"
+        )
+    mutants = []
+    for position in range(start, end + 1):
+        wild_type = sequence[position - 1]
+        for mutant in AMINO_ACIDS:
+            if mutant == wild_type:
+                continue
+            mutants.append(
+                {
+                    "mutation": f"{wild_type}{position}{mutant}",
+                    "position": position,
+                    "wild_type": wild_type,
+                    "mutant": mutant,
+                    "sequence": (
+                        sequence[: position - 1] + mutant + sequence[position:]
+                    ),
+                }
+            )
+    return mutants
+
+
+def structure_profile(text: str) -> Tuple[np.ndarray, np.ndarray]:
+    """CA coordinates (L x 3) and per-residue pLDDT (0-100) of a structure"""
+    coords, bfactors, residue_atom = parse_structure(text)
+    plddt = bfactors.astype(float)
+    if len(plddt) and plddt.max() <= 1.0:
+        plddt *= 100
+    return coords[residue_atom].astype(float), plddt
+
+
+def compare_to_wild_type(
+    wild_type: Tuple[np.ndarray, np.ndarray],
+    mutant: Tuple[np.ndarray, np.ndarray],
+    position: int,
+    window: int = DEFAULT_WINDOW,
+) -> Dict[str, float]:
+    """Metrics of one mutant, see the module docstring
+
+    Args:
+        wild_type: ``structure_profile`` of the wild type
+        mutant: ``structure_profile`` of the mutant
+        position: Mutated residue (1-based)
+        window: Residues on either side of the site counted as local
+    """
+    wt_coords, wt_plddt = wild_type
+    coords, plddt = mutant
+    if coords.shape != wt_coords.shape:
+        raise ValueError(
+            f"Mutant has {len(coords)} residues, the wild type {len(wt_coords)}"
+        )
+    rotation, translation = kabsch(coords, wt_coords)
+    deviation = ((coords @ rotation.T + translation - wt_coords) ** 2).sum(axis=1)
+    local = slice(max(0, position - 1 - window), position + window)
+    return {
+        "plddt": float(plddt.mean()),
+        "plddt_delta": float(plddt.mean() - wt_plddt.mean()),
+        "local_plddt_delta": float(plddt[local].mean() - wt_plddt[local].mean()),
+        "rmsd": float(np.sqrt(deviation.mean())),
+        "local_rmsd": float(np.sqrt(deviation[local].mean())),
+    }
+
+
+def site_matrix(
+    rows: List[Dict[str, Any]], metric: str
+) -> Tuple[np.ndarray, List[int]]:
+    """``metric`` as a 20 x positions matrix (rows in ``AMINO_ACIDS`` order)
+
+    Wild-type residues and failed mutants are NaN.
+    """
+    rows = [r for r in rows if r.get("status") == "ok" and r.get(metric) is not None]
+    positions = sorted({r["position"] for r in rows})
+    column = {position: i for i, position in enumerate(positions)}
+    matrix = np.full((len(AMINO_ACIDS), len(positions)), np.nan)
+    for row in rows:
+        aa = AMINO_ACIDS.index(row["mutant"])
+        matrix[aa, column[row["position"]]] = row[metric]
+    return matrix, positions
+
+
+def site_profile(rows: List[Dict[str, Any]], metric: str) -> Dict[int, float]:
+    """Mean of ``metric`` over the mutants of every position"""
+    matrix, positions = site_matrix(rows, metric)
+    with np.errstate(invalid="ignore"):
+        means = np.nanmean(matrix, axis=0) if positions else []
+    return {p: float(v) for p, v in zip(positions, means)}
+
+
+def plot_heatmap(
+    rows: List[Dict[str, Any]],
+    metric: str,
+    path: Path,
+    sequence: str = "",
+) -> Optional[Path]:
+    """Save an amino acid x position heatmap of ``metric`` (needs matplotlib)"""
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    matrix, positions = site_matrix(rows, metric)
+    if not positions:
+        return None
+    # Deltas are centered on zero; deviations start at zero
+    if metric.endswith("delta"):
+        limit = float(np.nanmax(np.abs(matrix))) or 1.0
+        cmap, vmin, vmax = "RdBu", -limit, limit
+    else:
+        cmap, vmin, vmax = "viridis", 0.0, float(np.nanmax(matrix)) or 1.0
+    width = min(4 + 0.18 * len(positions), 60)
+    fig, ax = plt.subplots(figsize=(width, 5))
+    image = ax.imshow(
+        np.ma.masked_invalid(matrix),
+        aspect="auto",
+        cmap=cmap,
+        vmin=vmin,
+        vmax=vmax,
+        interpolation="nearest",
+    )
+    step = max(1, len(positions) // 60)
+    ticks = range(0, len(positions), step)
+    ax.set_xticks(list(ticks))
+    ax.set_xticklabels(
+        [f"{sequence[positions[i] - 1:positions[i]]}{positions[i]}" for i in ticks],
+        rotation=90,
+        fontsize=7,
+    )
+    ax.set_yticks(range(len(AMINO_ACIDS)))
+    ax.set_yticklabels(list(AMINO_ACIDS), fontsize=7)
+    ax.set_xlabel("Position")
+    ax.set_ylabel("Mutant")
+    fig.colorbar(image, ax=ax, label=metric)
+    fig.tight_layout()
+    fig.savefig(path, dpi=150)
+    plt.close(fig)
+    return path
+
+
+class MutationScan:
+    """Fold and compare all single-point mutants of a sequence range
+
+    Args:
+        predictor: ``ESMFoldPredictor`` or ``Boltz2Predictor``; its working
+            directory holds the scan and its catalog is the prediction cache
+        sequence: Wild-type sequence
+        start: First scanned residue (1-based)
+        end: Last scanned residue (default: the last residue)
+        name: Scan name; structures are saved as ``<name>_<mutation>``
+        window: Residues on either side of the site counted as local
+        concurrency: Mutants waiting for or holding a scheduler slot
+        priority: Scheduler class of the folds
+        msa_depth: Maximum wild-type MSA depth of Boltz-2 scans
+        predict_kwargs: Further arguments of ``predictor.predict``, e.g.
+            ``diffusion_samples``; cached predictions must match them, be of
+            the chain alone and, for Boltz-2, use the same MSA depth
+    """
+
+    def __init__(
+        self,
+        predictor,
+        sequence: str,
+        start: int = 1,
+        end: Optional[int] = None,
+        name: str = "scan",
+        window: int = DEFAULT_WINDOW,
+        concurrency: int = 8,
+        priority: str = "batch",
+        msa_depth: Optional[int] = None,
+        predict_kwargs: Optional[Dict[str, Any]] = None,
+    ):
+        self.predictor = predictor
+        self.sequence = normalize_sequence(sequence)
+        self.mutants = single_mutants(self.sequence, start, end)
+        self.name = name
+        self.window = int(window)
+        self.concurrency = max(1, int(concurrency))
+        self.priority = priority
+        self.msa_depth = msa_depth
+        self.predict_kwargs = dict(predict_kwargs or {})
+        self.predictor_name = type(predictor).__name__
+        self.kind = PROVIDERS.get(self.predictor_name, self.predictor_name.lower())
+        self.directory = Path(predictor.workdir) / f"scan_{name}"
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._msa: Optional[Dict[str, Any]] = None
+        self._wild_type: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self.results: Dict[str, Dict[str, Any]] = self._load_checkpoint()
+
+    @property
+    def table_path(self) -> Path:
+        return self.directory / TABLE_FILENAME
+
+    def _load_checkpoint(self) -> Dict[str, Dict[str, Any]]:
+        results = {}
+        try:
+            with open(self.directory / CHECKPOINT_FILENAME) as handle:
+                for line in handle:
+                    try:
+                        row = json.loads(line)
+                    except ValueError:  # a line cut short by a crash
+                        continue
+                    results[row["mutation"]] = row
+        except OSError:
+            pass
+        return results
+
+    def _checkpoint(self, row: Dict[str, Any]):
+        with self._lock:
+            self.results[row["mutation"]] = row
+            with open(self.directory / CHECKPOINT_FILENAME, "a") as handle:
+                handle.write(json.dumps(row) + "\n")
+                handle.flush()
+                os.fsync(handle.fileno())
+
+    def _result(self, mutant: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Checkpointed result of ``mutant``, unless the scan's sequence changed"""
+        row = self.results.get(mutant["mutation"])
+        if row is None or row.get("sequence") != mutant["sequence"]:
+            return None
+        return row
+
+    def rows(self) -> List[Dict[str, Any]]:
+        """Checkpointed results of the mutants of this scan, position by position"""
+        with self._lock:
+            rows = [self._result(mutant) for mutant in self.mutants]
+        return [row for row in rows if row is not None]
+
+    def pending(self) -> List[Dict[str, Any]]:
+        """Mutants without a successful result in the checkpoint"""
+        with self._lock:
+            return [
+                mutant
+                for mutant in self.mutants
+                if (self._result(mutant) or {}).get("status") != "ok"
+            ]
+
+    def write_table(self) -> Path:
+        rows = self.rows()
+        fd, tmp = tempfile.mkstemp(dir=str(self.directory), suffix=".tmp")
+        with os.fdopen(fd, "w", newline="") as handle:
+            writer = csv.DictWriter(
+                handle, fieldnames=TABLE_COLUMNS, extrasaction="ignore"
+            )
+            writer.writeheader()
+            writer.writerows(rows)
+        os.replace(tmp, self.table_path)
+        return self.table_path
+
+    @property
+    def _uses_msa(self) -> bool:
+        return inspect.iscoroutinefunction(self.predictor.predict)
+
+    @property
+    def _msa_depth(self) -> int:
+        """Depth the wild-type MSA is filtered to, as recorded in Boltz-2 params"""
+        if self.msa_depth is None:
+            return self.predictor.MSA_MAX_DEPTH
+        return int(self.msa_depth)
+
+    def _cached(self, sequence: str) -> Optional[Path]:
+        """Saved structure of an earlier prediction of ``sequence``, if any"""
+        row = get_catalog(self.predictor.workdir).lookup(sequence, self.predictor_name)
+        if row is None:
+            return None
+        params = row.get("params") or {}
+        if any(params.get(k) != v for k, v in self.predict_kwargs.items()):
+            return None
+        # A complex with ligands, or a fold with another MSA, is not comparable
+        if params.get("ligands"):
+            return None
+        if self._uses_msa and params.get("msa_depth") != self._msa_depth:
+            return None
+        paths = [Path(p) for p in row.get("paths") or []]
+        plddts = row.get("plddts") or []
+        if len(plddts) == len(paths) and None not in plddts:
+            paths = [paths[int(np.argmax(plddts))]]
+        return paths[0] if paths and paths[0].is_file() else None
+
+    async def _wild_type_msa(self, progress=None) -> Dict[str, Any]:
+        if self._msa is not None:
+            return self._msa
+        path = self.directory / MSA_FILENAME
+        try:
+            cached = json.loads(path.read_text())
+            if (
+                cached.get("sequence") == self.sequence
+                and cached.get("msa_depth") == self._msa_depth
+            ):
+                self._msa = cached["msa"]
+                return self._msa
+        except (OSError, ValueError):
+            pass
+        if progress:
+            progress("msa", "Searching the wild-type MSA (once for all mutants)")
+        self._msa = await self.predictor.get_filtered_msa(
+            self.sequence, max_depth=self._msa_depth, progress=progress
+        )
+        path.write_text(
+            json.dumps(
+                {
+                    "sequence": self.sequence,
+                    "msa_depth": self._msa_depth,
+                    "msa": self._msa,
+                }
+            )
+        )
+        return self._msa
+
+    async def _fold(self, sequence: str, name: str, executor) -> Path:
+        """Structure file of ``sequence``: from the catalog or a new prediction"""
+        if self._uses_msa:
+            msa = await self._wild_type_msa()
+            if sequence != self.sequence:
+                msa = replace_query(msa, sequence)
+            polymer = {
+                "id": "A",
+                "molecule_type": "protein",
+                "sequence": sequence,
+                "cyclic": False,
+                "modifications": [],
+                "msa": msa,
+            }
+            result = await self.predictor.predict(
+                {"polymers": [polymer]},
+                msa_depth=self._msa_depth,
+                **self.predict_kwargs,
+            )
+        else:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(
+                executor,
+                lambda: self.predictor.predict(
+                    sequence, name=name, **self.predict_kwargs
+                ),
+            )
+        paths = self.predictor.save_structures(result, name)
+        plddts = result.get("complex_plddt_scores") or []
+        if len(plddts) == len(paths) and None not in plddts:
+            return paths[int(np.argmax(plddts))]
+        return paths[0]
+
+    async def _scan_one(self, mutant, gate: asyncio.Semaphore, executor):
+        row = {
+            key: mutant[key]
+            for key in ("mutation", "position", "wild_type", "mutant", "sequence")
+        }
+        async with gate:
+            try:
+                path = self._cached(mutant["sequence"])
+                row["cached"] = path is not None
+                if path is None:
+                    tag = f"{self.name}:{mutant['mutation']}"
+                    async with SCHEDULER.slot(self.kind, self.priority, tag=tag):
+                        path = await self._fold(
+                            mutant["sequence"],
+                            f"{self.name}_{mutant['mutation']}",
+                            executor,
+                        )
+                profile = structure_profile(path.read_text())
+                row.update(
+                    compare_to_wild_type(
+                        self._wild_type, profile, mutant["position"], self.window
+                    ),
+                    status="ok",
+                    path=str(path),
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                row.update(status="failed", error=str(getattr(e, "detail", e)))
+        self._checkpoint(row)
+        return row
+
+    async def _load_wild_type(self, executor, progress=None):
+        """Fold the wild type (or reuse its structure) and keep its profile"""
+        row = self.results.get(WILD_TYPE)
+        path = None
+        if row is not None and row.get("sequence") == self.sequence:
+            path = Path(row["path"])
+        if path is None or not path.is_file():
+            path = self._cached(self.sequence)
+        if path is None:
+            if progress:
+                progress("predicting", "Folding the wild type")
+            async with SCHEDULER.slot(
+                self.kind, self.priority, tag=f"{self.name}:{WILD_TYPE}"
+            ):
+                path = await self._fold(
+                    self.sequence, f"{self.name}_{WILD_TYPE}", executor
+                )
+        self._wild_type = structure_profile(path.read_text())
+        if row is None or row.get("path") != str(path):
+            self._checkpoint(
+                {
+                    "mutation": WILD_TYPE,
+                    "sequence": self.sequence,
+                    "plddt": float(self._wild_type[1].mean()),
+                    "path": str(path),
+                    "status": "ok",
+                }
+            )
+        return path
+
+    @property
+    def wild_type_path(self) -> Optional[Path]:
+        row = self.results.get(WILD_TYPE)
+        return Path(row["path"]) if row else None
+
+    async def run(
+        self, progress: Optional[Callable[[str, str], None]] = None
+    ) -> List[Dict[str, Any]]:
+        """Fold every pending mutant and return the results of the whole scan"""
+        todo = self.pending()
+        total = len(self.mutants)
+        done = total - len(todo)
+        # Runs blocking predictors (ESMFold) without the default pool's cap
+        executor = ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="pymolfold-scan"
+        )
+        try:
+            if inspect.iscoroutinefunction(self.predictor.predict):
+                await self._wild_type_msa(progress)
+            await self._load_wild_type(executor, progress)
+            gate = asyncio.Semaphore(self.concurrency)
+            tasks = [
+                asyncio.ensure_future(self._scan_one(mutant, gate, executor))
+                for mutant in todo
+            ]
+            try:
+                for task in asyncio.as_completed(tasks):
+                    row = await task
+                    done += 1
+                    if progress:
+                        progress(
+                            "predicting",
+                            f"{done}/{total} mutants ({row['mutation']}: "
+                            f"{row['status']})",
+                        )
+            finally:
+                for task in tasks:
+                    task.cancel()
+        finally:
+            executor.shutdown(wait=False)
+        self.write_table()
+        return self.rows()
+
+
+def format_sites(
+    profile: Dict[int, float], sequence: str, limit: Optional[int] = 10
+) -> str:
+    """Plain-text list of the sites with the largest mean effect"""
+    order = sorted(profile, key=lambda p: -abs(profile[p]))[:limit]
+    lines = [f"{'site':>6}  {'mean':>7}"]
+    for position in order:
+        site = f"{sequence[position - 1]}{position}"
+        lines.append(f"{site:>6}  {profile[position]:>7.2f}")
+    return "\n".join(lines)
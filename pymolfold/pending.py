@@ -0,0 +1,160 @@
+"""Durable store of remote prediction requests that are still running.
+
+When NVIDIA Cloud Functions accepts a request with ``202 Accepted`` it returns
+a request id that has to be polled until the result is ready. The id is written
+here together with everything needed to deliver the result (output name,
+working directory, loader options), so a job outlives a PyMOL or server
+restart and can be resumed instead of being paid for twice.
+
+Several PyMOL sessions (and the server) may share the store: changes to the
+file are made under an exclusive file lock, and a request being polled holds
+a lock on its own lock file, so no two processes poll the same request id. The
+operating system drops those locks when a process dies, so a crashed session
+never leaves a request claimed.
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from .fetch import DEFAULT_CACHE_DIR
+from .locking import file_lock, lock, unlock
+
+PENDING_FILENAME = "pending_jobs.json"
+LOCK_DIRNAME = "pending_locks"
+
+
+def payload_hash(payload: Dict[str, Any]) -> str:
+    """SHA-256 of a request payload, independent of key order"""
+    encoded = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class PendingJobStore:
+    """JSON file of pending request ids and their metadata
+
+    Safe to use from several threads and several processes.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path).expanduser()
+        self._lock = threading.Lock()
+        # Lock files held for the ids polled by this process right now
+        self._active: Dict[str, Any] = {}
+
+    @property
+    def lock_dir(self) -> Path:
+        return self.path.parent / LOCK_DIRNAME
+
+    @contextlib.contextmanager
+    def _file_lock(self):
+        """Hold the thread lock and the inter-process lock of the JSON file"""
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with file_lock(f"{self.path}.lock"):
+                yield
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            return json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, entries: Dict[str, Dict[str, Any]]):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=str(self.path.parent), suffix=".tmp")
+        with os.fdopen(fd, "w") as handle:
+            json.dump(entries, handle, indent=1, default=str)
+        os.replace(tmp, self.path)
+
+    def add(self, task_id: str, **metadata) -> Dict[str, Any]:
+        """Record a pending request id"""
+        entry = dict(metadata, task_id=task_id, submitted=time.time())
+        with self._file_lock():
+            entries = self._read()
+            entries[task_id] = entry
+            self._write(entries)
+        return entry
+
+    def remove(self, task_id: Optional[str]):
+        """Forget a request id once its result was delivered or it failed"""
+        if not task_id:
+            return
+        with self._file_lock():
+            entries = self._read()
+            if entries.pop(task_id, None) is not None:
+                self._write(entries)
+        try:
+            os.remove(self.lock_dir / f"{task_id}.lock")
+        except OSError:
+            pass
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._read().get(task_id)
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Pending entries, oldest first"""
+        with self._lock:
+            entries = list(self._read().values())
+        return sorted(entries, key=lambda e: e.get("submitted", 0))
+
+    def claim(self, task_id: str) -> bool:
+        """Mark ``task_id`` as polled by this process
+
+        Returns:
+            False if this or another process already polls it
+        """
+        with self._lock:
+            if task_id in self._active:
+                return False
+            self.lock_dir.mkdir(parents=True, exist_ok=True)
+            handle = open(self.lock_dir / f"{task_id}.lock", "a+")
+            if not lock(handle, blocking=False):
+                handle.close()
+                return False
+            self._active[task_id] = handle
+            return True
+
+    def release(self, task_id: str):
+        with self._lock:
+            handle = self._active.pop(task_id, None)
+        if handle is not None:
+            # The lock file stays until the entry is removed: deleting it here
+            # would let two processes lock different files of the same id
+            unlock(handle)
+            handle.close()
+
+    def is_active(self, task_id: str) -> bool:
+        """Whether this or another process is polling ``task_id``"""
+        if not self.claim(task_id):
+            return True
+        self.release(task_id)
+        return False
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._read())
+
+
+_store: Optional[PendingJobStore] = None
+_store_lock = threading.Lock()
+
+
+def get_pending_store() -> PendingJobStore:
+    """Shared store in the PymolFold cache directory
+
+    A single store (rather than one per working directory) lets startup find
+    every unfinished job; each entry records the working directory it saves to.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = PendingJobStore(Path(DEFAULT_CACHE_DIR) / PENDING_FILENAME)
+        return _store
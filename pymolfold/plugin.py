@@ -1,25 +1,87 @@
 """PyMOL plugin for structure prediction"""
 
 import os
+import re
 import threading
 import time
-import requests
 from pymol import cmd as pymol_cmd
 from .version import __version__
-from . import utils
+from . import analysis, utils
 from . import server
+from .arraystore import get_array_store, list_batches
+from .catalog import get_catalog
+from .background import RUNNER
+from .hedging import get_latency_tracker
+from .scheduler import SCHEDULER, check_priority
+from .jobs import JOBS
+from .pending import get_pending_store
+from .fetch import (
+    AF_CACHE_DIR,
+    AM_CACHE_DIR,
+    StructureCache,
+    fetch_alphafold,
+    fetch_alphamissense,
+)
+from .registry import ObjectNameSet, ObjectRegistry
 import subprocess
 import shutil
+from pathlib import Path
 from typing import Tuple
 
-from pymolfold.predictors import ESM3Predictor, ESMFoldPredictor
+from pymolfold.predictors import ESM3LocalPredictor, ESM3Predictor, ESMFoldPredictor
 
 # Global settings
-OBJECT_FILENAME_MAP = {}
+OBJECT_REGISTRY = ObjectRegistry()
+# Backwards-compatible alias; the registry behaves like a dict
+OBJECT_FILENAME_MAP = OBJECT_REGISTRY
+# Object names currently in the session, maintained incrementally
+LIVE_OBJECTS = ObjectNameSet()
+SESSION_REGISTRY_KEY = "pymolfold_objects"
 ABS_PATH = os.path.abspath("./")
-AM_HEGELAB_API = "https://alphamissense.hegelab.org/structure/"
+# Concurrent background jobs per provider, so batches stay within API limits
+PROVIDER_CONCURRENCY = {"esmfold": 4, "esm3": 2, "boltz2": 4, "pxmeter": 2}
+for _kind, _limit in PROVIDER_CONCURRENCY.items():
+    RUNNER.set_limit(_kind, _limit)
+# Also write grouped (FASTA batch) predictions to memory-mapped arrays
+ARRAYS_ENABLED = False
 
 _original_load = pymol_cmd.load
+_original_delete = pymol_cmd.delete
+_original_set_name = pymol_cmd.set_name
+
+
+def _expected_object_name(filename, _self=pymol_cmd) -> str:
+    """Name PyMOL gives to an object loaded from ``filename`` without a name"""
+    base = os.path.basename(str(filename).rstrip("/"))
+    base = re.sub(r"\.(gz|bz2)$", "", base, flags=re.IGNORECASE)
+    name = os.path.splitext(base)[0] if "." in base else base
+    try:
+        return _self.get_legal_name(name)
+    except Exception:
+        return name
+
+
+def _object_exists(name, _self=pymol_cmd) -> bool:
+    """Check a single object name without listing the whole session"""
+    try:
+        return str(_self.get_type(name, quiet=1)).startswith("object:")
+    except Exception:
+        return False
+
+
+def _rescan_objects(_self=pymol_cmd) -> set:
+    """Full scan of the session; resynchronizes the maintained name set"""
+    names = set(_self.get_names("objects"))
+    LIVE_OBJECTS.reset(names)
+    return names
+
+
+def _rescan_new_objects(_self=pymol_cmd) -> set:
+    """Full scan returning the objects missing from the maintained name set"""
+    names = set(_self.get_names("objects"))
+    new_objects = {name for name in names if name not in LIVE_OBJECTS}
+    LIVE_OBJECTS.reset(names)
+    return new_objects
 
 
 def load(
@@ -41,12 +103,27 @@ def load(
 ):
     """
     Wrapper for pymol.cmd.load to track loaded objects.
+
+    Object names are tracked incrementally: an explicit object name is recorded
+    directly, otherwise the name PyMOL derives from the filename is probed
+    after the load. Sessions and multiplexed files are found with a scan of all
+    objects; an unexpected name is the only other case that scans the session.
     """
-    # Record existing objects before loading
-    try:
-        pre_objects = set(_self.get_names("objects"))
-    except Exception:
-        pre_objects = set()
+    obj_name = (object or "").strip()
+    is_session = str(format).lower() in ("pse", "pze") or bool(
+        re.search(r"\.(pse|pze)$", str(filename), flags=re.IGNORECASE)
+    )
+    multiplexed = multiplex is not None and int(multiplex) > 0
+
+    # Multiplexed files make several objects, found by diffing the object list;
+    # LIVE_OBJECTS misses objects made outside the wrappers (cmd.create,
+    # fetch, ...), so it cannot stand in for this snapshot
+    pre_objects = None
+    if multiplexed and not obj_name and not is_session:
+        try:
+            pre_objects = set(_self.get_names("objects"))
+        except Exception:
+            pre_objects = set()
 
     # Call the original load function
     result = _original_load(
@@ -66,44 +143,98 @@ def load(
         _self=_self,
     )
     try:
-        post_objects = set(_self.get_names("objects"))
-        new_objects = list(post_objects - pre_objects)
-
-        # use provided object name if any
-        obj_name = (object or "").strip()
-
-        if obj_name:
-            OBJECT_FILENAME_MAP[obj_name] = filename
+        if is_session:
+            # Session restore tasks handle the registry itself
+            _rescan_objects(_self)
+        elif obj_name:
+            LIVE_OBJECTS.add(obj_name)
+            OBJECT_REGISTRY[obj_name] = filename
+        elif multiplexed:
+            # multiplex mode, multiple new objects detected
+            for obj in _rescan_objects(_self) - pre_objects:
+                OBJECT_REGISTRY[obj] = filename
         else:
-            if len(new_objects) == 1:
-                # only one new object detected
-                OBJECT_FILENAME_MAP[new_objects[0]] = filename
-            elif len(new_objects) > 1:
-                # multiplex mode, multiple new objects detected
-                for obj in new_objects:
-                    OBJECT_FILENAME_MAP[obj] = filename
+            guess = _expected_object_name(filename, _self)
+            if _object_exists(guess, _self):
+                LIVE_OBJECTS.add(guess)
+                OBJECT_REGISTRY[guess] = filename
             else:
-                # no new object detected
-                # try to guess from filename
-                import os
-
-                base = os.path.basename(filename)
-                guess = base.rsplit(".", 1)[0] if "." in base else base
-                # only record if the object actually exists to avoid false positives
-                if guess in post_objects:
-                    OBJECT_FILENAME_MAP[guess] = filename
-                else:
-                    # if unable to guess, do not record; can print a warning if needed (controlled by quiet)
-                    if not int(quiet):
-                        print(
-                            f'load(map): could not determine object name for "{filename}"'
-                        )
+                # Unexpected name: one full scan; objects made outside the
+                # wrappers since the last scan are attributed to this file too
+                new_objects = _rescan_new_objects(_self)
+                for obj in new_objects:
+                    OBJECT_REGISTRY[obj] = filename
+                if not new_objects and not int(quiet):
+                    print(
+                        f'load(map): could not determine object name for "{filename}"'
+                    )
     except Exception as e:
         if not int(quiet):
             print("load(map): failed to record mapping:", e)
     return result
 
 
+def delete(name, *, _self=pymol_cmd):
+    """
+    Wrapper for pymol.cmd.delete that forgets deleted objects in the registry.
+    """
+    result = _original_delete(name, _self=_self)
+    try:
+        if name in LIVE_OBJECTS:
+            # Exact object name: no need to list the session
+            LIVE_OBJECTS.discard(name)
+            OBJECT_REGISTRY.discard(name)
+        else:
+            # Patterns, "all", selections: resynchronize with one scan
+            OBJECT_REGISTRY.retain(_rescan_objects(_self))
+    except Exception:
+        pass
+    return result
+
+
+def set_name(old_name, new_name, *, _self=pymol_cmd):
+    """
+    Wrapper for pymol.cmd.set_name that follows renamed objects in the registry.
+    """
+    result = _original_set_name(old_name, new_name, _self=_self)
+    if old_name in LIVE_OBJECTS:
+        LIVE_OBJECTS.rename(old_name, new_name)
+    OBJECT_REGISTRY.rename(old_name, new_name)
+    return result
+
+
+def _save_registry_to_session(session, _self=pymol_cmd):
+    """Session save task: store the object -> file registry in the session."""
+    session[SESSION_REGISTRY_KEY] = OBJECT_REGISTRY.to_dict()
+    return 1
+
+
+def _restore_registry_from_session(session, _self=pymol_cmd):
+    """Session restore task: bring back the registry saved with the session."""
+    entries = session.get(SESSION_REGISTRY_KEY)
+    if entries:
+        OBJECT_REGISTRY.update_from(entries)
+    try:
+        OBJECT_REGISTRY.retain(_rescan_objects(_self))
+    except Exception:
+        pass
+    return 1
+
+
+def _register_session_tasks():
+    import pymol
+
+    save_tasks = getattr(pymol, "_session_save_tasks", None)
+    restore_tasks = getattr(pymol, "_session_restore_tasks", None)
+    if save_tasks is not None and _save_registry_to_session not in save_tasks:
+        save_tasks.append(_save_registry_to_session)
+    if (
+        restore_tasks is not None
+        and _restore_registry_from_session not in restore_tasks
+    ):
+        restore_tasks.append(_restore_registry_from_session)
+
+
 def set_workdir(path):
     """Set working directory for output files"""
     global ABS_PATH
@@ -113,6 +244,29 @@ def set_workdir(path):
     print(f"Results will be saved to {ABS_PATH}")
 
 
+def set_arrays(enabled=""):
+    """
+    Also store batch predictions as memory-mapped arrays.
+    Usage: pf_arrays [on|off]
+
+    Every prediction added to a group (e.g. a FASTA batch) is appended to
+    pymolfold_arrays/<group>/ in the working directory: coordinates, per-residue
+    pLDDT and, for Boltz-2, PAE/PDE matrices. Without arguments, lists the
+    batches stored so far.
+    """
+    global ARRAYS_ENABLED
+    if str(enabled).strip():
+        ARRAYS_ENABLED = str(enabled).strip().lower() in ("1", "on", "true", "yes")
+    print(f"Batch arrays are {'on' if ARRAYS_ENABLED else 'off'}.")
+    for batch in list_batches(ABS_PATH):
+        print(f"  {batch}: {len(get_array_store(ABS_PATH, batch))} models")
+
+
+def _array_batch(group):
+    """Batch name for the arrays of a prediction in ``group``, if enabled"""
+    return group if ARRAYS_ENABLED and group else None
+
+
 def set_base_url(url):
     """Set base URL for PyMolFold server"""
     global BASE_URL
@@ -185,193 +339,960 @@ def init_boltz2_gui():
         print(f"Could not launch Streamlit UI: {e}")
 
 
+def _load_predictions(
+    saved_files, name, multistate=True, plddts=None, state_properties=None
+):
+    """Load saved samples into PyMOL and return the file of the best sample.
+
+    With ``multistate`` and more than one sample, all samples become states of
+    a single object ordered by confidence; otherwise each file is loaded as its
+    own object.
+    """
+    if multistate and len(saved_files) > 1:
+        order = utils.load_samples(
+            saved_files,
+            name,
+            plddts=plddts or None,
+            state_properties=state_properties,
+        )
+        print(f'Loaded {len(saved_files)} samples as states of "{name}" (best first).')
+        return saved_files[order[0]]
+    for file_path in saved_files:
+        pymol_cmd.load(str(file_path), _expected_object_name(file_path))
+    return saved_files[0]
+
+
+def _submit(kind, name, work, on_done, wait=0, quiet=False, priority=""):
+    """Run a command in the background and return its job id.
+
+    With ``wait`` the call blocks until the results are loaded, which keeps
+    scripts that expect the old synchronous behaviour working.
+    """
+    job_id = RUNNER.submit(
+        kind, name, work, on_done=on_done, priority=check_priority(priority)
+    )
+    if int(wait):
+        RUNNER.wait(job_id)
+    elif not quiet:
+        print(f'Submitted {kind} job {job_id} for "{name}" (see pf_jobs, pf_wait).')
+    return job_id
+
+
+def _fasta_group(sequence, name):
+    """Group name for the structures of a FASTA input"""
+    if name:
+        return _expected_object_name(name)
+    path = Path(sequence.strip()).expanduser()
+    if ">" not in sequence and path.is_file():
+        return _expected_object_name(path.name)
+    return "fasta"
+
+
+def _submit_records(command, records, group, wait=0, priority="", **kwargs):
+    """Submit one background job per FASTA record.
+
+    Every record is named by its FASTA identifier; structures are added to
+    ``group`` as they arrive. Concurrency is bounded per provider by RUNNER,
+    and records run at 'batch' priority unless told otherwise so that
+    interactive commands are not stuck behind them.
+    """
+    priority = check_priority(priority, default="batch")
+    job_ids = [
+        command(sequence, name=ident, group=group, priority=priority, **kwargs)
+        for ident, sequence in records
+    ]
+    print(
+        f"Submitted {len(job_ids)} jobs; structures are added to group "
+        f'"{group}" as they finish (see pf_jobs, pf_wait).'
+    )
+    if int(wait):
+        for job_id in job_ids:
+            RUNNER.wait(job_id)
+    return job_ids
+
+
+def _load_and_report(output, name, multistate=True, group=""):
+    """Main-thread callback: load saved structures and print the best pLDDT"""
+    saved_files = [Path(p) for p in output.get("files", [])]
+    if not saved_files:
+        print("No structures were generated")
+        return "No structures were generated"
+
+    plddts = output.get("plddts") or None
+    # Boltz-2 affinity of one ligand, per sample
+    target = output.get("affinity_target_id")
+    affinity = output.get("affinity") or {}
+
+    def per_sample(key, i):
+        values = affinity.get(key) or [None]
+        return values[i] if i < len(values) else values[0]
+
+    state_properties = None
+    if target:
+        state_properties = [
+            {
+                "affinity_pic50": per_sample("affinity_pic50", i),
+                "affinity_probability": per_sample("affinity_probability_binary", i),
+            }
+            for i in range(len(saved_files))
+        ]
+    first_file = _load_predictions(
+        saved_files, name, multistate, plddts=plddts, state_properties=state_properties
+    )
+    if group:
+        if multistate and len(saved_files) > 1:
+            objects = [name]
+        else:
+            objects = [_expected_object_name(p) for p in saved_files]
+        pymol_cmd.group(group, " ".join(objects))
+    try:
+        if plddts:
+            plddt = max(plddts)
+        else:
+            plddt = utils.cal_plddt(first_file.read_text())
+        print(f"Structure saved in {first_file}.")
+        print("=" * 40)
+        print(f"    pLDDT: {plddt: .2f}")
+        print("=" * 40)
+    except Exception:
+        print("Could not calculate pLDDT score")
+    pic50 = per_sample("affinity_pic50", saved_files.index(first_file))
+    if target and pic50 is not None:
+        print(f"    pic50 with {target}: {pic50: .3f}")
+        print("=" * 40)
+    return f"Loaded {len(saved_files)} files"
+
+
 def query_esm3(
     sequence: str,
     name: str = None,
     temperature: float = 0.7,
     num_steps: int = 8,
     model_name: str = "esm3-medium-2024-08",
+    num_samples: int = 1,
+    multistate: int = 1,
+    wait: int = 0,
+    group: str = "",
+    priority: str = "",
 ):
     """Predict protein structure using ESM-3
 
     Args:
-        sequence: Amino acid sequence
-        name: Name for output files
+        sequence: Amino acid sequence, FASTA text or path to a FASTA file
+        name: Name for output files (group name for FASTA input)
         temperature: Sampling temperature
         num_steps: Number of prediction steps
         model_name: Model name/version
+        num_samples: Number of samples to generate
+        multistate: Load all samples as states of one object (best first)
+        wait: Block until the structure is loaded instead of running in the background
+        group: Add the loaded structures to this PyMOL group
+        priority: 'interactive' (default), 'batch' (default for FASTA input)
+            or 'prefetch'
+
+    Returns:
+        Job id (list of job ids for FASTA input)
     """
+    records = utils.read_fasta_input(sequence)
+    if records is not None:
+        return _submit_records(
+            query_esm3,
+            records,
+            _fasta_group(sequence, name),
+            wait,
+            priority,
+            temperature=temperature,
+            num_steps=num_steps,
+            model_name=model_name,
+            num_samples=num_samples,
+            multistate=multistate,
+        )
+
     sequence = utils.clean_sequence(sequence)
     if not name:
         name = sequence[:3] + sequence[-3:]
+    workdir = ABS_PATH
 
-    predictor = ESM3Predictor(workdir=ABS_PATH)
-    try:
+    def work(progress):
+        progress("predicting", "Generating with ESM-3")
+        predictor = ESM3Predictor(workdir=workdir, arrays=_array_batch(group))
         result = predictor.predict(
             sequence,
             name=name,
+            temperature=float(temperature),
+            num_steps=int(num_steps),
+            model_name=model_name,
+            num_samples=int(num_samples),
+        )
+        progress("saving", "Saving structures")
+        saved_files = predictor.save_structures(result, name)
+        return {"files": [str(p) for p in saved_files]}
+
+    def on_done(output):
+        return _load_and_report(output, name, int(multistate), group)
+
+    return _submit("esm3", name, work, on_done, wait, bool(group), priority)
+
+
+def query_esm3_local(
+    sequence: str,
+    name: str = None,
+    weights: str = "",
+    temperature: float = 0.7,
+    num_steps: int = 8,
+    num_samples: int = 1,
+    multistate: int = 1,
+    wait: int = 0,
+    group: str = "",
+    priority: str = "",
+):
+    """Predict protein structure with the open ESM-3 model on this machine
+
+    The model is loaded once and kept in memory; short sequences submitted
+    together (e.g. a FASTA file of peptides) share forward passes.
+
+    Args:
+        sequence: Amino acid sequence, FASTA text or path to a FASTA file
+        name: Name for output files (group name for FASTA input)
+        weights: Directory with the esm3-sm-open-v1 weights
+            (default: the PYMOLFOLD_ESM_WEIGHTS environment variable)
+        temperature: Sampling temperature
+        num_steps: Number of prediction steps
+        num_samples: Number of samples to generate
+        multistate: Load all samples as states of one object (best first)
+        wait: Block until the structure is loaded instead of running in the background
+        group: Add the loaded structures to this PyMOL group
+        priority: 'interactive' (default), 'batch' (default for FASTA input)
+            or 'prefetch'
+
+    Returns:
+        Job id (list of job ids for FASTA input)
+    """
+    records = utils.read_fasta_input(sequence)
+    if records is not None:
+        return _submit_records(
+            query_esm3_local,
+            records,
+            _fasta_group(sequence, name),
+            wait,
+            priority,
+            weights=weights,
             temperature=temperature,
             num_steps=num_steps,
-            model_name=model_name,
+            num_samples=num_samples,
+            multistate=multistate,
         )
 
+    sequence = utils.clean_sequence(sequence)
+    if not name:
+        name = sequence[:3] + sequence[-3:]
+    workdir = ABS_PATH
+
+    def work(progress):
+        progress("predicting", "Generating with local ESM-3")
+        predictor = ESM3LocalPredictor(
+            workdir=workdir, weights=weights or None, arrays=_array_batch(group)
+        )
+        result = predictor.predict(
+            sequence,
+            name=name,
+            temperature=float(temperature),
+            num_steps=int(num_steps),
+            num_samples=int(num_samples),
+        )
+        progress("saving", "Saving structures")
         saved_files = predictor.save_structures(result, name)
-        if saved_files:
-            first_file = saved_files[0]
-            pymol_cmd.load(str(first_file))
-
-            try:
-                pdb_string = first_file.read_text()
-                plddt = utils.cal_plddt(pdb_string)
-                print(f"Structure saved in {first_file}.")
-                print("=" * 40)
-                print(f"    pLDDT: {plddt: .2f}")
-                print("=" * 40)
-            except Exception:
-                print("Could not calculate pLDDT score")
-        else:
-            print("No structures were generated")
+        return {"files": [str(p) for p in saved_files]}
 
-    except Exception as e:
-        print(f"Error during prediction: {str(e)}")
+    def on_done(output):
+        return _load_and_report(output, name, int(multistate), group)
+
+    return _submit("esm3_local", name, work, on_done, wait, bool(group), priority)
 
 
 def query_esmfold(
     sequence: str,
     name: str = None,
+    wait: int = 0,
+    group: str = "",
+    priority: str = "",
+    hedge: str = "",
 ):
-    """Predict protein structure using ESM-3
+    """Predict protein structure using ESMFold
 
     Args:
-        sequence: Amino acid sequence
-        name: Name for output files
+        sequence: Amino acid sequence, FASTA text or path to a FASTA file
+        name: Name for output files (group name for FASTA input)
+        wait: Block until the structure is loaded instead of running in the background
+        group: Add the loaded structures to this PyMOL group
+        priority: 'interactive' (default), 'batch' (default for FASTA input)
+            or 'prefetch'
+        hedge: If the atlas is slower than usual, also ask 'esmfold' again or
+            'esm3' and keep the first answer (see pf_latency)
+
+    Returns:
+        Job id (list of job ids for FASTA input)
     """
-    # st = time.time()
+    records = utils.read_fasta_input(sequence)
+    if records is not None:
+        return _submit_records(
+            query_esmfold,
+            records,
+            _fasta_group(sequence, name),
+            wait,
+            priority,
+            hedge=hedge,
+        )
+
     sequence = utils.clean_sequence(sequence)
     if not name:
         name = sequence[:3] + sequence[-3:]
-
-    predictor = ESMFoldPredictor(workdir=ABS_PATH)
-    try:
-        result = predictor.predict(sequence, name=name)
-
+    workdir = ABS_PATH
+
+    def work(progress):
+        progress("predicting", "Folding with ESMFold")
+        predictor = ESMFoldPredictor(workdir=workdir, arrays=_array_batch(group))
+        result = predictor.predict(sequence, name=name, hedge=hedge)
+        if result.get("backend") not in (None, "esmfold"):
+            progress("predicting", f"Answered by {result['backend']} (hedged)")
+        progress("saving", "Saving structures")
         saved_files = predictor.save_structures(result, name)
-        if saved_files:
-            first_file = saved_files[0]
-            pymol_cmd.load(str(first_file))
-
-            try:
-                pdb_string = first_file.read_text()
-                plddt = utils.cal_plddt(pdb_string)
-                print(f"Structure saved in {first_file}.")
-                print("=" * 40)
-                print(f"    pLDDT: {plddt: .2f}")
-                print("=" * 40)
-                # print(time.time() - st)
-            except Exception:
-                print("Could not calculate pLDDT score")
-        else:
-            print("No structures were generated")
+        return {"files": [str(p) for p in saved_files]}
 
-    except Exception as e:
-        print(f"Error during prediction: {str(e)}")
+    def on_done(output):
+        return _load_and_report(output, name, multistate=False, group=group)
 
+    return _submit("esmfold", name, work, on_done, wait, bool(group), priority)
 
-def query_boltz_monomer(sequence: str, name: str = None):
+
+def query_boltz_monomer(
+    sequence: str,
+    name: str = None,
+    diffusion_samples: int = 1,
+    multistate: int = 1,
+    msa_depth: int = None,
+    wait: int = 0,
+    group: str = "",
+    priority: str = "",
+):
     """Predict protein structure using Boltz2 with MSA support
 
     Args:
-        sequence: Amino acid sequence
-        name: Name for output files
+        sequence: Amino acid sequence, FASTA text or path to a FASTA file
+        name: Name for output files (group name for FASTA input)
+        diffusion_samples: Number of diffusion samples
+        multistate: Load all samples as states of one object (best first)
+        msa_depth: Maximum MSA depth after filtering (0 keeps the full MSA)
+        wait: Block until the structure is loaded instead of running in the background
+        group: Add the loaded structures to this PyMOL group
+        priority: 'interactive' (default), 'batch' (default for FASTA input)
+            or 'prefetch'
+
+    Returns:
+        Job id (list of job ids for FASTA input)
     """
-    import asyncio
     from pymolfold.predictors import Boltz2Predictor
 
+    records = utils.read_fasta_input(sequence)
+    if records is not None:
+        return _submit_records(
+            query_boltz_monomer,
+            records,
+            _fasta_group(sequence, name),
+            wait,
+            priority,
+            diffusion_samples=diffusion_samples,
+            multistate=multistate,
+            msa_depth=msa_depth,
+        )
+
     sequence = utils.clean_sequence(sequence)
     if not name:
         name = sequence[:3] + sequence[-3:]
+    workdir = ABS_PATH
+    multistate = int(multistate)
+
+    # Create Boltz2 JSON payload for monomer with MSA
+    boltz_json = {
+        "polymers": [
+            {
+                "id": "A",
+                "molecule_type": "protein",
+                "sequence": sequence,
+                "cyclic": False,
+                "modifications": [],
+            }
+        ]
+    }
+
+    arrays = _array_batch(group)
+
+    async def work(progress):
+        predictor = Boltz2Predictor(workdir=workdir, arrays=arrays)
+        progress("msa", "Fetching MSA from ColabFold")
+        boltz_json["polymers"][0]["msa"] = await predictor.get_filtered_msa(
+            sequence, max_depth=msa_depth, progress=progress
+        )
 
-    predictor = Boltz2Predictor(workdir=ABS_PATH)
+        result = await predictor.predict(
+            boltz_json,
+            diffusion_samples=int(diffusion_samples),
+            write_full_pae=bool(arrays),
+            write_full_pde=bool(arrays),
+            progress=progress,
+            pending={
+                "name": name,
+                "workdir": workdir,
+                "arrays": arrays,
+                "loader": {"multistate": bool(multistate)},
+            },
+        )
+        progress("saving", "Saving structures")
+        saved_files = predictor.save_structures(result, name)
+        return {
+            "files": [str(p) for p in saved_files],
+            "plddts": result.get("complex_plddt_scores", []),
+        }
 
-    try:
-        # Create Boltz2 JSON payload for monomer with MSA
-        boltz_json = {
-            "polymers": [
-                {
-                    "id": "A",
-                    "molecule_type": "protein",
-                    "sequence": sequence,
-                    "cyclic": False,
-                    "modifications": [],
-                }
-            ]
+    def on_done(output):
+        return _load_and_report(output, name, multistate, group)
+
+    return _submit("boltz2", name, work, on_done, wait, bool(group), priority)
+
+
+def screen_ligands(
+    target: str,
+    ligands: str,
+    name: str = "screen",
+    diffusion_samples: int = 1,
+    msa_depth: int = None,
+    concurrency: int = 4,
+    top: int = 5,
+    wait: int = 0,
+    priority: str = "batch",
+):
+    """
+    DESCRIPTION
+    Screen a ligand library against one protein target with Boltz-2. The
+    target MSA is searched once; every ligand is then predicted as a complex
+    with affinity, within the Boltz-2 concurrency limit. Progress is
+    checkpointed in <workdir>/screen_<name>, so running the same screen again
+    only predicts the ligands that are missing. Ligands are ranked by pIC50
+    (ranked.csv) and the best complexes are loaded into the group <name>.
+
+    USAGE
+    pf_screen target, ligands [, name [, diffusion_samples [, msa_depth
+        [, concurrency [, top [, wait [, priority ]]]]]]]
+
+    ARGUMENTS
+    target = str: Target protein sequence
+    ligands = str: Library file (or text), one SMILES or CCD code per line,
+        optionally followed by a name; see screening.parse_ligand_library
+    concurrency = int: Ligand jobs queued for Boltz-2 at once {default: 4}
+    top = int: Best complexes to load into PyMOL {default: 5}
+    """
+    from pymolfold.predictors import Boltz2Predictor
+    from .screening import LigandScreen, format_table, parse_ligand_library
+
+    target = utils.clean_sequence(target)
+    library = parse_ligand_library(ligands)
+    if not library:
+        print("No ligands to screen.")
+        return None
+    group = _expected_object_name(name)
+    workdir = ABS_PATH
+
+    async def work(progress):
+        predictor = Boltz2Predictor(workdir=workdir)
+        screen = LigandScreen(
+            predictor,
+            target,
+            library,
+            name=name,
+            diffusion_samples=int(diffusion_samples),
+            msa_depth=msa_depth,
+            concurrency=int(concurrency),
+            priority=check_priority(priority, default="batch"),
+        )
+        rows = await screen.run(progress)
+        return {"rows": rows, "table": str(screen.table_path)}
+
+    def on_done(output):
+        rows = output["rows"]
+        print(format_table(rows, int(top) or None))
+        print(f"Ranked table of {len(rows)} ligands saved in {output['table']}.")
+        best = [r for r in rows if r.get("status") == "ok" and r.get("paths")]
+        objects = []
+        for row in best[: int(top)]:
+            path = Path(row["paths"][0])
+            obj = _expected_object_name(path)
+            pymol_cmd.load(str(path), obj)
+            objects.append(obj)
+        if objects:
+            pymol_cmd.group(group, " ".join(objects))
+        return f"Screened {len(rows)} ligands"
+
+    return _submit("screen", name, work, on_done, wait, priority=priority)
+
+
+def saturation_scan(
+    sequence: str,
+    start: int = 1,
+    end: int = 0,
+    name: str = "scan",
+    predictor: str = "esmfold",
+    metric: str = "local_plddt_delta",
+    window: int = 5,
+    concurrency: int = 8,
+    diffusion_samples: int = 1,
+    msa_depth: int = None,
+    top: int = 10,
+    wait: int = 0,
+    priority: str = "batch",
+):
+    """
+    DESCRIPTION
+    Fold every single-point mutant of residues start-end and compare it with
+    the wild type: mean and local pLDDT change, CA RMSD and local CA RMSD.
+    Mutants already in the catalog of the working directory are not folded
+    again, and progress is checkpointed in <workdir>/scan_<name>, so running
+    the same scan again only folds the missing mutants. The wild type is
+    loaded with the per-site mean of metric in its B-factors, and heatmaps of
+    every metric are saved next to the mutants.csv table (with matplotlib).
+
+    USAGE
+    pf_scan sequence [, start [, end [, name [, predictor [, metric
+        [, window [, concurrency ]]]]]]]
+
+    ARGUMENTS
+    predictor = str: 'esmfold' or 'boltz2' {default: esmfold}
+    metric = str: plddt_delta, local_plddt_delta, rmsd or local_rmsd
+        {default: local_plddt_delta}
+    window = int: Residues on either side of a site counted as local {default: 5}
+    concurrency = int: Mutants queued for the provider at once {default: 8}
+    """
+    from .mutagenesis import (
+        METRICS,
+        MutationScan,
+        format_sites,
+        plot_heatmap,
+        site_profile,
+    )
+
+    if metric not in METRICS:
+        print(f"Unknown metric '{metric}', expected one of {', '.join(METRICS)}.")
+        return None
+    predictor = predictor.strip().lower()
+    if predictor not in ("esmfold", "boltz2"):
+        print(f"Unknown predictor '{predictor}', expected 'esmfold' or 'boltz2'.")
+        return None
+    sequence = utils.clean_sequence(sequence)
+    workdir = ABS_PATH
+
+    async def work(progress):
+        if predictor == "boltz2":
+            from pymolfold.predictors import Boltz2Predictor
+
+            folder = Boltz2Predictor(workdir=workdir)
+            predict_kwargs = {"diffusion_samples": int(diffusion_samples)}
+        else:
+            folder = ESMFoldPredictor(workdir=workdir)
+            predict_kwargs = {}
+        scan = MutationScan(
+            folder,
+            sequence,
+            start=int(start),
+            end=int(end or 0) or None,
+            name=name,
+            window=int(window),
+            concurrency=int(concurrency),
+            priority=check_priority(priority, default="batch"),
+            msa_depth=msa_depth,
+            predict_kwargs=predict_kwargs,
+        )
+        rows = await scan.run(progress)
+        heatmaps = []
+        try:
+            for each in METRICS:
+                path = plot_heatmap(
+                    rows, each, scan.directory / f"heatmap_{each}.png", sequence
+                )
+                if path:
+                    heatmaps.append(str(path))
+        except ImportError:
+            pass
+        return {
+            "rows": rows,
+            "table": str(scan.table_path),
+            "wild_type": str(scan.wild_type_path),
+            "heatmaps": heatmaps,
         }
 
-        # Get MSA and add it to the polymer
-        print("Fetching MSA from ColabFold...")
+    def on_done(output):
+        rows = output["rows"]
+        failed = sum(r.get("status") != "ok" for r in rows)
+        profile = site_profile(rows, metric)
+        print(f"Sites with the largest mean {metric}:")
+        print(format_sites(profile, sequence, int(top) or None))
+        print(f"{len(rows)} mutants ({failed} failed) saved in {output['table']}.")
+        for path in output["heatmaps"]:
+            print(f"Heatmap saved in {path}.")
+
+        obj = _expected_object_name(output["wild_type"])
+        pymol_cmd.load(output["wild_type"], obj)
+        pymol_cmd.alter(
+            f"%{obj}", "b = profile.get(resv, 0.0)", space={"profile": profile}
+        )
+        if metric.endswith("delta"):
+            # Losses of confidence are red, gains blue
+            limit = max((abs(v) for v in profile.values()), default=0.0) or 1.0
+            pymol_cmd.spectrum(
+                "b", "red_white_blue", f"%{obj}", minimum=-limit, maximum=limit
+            )
+        else:
+            pymol_cmd.spectrum("b", "blue_white_red", f"%{obj}", minimum=0)
+        return f"Scanned {len(rows)} mutants"
 
-        async def run_prediction():
-            msa_result = await predictor.get_colab_msa(sequence)
-            boltz_json["polymers"][0]["msa"] = msa_result["alignments"]
+    return _submit("scan", name, work, on_done, wait, priority=priority)
 
-            print("Running Boltz2 prediction with MSA...")
-            result = await predictor.predict(boltz_json)
-            return result
 
-        # Run the async function
-        result = asyncio.run(run_prediction())
+def resume_pending_jobs(quiet=0):
+    """
+    DESCRIPTION
+    Resume Boltz-2 requests that were still running when PyMOL or the server
+    was closed. Their results are saved to the working directory they were
+    submitted from and loaded into the session. Runs automatically at startup.
+
+    USAGE
+    pf_resume
+    """
+    store = get_pending_store()
+    entries = [e for e in store.list() if not store.is_active(e["task_id"])]
+    if not entries:
+        if not int(quiet):
+            print("No pending jobs to resume.")
+        return []
+    job_ids = [_resume_job(entry) for entry in entries]
+    print(f"Resuming {len(entries)} pending Boltz-2 job(s) in the background.")
+    return job_ids
+
+
+def _resume_job(entry):
+    from pymolfold.predictors import Boltz2Predictor
+
+    task_id = entry["task_id"]
+    name = entry.get("name") or f"boltz2_{task_id[:8]}"
+    loader = entry.get("loader") or {}
 
+    async def work(progress):
+        predictor = Boltz2Predictor(
+            workdir=entry.get("workdir") or ABS_PATH, arrays=entry.get("arrays")
+        )
+        result = await predictor.resume(task_id, progress=progress)
+        progress("saving", "Saving structures")
         saved_files = predictor.save_structures(result, name)
-        if saved_files:
-            first_file = saved_files[0]
-            pymol_cmd.load(str(first_file))
-
-            try:
-                plddt = result.get("complex_plddt_scores", [])[0]
-                print(f"Structure saved in {first_file}.")
-                print("=" * 40)
-                print(f"    pLDDT: {plddt: .2f}")
-                print("=" * 40)
-            except Exception:
-                print("Could not display pLDDT score")
+        target = loader.get("affinity_target_id")
+        return {
+            "files": [str(p) for p in saved_files],
+            "plddts": result.get("complex_plddt_scores", []),
+            "affinity_target_id": target,
+            "affinity": (result.get("affinities") or {}).get(target) or {},
+        }
+
+    def on_done(output):
+        print(f"Resumed NVCF request {task_id} ({name}).")
+        return _load_and_report(output, name, loader.get("multistate", True))
+
+    return RUNNER.submit("boltz2", name, work, on_done=on_done)
+
+
+def list_jobs():
+    """
+    DESCRIPTION
+    List background jobs with their state, elapsed time and last message.
+
+    USAGE
+    pf_jobs
+    """
+    jobs = JOBS.list()
+    if not jobs:
+        print("No jobs.")
+        return []
+    print(
+        f"{'id':<12}  {'kind':<8}  {'name':<20}  {'priority':<11}  {'state':<11}  "
+        f"{'time':>6}  message"
+    )
+    for job in jobs:
+        print(
+            f"{job.id:<12}  {job.kind:<8}  {job.name[:20]:<20}  {job.priority:<11}  "
+            f"{job.state:<11}  {job.elapsed():5.0f}s  {job.message}"
+        )
+    return [job.id for job in jobs]
+
+
+def wait_jobs(job_id="all", timeout=None):
+    """
+    DESCRIPTION
+    Wait until a background job (default: every running job) has finished and
+    its results are loaded.
+
+    USAGE
+    pf_wait [job_id [, timeout]]
+    """
+    job_ids = RUNNER.active() if job_id in ("", "all") else [job_id]
+    deadline = None if timeout in (None, "") else time.monotonic() + float(timeout)
+    for i in job_ids:
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        job = RUNNER.wait(i, timeout=remaining)
+        if job is None:
+            print(f"Unknown job: {i}")
         else:
-            print("No structures were generated")
+            print(f"{job.id}  {job.name}: {job.state}  {job.message}")
+    return job_ids
 
-    except Exception as e:
-        print(f"Error during prediction: {str(e)}")
+
+def cancel_jobs(job_id="all"):
+    """
+    DESCRIPTION
+    Cancel a queued or running background job (default: every running job).
+    Cancelled Boltz-2 requests are not resumed after a restart.
+
+    USAGE
+    pf_cancel [job_id]
+    """
+    job_ids = RUNNER.active() if job_id in ("", "all") else [job_id]
+    cancelled = [i for i in job_ids if RUNNER.cancel(i)]
+    print(f"Cancelled {len(cancelled)} job(s).")
+    return cancelled
 
 
-def query_am_hegelab(name):
+def set_job_priority(job_id="", priority=""):
+    """
+    DESCRIPTION
+    Move a queued background job to another priority class: interactive,
+    batch or prefetch. Without arguments, print how many jobs of each class
+    are running and waiting per provider.
+
+    USAGE
+    pf_priority [job_id, priority]
+    """
+    if not job_id:
+        for kind, counts in SCHEDULER.stats().items():
+            running = ", ".join(f"{p} {n}" for p, n in counts["running"].items())
+            waiting = ", ".join(f"{p} {n}" for p, n in counts["waiting"].items())
+            print(f"{kind:<8}  running: {running}  |  waiting: {waiting}")
+        return SCHEDULER.stats()
+    if not RUNNER.set_priority(job_id, priority):
+        print(f"Job {job_id} is not waiting for a slot; its priority is unchanged.")
+        return False
+    print(f"Job {job_id} is now {check_priority(priority)}.")
+    return True
+
+
+def show_latency():
+    """
+    DESCRIPTION
+    Print the latency history of the prediction backends and how often slow
+    requests were hedged (esmfold ..., hedge=esm3) and won by the hedge.
+
+    USAGE
+    pf_latency
+    """
+    summary = get_latency_tracker().summary()
+    if not summary:
+        print("No latency history yet.")
+        return summary
+
+    def fmt(value, pattern):
+        return "-" if value is None else pattern.format(value)
+
+    print(
+        f"{'backend':<10}  {'n':>5}  {'p50':>7}  {'p95':>7}  {'requests':>8}  "
+        f"{'hedged':>7}  {'won':>5}  {'failed':>6}"
+    )
+    for backend, s in summary.items():
+        print(
+            f"{backend:<10}  {s['samples']:>5}  {fmt(s['p50'], '{:6.1f}s'):>7}  "
+            f"{fmt(s['p95'], '{:6.1f}s'):>7}  {s['requests']:>8}  "
+            f"{fmt(s['hedge_rate'], '{:.0%}'):>7}  "
+            f"{fmt(s['hedge_win_rate'], '{:.0%}'):>5}  {s['failures']:>6}"
+        )
+    return summary
+
+
+def _load_fetched(results, label, color_by_plddt=True, quiet=0):
+    """Load downloaded structures in one batch, optionally colored by pLDDT"""
+    loaded = []
+    pymol_cmd.set("suspend_updates", 1)
     try:
-        url = AM_HEGELAB_API + name
-        response = requests.get(url)
-        response.raise_for_status()  # This will raise a HTTPError for bad responses (4xx and 5xx)
-    except requests.exceptions.RequestException as e:
-        print(f"An error occurred: {e}")
-    else:
-        # Follow the redirect and get the actual data URL
-        data_url = response.url
+        for key, outcome in results.items():
+            if isinstance(outcome, Exception):
+                print(f"Failed to fetch {key}: {outcome}")
+                continue
+            obj = _expected_object_name(str(outcome))
+            pymol_cmd.load(str(outcome), obj)
+            loaded.append(obj)
+        if loaded and color_by_plddt:
+            utils.color_plddt(" or ".join(loaded))
+    finally:
+        pymol_cmd.set("suspend_updates", 0)
+
+    if not int(quiet):
+        print(f"Loaded {len(loaded)}/{len(results)} {label}.")
+    return loaded
+
+
+def query_am_hegelab(names, max_workers=8, revalidate=0, quiet=0):
+    """
+    DESCRIPTION
+    Fetch AlphaMissense structures from hegelab for one or many UniProt IDs.
+    Structures are downloaded concurrently and cached, so cached entries load
+    without network access.
 
-        try:
-            data_response = requests.get(data_url)
-            data_response.raise_for_status()  # This will raise a HTTPError for bad responses (4xx and 5xx)
-        except requests.exceptions.RequestException as e:
-            print(f"An error occurred: {e}")
-        else:
-            data_content = data_response.content
+    USAGE
+    fetch_am names [, max_workers [, revalidate]]
 
-            # Save the data to a file
-            output_filename = os.path.join(ABS_PATH, name) + ".pdb"
-            with open(output_filename, "wb") as file:
-                file.write(data_content)
-    pymol_cmd.load(output_filename)
-    return 0
+    names: comma/space separated UniProt IDs, or a file with one ID per line
+    revalidate: 1 to re-download cached structures that changed on the server
+    """
+    cache = StructureCache(AM_CACHE_DIR, max_workers=int(max_workers))
+    results = fetch_alphamissense(names, cache=cache, revalidate=bool(int(revalidate)))
+    # B-factors hold pathogenicity scores, not pLDDT, so no pLDDT coloring here
+    return _load_fetched(
+        results, "AlphaMissense structures", color_by_plddt=False, quiet=quiet
+    )
 
 
 def fetch_af(uniprot_id):
-    url = f"https://alphafold.ebi.ac.uk/files/AF-{uniprot_id}-F1-model_v6.pdb"
-    pymol_cmd.do(f"load {url}")
-    pymol_cmd.do(f"color_plddt AF-{uniprot_id}-F1-model_v6")
+    loaded = fetch_af_bulk(uniprot_id, quiet=1)
+    if not loaded:
+        print(f"Could not fetch the AlphaFold DB model of {uniprot_id}.")
+
+
+def fetch_af_bulk(ids, mirror="", max_workers=8, revalidate=1, quiet=0):
+    """
+    DESCRIPTION
+    Download AlphaFold DB models for many UniProt IDs concurrently, load them
+    and color them by pLDDT. Models are cached and revalidated with
+    ETag/Last-Modified, so repeated fetches cost no download.
+
+    USAGE
+    fetch_af_bulk ids [, mirror [, max_workers [, revalidate]]]
+
+    ids: comma/space separated UniProt IDs, or a file with one ID per line
+    mirror: local directory with AF-<id>-F1-model_v6.pdb files used before the network
+    revalidate: 0 to use cached models without contacting the server
+    """
+    cache = StructureCache(
+        AF_CACHE_DIR, mirror_dir=mirror or None, max_workers=int(max_workers)
+    )
+    results = fetch_alphafold(ids, cache=cache, revalidate=bool(int(revalidate)))
+    return _load_fetched(results, "AlphaFold DB models", quiet=quiet)
+
+
+def find_predictions(query="", predictor="", min_plddt=None, limit=20):
+    """
+    Search the prediction catalog of the working directory.
+    Usage: pf_find [query [, predictor [, min_plddt [, limit]]]]
+
+    query is an exact sequence or an output name (wildcards such as * allowed).
+    """
+    min_plddt = float(min_plddt) if min_plddt not in (None, "") else None
+    rows = get_catalog(ABS_PATH).find(
+        query=query, predictor=predictor, min_plddt=min_plddt, limit=int(limit)
+    )
+    if not rows:
+        print("No matching predictions in the catalog.")
+        return rows
+
+    print(
+        f"{'id':>6}  {'date':<16}  {'predictor':<18}  {'name':<20}  "
+        f"{'len':>5}  pLDDT  file"
+    )
+    for row in rows:
+        date = time.strftime("%Y-%m-%d %H:%M", time.localtime(row["created"]))
+        plddt = f"{row['plddt']:5.1f}" if row["plddt"] is not None else "    -"
+        first_path = row["paths"][0] if row["paths"] else ""
+        print(
+            f"{row['id']:>6}  {date:<16}  {row['predictor']:<18}  "
+            f"{(row['name'] or '')[:20]:<20}  {row['length']:>5}  {plddt}  {first_path}"
+        )
+    return rows
+
+
+def ensemble_rmsf(selection="all", cutoff=2.0, reference=1, superpose=1, atoms="CA"):
+    """
+    Superpose an ensemble, write per-residue RMSF into B-factors and cluster it.
+    Usage: pf_ensemble [selection [, cutoff [, reference [, superpose [, atoms]]]]]
+
+    The ensemble is the states of one multi-state object (e.g. Boltz-2 samples)
+    or the objects in selection (e.g. a FASTA group), one model each; every
+    model needs the same number of atoms. Models are clustered by RMSD with
+    the given cutoff (Angstrom) and the central model of each cluster is
+    reported as its representative. reference is the 1-based model number.
+    """
+    import numpy as np
+
+    objects = pymol_cmd.get_object_list(f"({selection})")
+    if len(objects) == 1 and pymol_cmd.count_states(objects[0]) > 1:
+        models = [
+            (objects[0], state)
+            for state in range(1, pymol_cmd.count_states(objects[0]) + 1)
+        ]
+        labels = [f"{objects[0]} state {state}" for _, state in models]
+    else:
+        models = [(obj, 1) for obj in objects]
+        labels = list(objects)
+    if len(models) < 2:
+        print("An ensemble needs at least two models (states or objects).")
+        return None
+
+    def atom_selection(obj):
+        return f"({selection}) and %{obj} and name {atoms}"
+
+    coords = [pymol_cmd.get_coords(atom_selection(obj), state) for obj, state in models]
+    sizes = {0 if c is None else len(c) for c in coords}
+    if len(sizes) != 1 or 0 in sizes:
+        print(f"Models differ in their number of {atoms} atoms; cannot compare them.")
+        return None
+
+    result = analysis.analyze_ensemble(
+        np.stack(coords), reference=int(reference) - 1, cutoff=float(cutoff)
+    )
+
+    if int(superpose):
+        for (obj, state), rotation, translation in zip(
+            models, result["rotations"], result["translations"]
+        ):
+            xyz = pymol_cmd.get_coords(f"%{obj}", state)
+            xyz = xyz @ rotation.T + translation
+            pymol_cmd.load_coords(xyz, f"%{obj}", state=state)
+
+    # B-factors are per atom, so every state of an object shares the RMSF
+    for obj in dict.fromkeys(obj for obj, _ in models):
+        keys = []
+        pymol_cmd.iterate(
+            atom_selection(obj), "keys.append((chain, resi))", space={"keys": keys}
+        )
+        per_residue = dict(zip(keys, result["rmsf"].tolist()))
+        pymol_cmd.alter(
+            f"({selection}) and %{obj}",
+            "b = rmsf.get((chain, resi), 0.0)",
+            space={"rmsf": per_residue},
+        )
+    pymol_cmd.spectrum("b", "blue_white_red", f"({selection})")
+
+    rows = analysis.summarize_clusters(result["labels"], result["centers"], labels)
+    print(
+        f"{len(models)} models, mean RMSF {result['rmsf'].mean():.2f} A "
+        f"(max {result['rmsf'].max():.2f} A), {len(rows)} clusters at {cutoff} A"
+    )
+    for row in rows:
+        print(
+            f"  cluster {row['cluster']:>3}: {row['size']:>5} models, "
+            f"representative {row['representative']}"
+        )
+    return rows
 
 
 def _infer_object_name_from_path(path: str) -> str:
@@ -385,7 +1306,7 @@ def _resolve_obj_and_cif(arg: str, *, param_name: str) -> Tuple[str, str]:
     Resolve an argument to (object_name, abs_cif_path).
 
     Accepts either:
-      - PyMOL object name (must exist; CIF path taken from OBJECT_FILENAME_MAP)
+      - PyMOL object name (must exist; CIF path taken from OBJECT_REGISTRY)
       - Absolute path to .cif/.mmcif (loads into PyMOL and returns created object)
 
     Returns
@@ -408,59 +1329,55 @@ def _resolve_obj_and_cif(arg: str, *, param_name: str) -> Tuple[str, str]:
                 f'"{param_name}" must point to a .cif/.mmcif file, got: {s}'
             )
 
-        pre = set(pymol_cmd.get_names("objects"))
-        # Let PyMOL decide object name; we detect it post-load
+        # Let PyMOL decide object name; the wrapped load records it
         try:
             pymol_cmd.load(s, quiet=1)
         except Exception as e:
             print(f'Warning: failed to load "{s}" into PyMOL: {e}')
-        post = set(pymol_cmd.get_names("objects"))
-        new_objs = list(post - pre)
+        loaded = OBJECT_REGISTRY.objects_for(s)
 
-        if len(new_objs) == 1:
-            obj_name = new_objs[0]
+        if loaded:
+            obj_name = loaded[0]  # deterministic pick
         else:
-            # Fallback to filename prefix if we can't uniquely detect
+            # Fallback to filename prefix if we can't detect the object
             obj_name = _infer_object_name_from_path(s)
-            if obj_name not in post:
-                # If prefix is taken and PyMOL auto-suffixed, best-effort pick any matching prefix
-                candidates = [n for n in post if n.startswith(obj_name)]
-                if candidates:
-                    obj_name = sorted(candidates)[0]  # deterministic pick
 
         # Map it so later calls can resolve by object name too
-        OBJECT_FILENAME_MAP[obj_name] = os.path.abspath(s)
+        OBJECT_REGISTRY[obj_name] = os.path.abspath(s)
         return obj_name, os.path.abspath(s)
 
     # Object name case
     obj = s
-    if obj not in pymol_cmd.get_names("objects"):
+    if not _object_exists(obj):
         # The object should exist for alignment; still allow using the path if we have one
         print(
             f'Warning: object "{obj}" not found in current session. If PXMeter runs, alignment will be skipped for this object.'
         )
 
-    path = OBJECT_FILENAME_MAP.get(obj)
+    path = OBJECT_REGISTRY.get(obj)
     if not path:
         raise KeyError(
-            f'Object "{obj}" not found in OBJECT_FILENAME_MAP. '
+            f'Object "{obj}" not found in OBJECT_REGISTRY. '
             f"Load it via the wrapped cmd.load so the map gets populated, or pass an absolute CIF path."
         )
     if not os.path.isabs(path) or not os.path.exists(path):
         raise FileNotFoundError(
-            f'OBJECT_FILENAME_MAP has an invalid path for "{obj}": {path!r}'
+            f'OBJECT_REGISTRY has an invalid path for "{obj}": {path!r}'
         )
     if not (path.lower().endswith(".cif") or path.lower().endswith(".mmcif")):
         raise ValueError(
-            f'OBJECT_FILENAME_MAP entry for "{obj}" is not a CIF file: {path!r}'
+            f'OBJECT_REGISTRY entry for "{obj}" is not a CIF file: {path!r}'
         )
     return obj, os.path.abspath(path)
 
 
-def pxmeter_align(ref_cif: str, model_cif: str, verbose: bool = True) -> dict:
+def pxmeter_align(
+    ref_cif: str, model_cif: str, verbose: bool = True, wait: int = 0
+) -> dict:
     """
     Evaluate with PXMeter using either object names or absolute CIF paths.
     Additionally, CEAlign (model -> ref) and zoom before running PXMeter.
+    The evaluation itself runs in the background.
 
     Parameters
     ----------
@@ -470,11 +1387,14 @@ def pxmeter_align(ref_cif: str, model_cif: str, verbose: bool = True) -> dict:
         PyMOL object name or absolute .cif/.mmcif path. Paths are loaded.
     verbose : bool
         Whether to print progress messages.
+    wait : int
+        Block until the evaluation is done and return its result.
 
     Returns
     -------
     dict
-        PXMeter result (json-like dict)
+        PXMeter result (json-like dict) with ``wait``, otherwise
+        ``{"job_id": ...}``
     """
     from shadowpxmeter.eval import evaluate
 
@@ -496,9 +1416,7 @@ def pxmeter_align(ref_cif: str, model_cif: str, verbose: bool = True) -> dict:
     # CEAlign model -> ref, then zoom on both
     ceinfo = None
     try:
-        if ref_obj in pymol_cmd.get_names(
-            "objects"
-        ) and model_obj in pymol_cmd.get_names("objects"):
+        if _object_exists(ref_obj) and _object_exists(model_obj):
             if verbose:
                 print(f'Aligning "{model_obj}" to "{ref_obj}" with CEAlign...')
             ceinfo = pymol_cmd.cealign(ref_obj, model_obj)  # target, mobile
@@ -518,25 +1436,32 @@ def pxmeter_align(ref_cif: str, model_cif: str, verbose: bool = True) -> dict:
 
     if verbose:
         print("Evaluating structure with PXMeter...")
-    metric_result = evaluate(
-        ref_cif=ref_path,
-        model_cif=model_path,
-    )
 
-    json_dict = metric_result.to_json_dict()
+    def work(progress):
+        metric_result = evaluate(
+            ref_cif=ref_path,
+            model_cif=model_path,
+        )
+        return metric_result.to_json_dict()
 
-    out_dir = os.path.join(ABS_PATH, "pxmeter_results")
-    os.makedirs(out_dir, exist_ok=True)
-    # If you have a visualization util, uncomment:
-    utils.visualize_pxmeter_metrics(json_dict, output_dir=out_dir)
+    def on_done(json_dict):
+        out_dir = os.path.join(ABS_PATH, "pxmeter_results")
+        os.makedirs(out_dir, exist_ok=True)
+        # Plotting stays on the GUI thread
+        utils.visualize_pxmeter_metrics(json_dict, output_dir=out_dir)
 
-    if verbose:
-        import json
+        if verbose:
+            import json
 
-        print("PXMeter results:\n", json.dumps(json_dict, indent=2))
-        print(f"PXMeter results written to: {out_dir}")
+            print("PXMeter results:\n", json.dumps(json_dict, indent=2))
+            print(f"PXMeter results written to: {out_dir}")
+        return f"PXMeter results written to {out_dir}"
 
-    return json_dict
+    job_id = _submit("pxmeter", f"{model_obj}:{ref_obj}", work, on_done, wait)
+    if int(wait):
+        job = JOBS.get(job_id)
+        return job.result if job is not None and job.result else {}
+    return {"job_id": job_id}
 
 
 # def pxmeter_align(ref_cif, model_cif):
@@ -586,6 +1511,7 @@ def __init_plugin__(app=None):
     pymol_cmd.extend("foldingui", init_boltz2_gui)
     pymol_cmd.extend("bfold", query_boltz_monomer)
     pymol_cmd.extend("esm3", query_esm3)
+    pymol_cmd.extend("esm3_local", query_esm3_local)
     pymol_cmd.extend("esmfold", query_esmfold)
     pymol_cmd.extend("set_workdir", set_workdir)
     pymol_cmd.extend("set_base_url", set_base_url)
@@ -595,8 +1521,37 @@ def __init_plugin__(app=None):
     pymol_cmd.extend("pxmeter_align", pxmeter_align)
     pymol_cmd.extend("fetch_am", query_am_hegelab)
     pymol_cmd.extend("fetch_af", fetch_af)
+    pymol_cmd.extend("fetch_af_bulk", fetch_af_bulk)
+    pymol_cmd.extend("pf_find", find_predictions)
+    pymol_cmd.extend("pf_ensemble", ensemble_rmsf)
+    pymol_cmd.extend("pf_screen", screen_ligands)
+    pymol_cmd.extend("pf_scan", saturation_scan)
+    pymol_cmd.extend("pf_arrays", set_arrays)
+    pymol_cmd.extend("pf_split_state", utils.split_state)
+    pymol_cmd.extend("pf_resume", resume_pending_jobs)
+    pymol_cmd.extend("pf_jobs", list_jobs)
+    pymol_cmd.extend("pf_wait", wait_jobs)
+    pymol_cmd.extend("pf_cancel", cancel_jobs)
+    pymol_cmd.extend("pf_priority", set_job_priority)
+    pymol_cmd.extend("pf_latency", show_latency)
     pymol_cmd.extend("load", load)
     pymol_cmd.load = load  # Override the original load command
+    pymol_cmd.extend("delete", delete)
+    pymol_cmd.delete = delete
+    pymol_cmd.extend("set_name", set_name)
+    pymol_cmd.set_name = set_name
+    _register_session_tasks()
+    try:
+        _rescan_objects()
+    except Exception:
+        pass
+
+    # Results of background jobs are loaded on this (the GUI) thread
+    RUNNER.dispatcher.install()
+    try:
+        resume_pending_jobs(quiet=1)
+    except Exception as e:
+        print(f"Could not resume pending jobs: {e}")
 
     pymol_cmd.auto_arg[0]["pxmeter_align"] = [pymol_cmd.object_sc, "object", ""]
     pymol_cmd.auto_arg[1]["pxmeter_align"] = [pymol_cmd.object_sc, "object", ""]
@@ -3,11 +3,16 @@
 from .base import StructurePredictor
 from .boltz import Boltz2Predictor
 from .esm import ESM3Predictor, ESMFoldPredictor  # , PyMolFoldPredictor
+from .local import ESM3LocalPredictor
+from .result import PredictionResult, StructurePayload
 
 __all__ = [
     "StructurePredictor",
     "Boltz2Predictor",
     "ESM3Predictor",
     "ESMFoldPredictor",
+    "ESM3LocalPredictor",
+    "PredictionResult",
+    "StructurePayload",
     # 'PyMolFoldPredictor'
 ]
@@ -1,23 +1,41 @@
+import logging
 from abc import ABC, abstractmethod
 from copy import deepcopy
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Union
 from pathlib import Path
 
+from .. import utils
+from ..arraystore import get_array_store
+from ..catalog import get_catalog
+from .result import PredictionResult
+
+logger = logging.getLogger(__name__)
+
 
 class StructurePredictor(ABC):
     """Base class for all structure prediction methods"""
 
-    def __init__(self, workdir: Optional[str] = None):
+    def __init__(
+        self,
+        workdir: Optional[str] = None,
+        catalog: bool = True,
+        arrays: Optional[str] = None,
+    ):
         """Initialize predictor with optional working directory
 
         Args:
             workdir: Directory to save prediction results. Defaults to current directory.
+            catalog: Record saved predictions in the working directory catalog.
+            arrays: Batch name; saved predictions are also appended to the
+                batch's memory-mapped arrays (see pymolfold.arraystore).
         """
         self.workdir = Path(workdir) if workdir else Path.cwd()
         self.workdir.mkdir(parents=True, exist_ok=True)
+        self.catalog = catalog
+        self.arrays = arrays
 
     @abstractmethod
-    def predict(self, sequence: str, **kwargs) -> Dict[str, Any]:
+    def predict(self, sequence: str, **kwargs) -> PredictionResult:
         """Predict structure from sequence
 
         Args:
@@ -25,33 +43,42 @@ class StructurePredictor(ABC):
             **kwargs: Additional method-specific parameters
 
         Returns:
-            Dictionary containing prediction results including:
+            PredictionResult (usable like a dictionary) including:
             - structures: List of structure dictionaries with 'structure' and 'source' fields
             - confidence_scores: List of confidence scores
+            - sequence: The input sequence (chains separated by ':')
+            - params: Parameters used for the prediction
+            - elapsed: Wall-clock seconds spent predicting
             - additional method-specific results
         """
         pass
 
-    def save_structures(self, result: Dict[str, Any], name=None) -> List[Path]:
+    def save_structures(
+        self, result: Union[PredictionResult, Dict[str, Any]], name=None
+    ) -> List[Path]:
         """Save predicted structures to files
 
+        Saved structures are released from memory; they keep a reference to
+        their file and are read back from there if accessed again.
+
         Args:
-            result: Dictionary returned by predict()
+            result: PredictionResult (or dictionary) returned by predict()
 
         Returns:
             List of paths to saved structure files
         """
+        result = PredictionResult.from_dict(result)
         saved_files = []
-        for i, struct in enumerate(result.get("structures", [])):
+        for i, struct in enumerate(result.structures):
             initial_name = deepcopy(name)
-            if "structure" not in struct or "source" not in struct:
+            if struct.source is None:
                 continue
             if initial_name is None:
                 # Clean filename and ensure .cif extension
-                initial_name = self._clean_filename(struct["source"])
+                initial_name = self._clean_filename(struct.source)
             else:
                 initial_name += f"_{i + 1}"
-            suffix = ".cif" if struct["structure"].startswith("data_") else ".pdb"
+            suffix = ".cif" if struct.is_mmcif else ".pdb"
             if not initial_name.lower().endswith(suffix):
                 initial_name += suffix
 
@@ -66,10 +93,44 @@ class StructurePredictor(ABC):
                 counter += 1
 
             # Save structure
-            path.write_text(struct["structure"])
-            saved_files.append(path)
+            saved_files.append(struct.save(path))
+
+        if saved_files and self.catalog and result.get("sequence"):
+            try:
+                self._record_in_catalog(result, saved_files, name)
+            except Exception as e:
+                logger.warning("Could not record prediction in catalog: %s", e)
+        if saved_files and self.arrays:
+            try:
+                get_array_store(self.workdir, self.arrays).add_result(
+                    result, saved_files, name, predictor=type(self).__name__
+                )
+            except Exception as e:
+                logger.warning("Could not add prediction to the batch arrays: %s", e)
         return saved_files
 
+    def _record_in_catalog(
+        self, result: PredictionResult, saved_files: List[Path], name=None
+    ):
+        """Add a saved prediction to the working directory catalog"""
+        plddts = result.get("complex_plddt_scores")
+        if not plddts:
+            plddts = [
+                utils.cal_plddt(struct.text)
+                for struct in result.structures
+                if not struct.is_mmcif
+            ]
+        get_catalog(self.workdir).record(
+            sequence=result["sequence"],
+            predictor=type(self).__name__,
+            paths=saved_files,
+            name=name or saved_files[0].stem,
+            params=result.get("params"),
+            plddts=plddts,
+            affinity=result.get("affinities"),
+            duration=result.get("elapsed"),
+        )
+
     @staticmethod
     def _clean_filename(name: str) -> str:
         """Clean a string to create a valid filename"""
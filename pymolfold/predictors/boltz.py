@@ -1,11 +1,19 @@
 import json
 import os
 import asyncio
+import functools
+import time
 from typing import Dict, Any, Optional
 import httpx
 from fastapi import HTTPException
 import logging
 from .base import StructurePredictor
+from .result import PredictionResult
+from .streaming import StructureStreamDecoder
+from ..chem import canonicalize_smiles
+from ..msa import filter_alignments
+from ..pending import get_pending_store, payload_hash
+from ..singleflight import SINGLE_FLIGHT, request_key
 
 logger = logging.getLogger(__name__)
 
@@ -16,14 +24,19 @@ class Boltz2Predictor(StructurePredictor):
     STATUS_URL = "https://api.nvcf.nvidia.com/v2/nvcf/pexec/status/{task_id}"
     BOLTZ_URL = "https://health.api.nvidia.com/v1/biology/mit/boltz2/predict"
     MSA_URL = "https://health.api.nvidia.com/v1/biology/colabfold/msa-search/predict"
+    # MSA filtering before submission (see pymolfold.msa); depth 0 disables it
+    MSA_MAX_DEPTH = 1024
+    MSA_MAX_SEQ_ID = 0.9
+    MSA_MIN_COVERAGE = 0.5
 
-    def __init__(self, workdir: Optional[str] = None):
+    def __init__(self, workdir: Optional[str] = None, arrays: Optional[str] = None):
         """Initialize Boltz2 predictor
 
         Args:
             workdir: Directory to save prediction results
+            arrays: Batch whose arrays saved predictions are added to
         """
-        super().__init__(workdir)
+        super().__init__(workdir, arrays=arrays)
         self.api_key = os.environ.get("NVCF_API_KEY")
         if not self.api_key:
             raise RuntimeError(
@@ -40,15 +53,57 @@ class Boltz2Predictor(StructurePredictor):
         }
 
         print("Making MSA request...")
-        result = await self._make_nvcf_call(function_url=self.MSA_URL, data=data)
+        # Identical searches running at the same time share one request
+        result = await SINGLE_FLIGHT.run(
+            request_key("colabfold_msa", sequence, **data),
+            self._make_nvcf_call,
+            function_url=self.MSA_URL,
+            data=data,
+            on_join=lambda: print("Attached to an identical MSA search in flight"),
+        )
         return result
 
-    async def convert_to_boltz_json(self, gui_data):
+    async def get_filtered_msa(
+        self, sequence: str, max_depth: Optional[int] = None, progress=None
+    ) -> Dict[str, Any]:
+        """ColabFold MSA of ``sequence`` reduced by identity, coverage and depth
+
+        Args:
+            sequence: Query protein sequence
+            max_depth: Maximum sequences per alignment (default: MSA_MAX_DEPTH)
+            progress: Optional ``callback(state, message)`` for job progress
+
+        Returns:
+            Alignments in the format expected by ``polymer["msa"]``
+        """
+        msa_result = await self.get_colab_msa(sequence)
+        depth = self.MSA_MAX_DEPTH if max_depth is None else int(max_depth)
+        loop = asyncio.get_running_loop()
+        alignments, stats = await loop.run_in_executor(
+            None,
+            functools.partial(
+                filter_alignments,
+                msa_result["alignments"],
+                max_seq_id=self.MSA_MAX_SEQ_ID,
+                min_coverage=self.MSA_MIN_COVERAGE,
+                max_depth=depth,
+            ),
+        )
+        if stats.n_input:
+            message = f"MSA filtered: {stats}"
+            print(message)
+            logger.info(message)
+            if progress:
+                progress("msa", message)
+        return alignments
+
+    async def convert_to_boltz_json(self, gui_data, progress=None):
         """
         Converts the final_data list from the Streamlit app into the Boltz JSON format.
 
         Args:
             final_data: A dictionary of entities and settings.
+            progress: Optional ``callback(state, message)`` for job progress.
 
         Returns:
             dict: A dictionary formatted for Boltz API input.
@@ -65,6 +120,7 @@ class Boltz2Predictor(StructurePredictor):
         affinity_settings = gui_data.get("binding_affinity_settings", None)
         name = gui_data.get("name", None)
         diffusion_samples = gui_data.get("diffusion_samples", 1)
+        msa_max_depth = gui_data.get("msa_max_depth")
 
         if affinity_settings and affinity_settings.get("calculate_affinity"):
             # Parse the chain ID from a string like "Ligand (CCD) CHAIN_ID: B"
@@ -96,8 +152,11 @@ class Boltz2Predictor(StructurePredictor):
                         # Here we would normally generate or fetch an MSA.
                         # For simplicity, we'll create a dummy MSA entry.
                         # In a real application, you might integrate with an MSA generation tool.
-                        msa_result = await self.get_colab_msa(sequence)
-                        polymer["msa"] = msa_result["alignments"]
+                        if progress:
+                            progress("msa", f"Searching MSA for chain {chain_id}")
+                        polymer["msa"] = await self.get_filtered_msa(
+                            sequence, max_depth=msa_max_depth, progress=progress
+                        )
                     else:
                         # Create a placeholder MSA as required by the Boltz format
                         polymer["msa"] = {
@@ -118,6 +177,9 @@ class Boltz2Predictor(StructurePredictor):
                     "ccd_string", ""
                 )
                 lig_param = "smiles" if entity_type == "Ligand (SMILES)" else "ccd"
+                if lig_param == "smiles":
+                    # Equivalent SMILES spellings map to one canonical input
+                    entity_string = canonicalize_smiles(entity_string) or entity_string
                 ligand = {
                     lig_param: entity_string,
                     "id": chain_id,
@@ -133,7 +195,7 @@ class Boltz2Predictor(StructurePredictor):
             ]  # Remove empty polymers list if no polymers present
         return boltz_json, name, affinity_target_id, diffusion_samples
 
-    async def predict(self, boltz_json: dict, **kwargs) -> Dict[str, Any]:
+    async def predict(self, boltz_json: dict, **kwargs) -> PredictionResult:
         """Predict protein structure using Boltz2
 
         Args:
@@ -144,9 +206,16 @@ class Boltz2Predictor(StructurePredictor):
                 diffusion_samples: Number of diffusion samples (default: 3)
                 step_scale: Step scale factor (default: 1.2)
                 without_potentials: Whether to disable potentials (default: True)
+                write_full_pae: Also return the full PAE matrix of every sample
+                write_full_pde: Also return the full PDE matrix of every sample
+                msa_depth: Depth the polymer MSAs were filtered to, recorded in
+                    the result params (not sent to the API)
+                progress: Optional ``callback(state, message)`` for job progress
+                pending: Metadata (name, workdir, loader options) stored with the
+                    NVCF request id so the job can be resumed after a restart
 
         Returns:
-            Dictionary containing:
+            PredictionResult containing:
             - structures: List of predicted structures
             - confidence_scores: Confidence scores for predictions
         """
@@ -158,24 +227,170 @@ class Boltz2Predictor(StructurePredictor):
             "step_scale": kwargs.get("step_scale", 1.6),
             "without_potentials": kwargs.get("without_potentials", True),
         }
+        for flag in ("write_full_pae", "write_full_pde"):
+            if kwargs.get(flag):
+                data[flag] = True
         boltz_json.update(data)
+        start = time.perf_counter()
+
+        progress = kwargs.get("progress")
+        if progress:
+            progress("predicting", "Submitting Boltz-2 request")
 
-        # instead of asyncio.run, we make the predict function async and call await here
-        result = await self._make_nvcf_call(
+        sequence = ":".join(
+            p.get("sequence", "") for p in boltz_json.get("polymers", [])
+        )
+        params = dict(
+            data,
+            ligands=[
+                lig.get("smiles") or lig.get("ccd")
+                for lig in boltz_json.get("ligands", [])
+            ],
+        )
+        if kwargs.get("msa_depth") is not None:
+            params["msa_depth"] = int(kwargs["msa_depth"])
+        digest = payload_hash(boltz_json)
+        pending = kwargs.get("pending")
+        if pending is not None:
+            pending = dict(
+                pending,
+                sequence=sequence,
+                params=params,
+                payload_hash=digest,
+            )
+
+        def joined():
+            if progress:
+                progress("predicting", "Attached to an identical request in flight")
+
+        # Identical concurrent submissions (same payload) share one NVCF request;
+        # only the first one is recorded as pending
+        response = await SINGLE_FLIGHT.run(
+            request_key("boltz2", payload=digest),
+            self._make_nvcf_call,
+            on_join=joined,
             function_url=self.BOLTZ_URL,
             data=boltz_json,
             poll_seconds=kwargs.get("poll_seconds", 300),
             timeout_seconds=kwargs.get("timeout_seconds", 400),
+            progress=progress,
+            pending=pending,
+            stream_structures=True,
         )
+        result = PredictionResult.from_dict(response)
+        del response
+
+        result["sequence"] = sequence
+        result["params"] = params
+        result["elapsed"] = time.perf_counter() - start
+        return result
+
+    async def resume(self, task_id: str, progress=None, **kwargs) -> PredictionResult:
+        """Poll a request submitted before a restart and return its result
+
+        Args:
+            task_id: NVCF request id recorded in the pending job store
+            progress: Optional ``callback(state, message)`` for job progress
 
+        Returns:
+            Same result as ``predict``
+        """
+        entry = get_pending_store().get(task_id) or {}
+        headers = self._nvcf_headers(kwargs.get("poll_seconds", 300))
+        async with httpx.AsyncClient() as client:
+            result = PredictionResult.from_dict(
+                await self._poll_nvcf(
+                    client,
+                    task_id,
+                    headers,
+                    timeout_seconds=kwargs.get("timeout_seconds", 400),
+                    progress=progress,
+                    stream_structures=True,
+                )
+            )
+        result["sequence"] = entry.get("sequence", "")
+        result["params"] = entry.get("params")
+        if entry.get("submitted"):
+            result["elapsed"] = time.time() - entry["submitted"]
         return result
 
+    def save_structures(self, result: PredictionResult, name=None):
+        saved_files = super().save_structures(result, name)
+        # The result is on disk now; a restart no longer needs to resume it
+        get_pending_store().remove(result.get("nvcf_reqid"))
+        return saved_files
+
+    def _nvcf_headers(self, poll_seconds: int) -> Dict[str, str]:
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "NVCF-POLL-SECONDS": str(poll_seconds),
+            "Content-Type": "application/json",
+        }
+
+    async def _poll_nvcf(
+        self,
+        client: httpx.AsyncClient,
+        task_id: str,
+        headers: Dict[str, str],
+        timeout_seconds: int = 400,
+        progress=None,
+        stream_structures: bool = False,
+    ) -> Dict[str, Any]:
+        """Poll the status endpoint of an accepted request until it completes"""
+        store = get_pending_store()
+        if not store.claim(task_id):
+            raise RuntimeError(f"NVCF request {task_id} is already being polled")
+        try:
+            return await self._poll_until_done(
+                client, task_id, headers, timeout_seconds, progress, stream_structures
+            )
+        except asyncio.CancelledError:
+            # Cancelled on purpose; do not resume it after a restart
+            store.remove(task_id)
+            raise
+        finally:
+            store.release(task_id)
+
+    async def _poll_until_done(
+        self, client, task_id, headers, timeout_seconds, progress, stream_structures
+    ) -> Dict[str, Any]:
+        if progress:
+            progress("polling", f"Waiting for NVCF request {task_id}")
+
+        while True:
+            async with client.stream(
+                "GET",
+                self.STATUS_URL.format(task_id=task_id),
+                headers=headers,
+                timeout=timeout_seconds,
+            ) as status_response:
+                if status_response.status_code == 200:
+                    result = await self._read_json(
+                        status_response, stream_structures, progress
+                    )
+                    result["nvcf_reqid"] = task_id
+                    return result
+                await status_response.aread()
+
+            if status_response.status_code in [400, 401, 404, 422, 500]:
+                # The request failed or expired for good; nothing left to resume
+                # (a bad API key may be fixed, so 401 keeps the entry)
+                if status_response.status_code != 401:
+                    get_pending_store().remove(task_id)
+                raise HTTPException(
+                    status_code=status_response.status_code,
+                    detail=f"Error polling results: {status_response.text}",
+                )
+
     async def _make_nvcf_call(
         self,
         function_url: str,
         data: Dict[str, Any],
         poll_seconds: int = 300,
         timeout_seconds: int = 400,
+        progress=None,
+        pending: Optional[Dict[str, Any]] = None,
+        stream_structures: bool = False,
     ) -> Dict[str, Any]:
         """Make call to NVIDIA Cloud Functions with polling
 
@@ -184,6 +399,12 @@ class Boltz2Predictor(StructurePredictor):
             data: Request payload
             poll_seconds: Maximum polling time
             timeout_seconds: Request timeout
+            progress: Optional ``callback(state, message)`` for job progress
+            pending: If given, an accepted (202) request id is persisted with
+                this metadata until its result has been saved
+            stream_structures: Write ``structures[*].structure`` to files in
+                the working directory while the response downloads; those
+                entries are returned as ``StructurePayload`` objects
 
         Returns:
             API response data
@@ -192,11 +413,7 @@ class Boltz2Predictor(StructurePredictor):
             HTTPException: If API call fails
         """
         async with httpx.AsyncClient() as client:
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "NVCF-POLL-SECONDS": str(poll_seconds),
-                "Content-Type": "application/json",
-            }
+            headers = self._nvcf_headers(poll_seconds)
 
             logger.debug(
                 "Headers: %s",
@@ -205,13 +422,21 @@ class Boltz2Predictor(StructurePredictor):
             logger.debug("Making NVCF call to %s", function_url)
             logger.debug("Data: %s", data)
 
-            response = await client.post(
-                function_url, json=data, headers=headers, timeout=timeout_seconds
-            )
-
-            logger.debug(
-                "NVCF response: %s, %s", response.status_code, response.headers
-            )
+            async with client.stream(
+                "POST",
+                function_url,
+                json=data,
+                headers=headers,
+                timeout=timeout_seconds,
+            ) as response:
+                logger.debug(
+                    "NVCF response: %s, %s", response.status_code, response.headers
+                )
+                if response.status_code == 200:
+                    return await self._read_json(
+                        response, stream_structures, progress
+                    )
+                await response.aread()
 
             if response.status_code == 202:
                 # Handle 202 Accepted - poll for results
@@ -221,22 +446,43 @@ class Boltz2Predictor(StructurePredictor):
                         status_code=500, detail="Missing nvcf-reqid header"
                     )
 
-                while True:
-                    status_response = await client.get(
-                        self.STATUS_URL.format(task_id=task_id),
-                        headers=headers,
-                        timeout=timeout_seconds,
+                if pending is not None:
+                    get_pending_store().add(
+                        task_id, function_url=function_url, **pending
                     )
 
-                    if status_response.status_code == 200:
-                        return status_response.json()
-                    elif status_response.status_code in [400, 401, 404, 422, 500]:
-                        raise HTTPException(
-                            status_code=status_response.status_code,
-                            detail=f"Error polling results: {status_response.text}",
-                        )
-
-            elif response.status_code == 200:
-                return response.json()
+                return await self._poll_nvcf(
+                    client,
+                    task_id,
+                    headers,
+                    timeout_seconds,
+                    progress,
+                    stream_structures=stream_structures,
+                )
 
             raise HTTPException(status_code=response.status_code, detail=response.text)
+
+    async def _read_json(
+        self, response: httpx.Response, stream_structures: bool, progress=None
+    ) -> Dict[str, Any]:
+        """Decode a streamed JSON response
+
+        With ``stream_structures`` the structure strings go to disk chunk by
+        chunk (see ``StructureStreamDecoder``); otherwise the body is read whole.
+        """
+        if progress:
+            progress("downloading", "Downloading results")
+        if not stream_structures:
+            await response.aread()
+            return response.json()
+
+        decoder = StructureStreamDecoder(self.workdir)
+        try:
+            async for chunk in response.aiter_bytes():
+                decoder.feed(chunk)
+            result = decoder.close()
+        except BaseException:
+            decoder.discard()
+            raise
+        logger.debug("Streamed %.1f MB NVCF response", decoder.bytes_in / 1e6)
+        return result
@@ -1,16 +1,30 @@
 """ESM-based structure predictors"""
 
+import functools
+import logging
 import os
+import time
 import requests
-from typing import Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, Tuple
 from .base import StructurePredictor
+from .result import PredictionResult, StructurePayload
+from ..hedging import hedged_call
+from ..singleflight import SINGLE_FLIGHT, request_key
+from ..structure import stitch_segments, window_starts
+
+logger = logging.getLogger(__name__)
+
+
+def _log_join(kind: str):
+    logger.info("Attached to an identical %s prediction already in flight", kind)
 
 
 class ESM3Predictor(StructurePredictor):
     """Structure predictor using ESM-3"""
 
-    def __init__(self, workdir: Optional[str] = None):
-        super().__init__(workdir)
+    def __init__(self, workdir: Optional[str] = None, arrays: Optional[str] = None):
+        super().__init__(workdir, arrays=arrays)
         self._check_esm_token()
 
     def _check_esm_token(self):
@@ -28,7 +42,7 @@ class ESM3Predictor(StructurePredictor):
                 "https://forge.evolutionaryscale.ai"
             )
 
-    def predict(self, sequence: str, **kwargs) -> Dict[str, Any]:
+    def predict(self, sequence: str, **kwargs) -> PredictionResult:
         """Predict structure using ESM-3
 
         Args:
@@ -37,10 +51,24 @@ class ESM3Predictor(StructurePredictor):
                 temperature: Sampling temperature (default: 0.7)
                 num_steps: Number of steps (default: 8)
                 model_name: Model name (default: "esm3-medium-2024-08")
+                num_samples: Number of independent samples (default: 1)
 
         Returns:
-            Dictionary with prediction results
+            PredictionResult with the predicted structure(s)
         """
+        key = request_key(
+            "esm3",
+            sequence,
+            model_name=kwargs.get("model_name", "esm3-medium-2024-08"),
+            num_steps=kwargs.get("num_steps", 8),
+            temperature=kwargs.get("temperature", 0.7),
+            num_samples=max(1, int(kwargs.get("num_samples", 1))),
+        )
+        return SINGLE_FLIGHT.call(
+            key, self._predict, sequence, on_join=lambda: _log_join("ESM-3"), **kwargs
+        )
+
+    def _predict(self, sequence: str, **kwargs) -> PredictionResult:
         # try:
         from esm.sdk import client
         from esm.sdk.api import ESMProtein, GenerationConfig
@@ -59,54 +87,180 @@ class ESM3Predictor(StructurePredictor):
             temperature=kwargs.get("temperature", 0.7),
         )
 
-        prompt = ESMProtein(sequence=sequence)
-        prediction = model.generate(prompt, config)
-        chain = prediction.to_protein_chain()
+        num_samples = max(1, int(kwargs.get("num_samples", 1)))
+        start = time.perf_counter()
+        structures = []
+        for _ in range(num_samples):
+            prompt = ESMProtein(sequence=sequence)
+            prediction = model.generate(prompt, config)
+            chain = prediction.to_protein_chain()
+            structures.append(
+                StructurePayload(
+                    chain.to_pdb_string(),
+                    source=kwargs.get("name", "esm3_prediction"),
+                )
+            )
 
-        return {
-            "structures": [
-                {
-                    "structure": chain.to_pdb_string(),
-                    "source": kwargs.get("name", "esm3_prediction"),
-                }
-            ],
-            "confidence_scores": [None],  # pLDDT available in B-factors
-        }
+        result = PredictionResult(
+            structures,
+            sequence=sequence,
+            params={
+                "model_name": model_name,
+                "num_steps": config.num_steps,
+                "temperature": config.temperature,
+                "num_samples": num_samples,
+            },
+            elapsed=time.perf_counter() - start,
+        )
+        result["confidence_scores"] = [None] * num_samples  # pLDDT in B-factors
+        return result
 
 
 class ESMFoldPredictor(StructurePredictor):
-    """Structure predictor using ESMFold API"""
+    """Structure predictor using ESMFold API
 
-    API_URL = "https://api.esmatlas.com/foldSequence/v1/pdb/"
+    Sequences longer than ``MAX_LENGTH`` are folded in windowed mode: the
+    sequence is split into overlapping windows that are folded concurrently and
+    stitched back together by superposing the overlaps.
 
-    def predict(self, sequence: str, **kwargs) -> Dict[str, Any]:
+    With ``hedge`` a fold that takes longer than the usual latency of the atlas
+    (see ``pymolfold.hedging``) is also sent to a second backend and the first
+    answer is used.
+    """
+
+    API_URL = "https://api.esmatlas.com/foldSequence/v1/pdb/"
+    MAX_LENGTH = 400
+    WINDOW_OVERLAP = 100
+    MAX_WORKERS = 4
+    CONNECT_TIMEOUT = 10
+    TIMEOUT = 120
+    HEDGE_BACKENDS = ("esmfold", "esm3")
+
+    def predict(self, sequence: str, **kwargs) -> PredictionResult:
         """Predict structure using ESMFold
 
         Args:
             sequence: Amino acid sequence
-            **kwargs: Additional parameters (not used)
+            **kwargs:
+                name: Source name for the returned structure
+                windowed: Fold sequences longer than MAX_LENGTH in overlapping
+                    windows (default: True)
+                window_overlap: Residues shared by neighbouring windows (default: 100)
+                max_workers: Windows folded concurrently (default: 4)
+                timeout: Seconds to wait for the atlas to answer (default: 120)
+                hedge: Backend also asked when the atlas is slow, 'esmfold'
+                    (a second attempt) or 'esm3'; empty disables hedging.
+                    Windowed folds always hedge with 'esmfold'.
 
         Returns:
-            Dictionary with prediction results
+            PredictionResult with the predicted structure(s)
         """
+        key = request_key(
+            "esmfold",
+            sequence,
+            windowed=kwargs.get("windowed", True),
+            window_overlap=kwargs.get("window_overlap", self.WINDOW_OVERLAP),
+        )
+        return SINGLE_FLIGHT.call(
+            key, self._predict, sequence, on_join=lambda: _log_join("ESMFold"), **kwargs
+        )
+
+    def _predict(self, sequence: str, **kwargs) -> PredictionResult:
+        name = kwargs.get("name", "esmfold_prediction")
+        start = time.perf_counter()
+        if (
+            len(sequence) > self.MAX_LENGTH
+            and ":" not in sequence
+            and kwargs.get("windowed", True)
+        ):
+            result = self._predict_windowed(sequence, name, **kwargs)
+        else:
+            pdb_string, backend = self._fold_hedged(
+                sequence, kwargs.get("hedge"), kwargs.get("timeout")
+            )
+            result = {
+                "structures": [{"structure": pdb_string, "source": name}],
+                "confidence_scores": [None],  # pLDDT available in B-factors
+                "params": {},
+                "backend": backend,
+            }
+        result = PredictionResult.from_dict(result)
+        result["sequence"] = sequence
+        result["elapsed"] = time.perf_counter() - start
+        return result
+
+    def _fold(self, sequence: str, timeout: Optional[float] = None) -> str:
         headers = {"Content-Type": "application/x-www-form-urlencoded"}
         response = requests.post(
-            self.API_URL, headers=headers, data=sequence, verify=False
+            self.API_URL,
+            headers=headers,
+            data=sequence,
+            verify=False,
+            timeout=(self.CONNECT_TIMEOUT, timeout or self.TIMEOUT),
         )
 
         if response.status_code == 500:
             raise RuntimeError("ESMFold API internal server error")
+        # Rate limits and gateway errors must fail, not pass for a structure
+        response.raise_for_status()
+        pdb_string = response.content.decode("utf-8", errors="replace")
+        if not pdb_string.startswith("ATOM") and "\nATOM" not in pdb_string:
+            raise RuntimeError(
+                f"ESMFold API returned no structure: {pdb_string[:200]!r}"
+            )
+        return pdb_string
+
+    def _predict_windowed(self, sequence: str, name: str, **kwargs) -> Dict[str, Any]:
+        """Fold overlapping windows concurrently and stitch them into one model"""
+        overlap = kwargs.get("window_overlap", self.WINDOW_OVERLAP)
+        starts = window_starts(len(sequence), self.MAX_LENGTH, overlap)
+        windows = [sequence[s : s + self.MAX_LENGTH] for s in starts]
+
+        # Mixing models across windows would distort the overlaps
+        hedge = "esmfold" if kwargs.get("hedge") else None
+        fold = functools.partial(
+            self._fold_hedged, hedge=hedge, timeout=kwargs.get("timeout")
+        )
+        max_workers = min(kwargs.get("max_workers", self.MAX_WORKERS), len(windows))
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            segments = [pdb for pdb, _ in pool.map(fold, windows)]
 
+        pdb_string, overlap_rmsds = stitch_segments(segments, starts)
         return {
-            "structures": [
-                {
-                    "structure": response.content.decode("utf-8"),
-                    "source": kwargs.get("name", "esmfold_prediction"),
-                }
-            ],
+            "structures": [{"structure": pdb_string, "source": name}],
             "confidence_scores": [None],  # pLDDT available in B-factors
+            "params": {"window_size": self.MAX_LENGTH, "window_overlap": overlap},
+            "windows": [
+                {"start": s + 1, "end": s + len(w), "overlap_rmsd": r}
+                for s, w, r in zip(starts, windows, [None] + overlap_rmsds)
+            ],
         }
 
+    def _fold_hedged(
+        self, sequence: str, hedge: Optional[str] = None, timeout=None
+    ) -> Tuple[str, str]:
+        """Fold with the atlas, hedged with a second backend if requested
+
+        Returns:
+            (PDB string, backend that produced it)
+        """
+        fold = functools.partial(self._fold, sequence, timeout)
+        if not hedge or str(hedge).lower() in ("0", "false", "off", "none"):
+            return fold(), "esmfold"
+        hedge = str(hedge).lower()
+        if hedge not in self.HEDGE_BACKENDS:
+            hedge = "esmfold"  # e.g. hedge=1
+
+        if hedge == "esm3":
+
+            def secondary():
+                result = ESM3Predictor(workdir=self.workdir).predict(sequence)
+                return result.structures[0].text
+
+        else:
+            secondary = fold
+        return hedged_call(("esmfold", fold), (hedge, secondary))
+
 
 # class PyMolFoldPredictor(StructurePredictor):
 #     """Structure predictor using PyMolFold server"""
@@ -115,7 +269,7 @@ class ESMFoldPredictor(StructurePredictor):
 #         super().__init__(workdir)
 #         self.base_url = base_url.rstrip("/") + "/"
 
-#     def predict(self, sequence: str, **kwargs) -> Dict[str, Any]:
+#     def predict(self, sequence: str, **kwargs) -> PredictionResult:
 #         """Predict structure using PyMolFold server
 
 #         Args:
@@ -0,0 +1,421 @@
+"""Local CPU inference with the open ESM-3 weights.
+
+``ESM3LocalPredictor`` runs ``esm3-sm-open-v1`` in-process from a weights
+directory given by the user (the Hugging Face snapshot of
+``EvolutionaryScale/esm3-sm-open-v1``, or the folder holding its ``.pth``
+files), so nothing is downloaded and no request leaves the machine.
+
+Loading the model takes far longer than folding a peptide, so loaded models
+stay in ``MODEL_POOL`` across calls (least recently used first out, see
+``PYMOLFOLD_LOCAL_MODELS``). Each pooled model has one worker thread that runs
+its forward passes; sequences up to ``BATCH_MAX_LENGTH`` residues that arrive
+within ``BATCH_WINDOW`` seconds of each other are generated together in one
+``batch_generate`` call.
+"""
+
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from .base import StructurePredictor
+from .esm import _log_join
+from .result import PredictionResult, StructurePayload
+from ..singleflight import SINGLE_FLIGHT, request_key
+
+WEIGHTS_ENV = "PYMOLFOLD_ESM_WEIGHTS"
+MODEL_NAME = "esm3-sm-open-v1"
+WEIGHT_FILES = {
+    "model": "esm3_sm_open_v1.pth",
+    "encoder": "esm3_structure_encoder_v0.pth",
+    "decoder": "esm3_structure_decoder_v0.pth",
+    "function": "esm3_function_decoder_v0.pth",
+}
+MAX_MODELS = int(os.environ.get("PYMOLFOLD_LOCAL_MODELS", 1))
+BATCH_MAX_LENGTH = 128
+BATCH_SIZE = 8
+BATCH_WINDOW = 0.05
+# Seconds to wait for one generation before giving up
+GENERATION_TIMEOUT = float(os.environ.get("PYMOLFOLD_LOCAL_TIMEOUT", 1800))
+
+
+def resolve_weights(weights: Optional[Union[str, Path]] = None) -> Path:
+    """Directory holding the ESM-3 ``.pth`` files
+
+    Args:
+        weights: Snapshot or weights directory; defaults to the
+            ``PYMOLFOLD_ESM_WEIGHTS`` environment variable
+    """
+    weights = weights or os.environ.get(WEIGHTS_ENV)
+    if not weights:
+        raise RuntimeError(
+            f"No local ESM-3 weights given. Pass weights=... or set {WEIGHTS_ENV} "
+            "to a download of https://huggingface.co/EvolutionaryScale/esm3-sm-open-v1"
+        )
+    root = Path(weights).expanduser().resolve()
+    for candidate in (root / "data" / "weights", root):
+        if (candidate / WEIGHT_FILES["model"]).is_file():
+            missing = [
+                f for f in WEIGHT_FILES.values() if not (candidate / f).is_file()
+            ]
+            if missing:
+                raise FileNotFoundError(
+                    f"Missing ESM-3 weight files in {candidate}: {', '.join(missing)}"
+                )
+            return candidate
+    raise FileNotFoundError(f"{WEIGHT_FILES['model']} not found under {root}")
+
+
+def _load_module(build, path: Path, device):
+    import torch
+
+    with torch.device(device):
+        module = build().eval()
+    module.load_state_dict(torch.load(path, map_location=device))
+    return module
+
+
+def load_esm3(weights: Path, device: str = "cpu"):
+    """Build ``esm3-sm-open-v1`` from the files in ``weights``
+
+    Mirrors ``esm.pretrained.ESM3_sm_open_v0`` but reads the given directory
+    instead of resolving (and possibly downloading) the Hugging Face snapshot.
+    The structure and function decoders are loaded by ESM-3 on first use.
+    """
+    from esm.models.esm3 import ESM3
+    from esm.models.function_decoder import FunctionTokenDecoder
+    from esm.models.vqvae import StructureTokenDecoder, StructureTokenEncoder
+    from esm.tokenization import get_esm3_model_tokenizers
+    from esm.utils.constants.models import ESM3_OPEN_SMALL
+
+    def encoder(device):
+        return _load_module(
+            lambda: StructureTokenEncoder(
+                d_model=1024,
+                n_heads=1,
+                v_heads=128,
+                n_layers=2,
+                d_out=128,
+                n_codes=4096,
+            ),
+            weights / WEIGHT_FILES["encoder"],
+            device,
+        )
+
+    def decoder(device):
+        return _load_module(
+            lambda: StructureTokenDecoder(d_model=1280, n_heads=20, n_layers=30),
+            weights / WEIGHT_FILES["decoder"],
+            device,
+        )
+
+    def function_decoder(device):
+        return _load_module(
+            FunctionTokenDecoder, weights / WEIGHT_FILES["function"], device
+        )
+
+    return _load_module(
+        lambda: ESM3(
+            d_model=1536,
+            n_heads=24,
+            v_heads=256,
+            n_layers=48,
+            structure_encoder_fn=encoder,
+            structure_decoder_fn=decoder,
+            function_decoder_fn=function_decoder,
+            tokenizers=get_esm3_model_tokenizers(ESM3_OPEN_SMALL),
+        ),
+        weights / WEIGHT_FILES["model"],
+        device,
+    )
+
+
+class WorkerStopped(RuntimeError):
+    """The worker was stopped (e.g. evicted from the pool) and takes no requests"""
+
+
+class _Request:
+    __slots__ = ("sequence", "config", "future")
+
+    def __init__(self, sequence, config):
+        self.sequence = sequence
+        self.config = config
+        self.future: Future = Future()
+
+
+class ModelWorker:
+    """A loaded model and the thread running its (micro-batched) generations
+
+    Args:
+        model: ESM-3 model
+        batch_size: Most sequences generated in one forward pass
+        max_length: Only sequences up to this length are batched
+        window: Seconds to wait for more short sequences before running a batch
+    """
+
+    def __init__(
+        self,
+        model,
+        batch_size: int = BATCH_SIZE,
+        max_length: int = BATCH_MAX_LENGTH,
+        window: float = BATCH_WINDOW,
+    ):
+        self.model = model
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.window = window
+        self.batches = 0
+        self.generated = 0
+        self.last_used = time.monotonic()
+        self._stopped = False
+        self._state_lock = threading.Lock()
+        self._queue: "queue.Queue[Optional[_Request]]" = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._loop, name="pymolfold-esm3-local", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, sequence: str, config) -> Future:
+        """Queue a generation; the future resolves to an ``ESMProtein``
+
+        Raises:
+            WorkerStopped: After ``stop``; get a fresh worker from the pool
+        """
+        request = _Request(sequence, config)
+        # Requests queued behind the stop sentinel would never run
+        with self._state_lock:
+            if self._stopped:
+                raise WorkerStopped("The ESM-3 model was unloaded")
+            self.last_used = time.monotonic()
+            self._queue.put(request)
+        return request.future
+
+    def stop(self):
+        """Finish queued generations, then let the model be freed"""
+        with self._state_lock:
+            if self._stopped:
+                return
+            self._stopped = True
+            self._queue.put(None)
+
+    def _short(self, request: _Request) -> bool:
+        return len(request.sequence) <= self.max_length
+
+    def _loop(self):
+        pending: List[Optional[_Request]] = []
+        while True:
+            request = pending.pop() if pending else self._queue.get()
+            if request is None:
+                break
+            batch = [request]
+            if self._short(request):
+                deadline = time.monotonic() + self.window
+                while len(batch) < self.batch_size:
+                    try:
+                        nxt = self._queue.get(
+                            timeout=max(0.0, deadline - time.monotonic())
+                        )
+                    except queue.Empty:
+                        break
+                    if nxt is None or not self._short(nxt):
+                        pending.append(nxt)  # runs next, on its own
+                        break
+                    batch.append(nxt)
+            self._run(batch)
+        self.model = None
+
+    def _run(self, batch: List[_Request]):
+        from esm.sdk.api import ESMProtein, ESMProteinError
+
+        batch = [r for r in batch if r.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        try:
+            proteins = self.model.batch_generate(
+                [ESMProtein(sequence=r.sequence) for r in batch],
+                [r.config for r in batch],
+            )
+        except BaseException as e:
+            for request in batch:
+                request.future.set_exception(e)
+            return
+        self.batches += 1
+        self.generated += len(batch)
+        for request, protein in zip(batch, proteins):
+            if isinstance(protein, ESMProteinError):
+                request.future.set_exception(
+                    RuntimeError(f"ESM-3 generation failed: {protein.error_msg}")
+                )
+            else:
+                request.future.set_result(protein)
+
+
+class ModelPool:
+    """Loaded models kept warm across predictions, keyed by weights and device
+
+    Args:
+        max_models: Models kept loaded; the least recently used one is dropped
+            when another is loaded
+    """
+
+    def __init__(self, max_models: int = MAX_MODELS):
+        self.max_models = max(1, max_models)
+        self._lock = threading.Lock()
+        self._workers: "OrderedDict[tuple, ModelWorker]" = OrderedDict()
+        self._loading: Dict[tuple, threading.Lock] = {}
+
+    def get(self, weights: Path, device: str = "cpu") -> ModelWorker:
+        """Worker of the model in ``weights``, loading it on first use"""
+        key = (str(weights), device)
+        with self._lock:
+            worker = self._workers.get(key)
+            if worker is not None:
+                self._workers.move_to_end(key)
+                return worker
+            loading = self._loading.setdefault(key, threading.Lock())
+        # Load outside the pool lock; concurrent callers wait for one load
+        with loading:
+            with self._lock:
+                worker = self._workers.get(key)
+            if worker is None:
+                worker = ModelWorker(load_esm3(Path(weights), device))
+                with self._lock:
+                    self._workers[key] = worker
+                    self._loading.pop(key, None)
+                    while len(self._workers) > self.max_models:
+                        _, evicted = self._workers.popitem(last=False)
+                        evicted.stop()
+        return worker
+
+    def evict(self, weights: Optional[Path] = None):
+        """Unload the model in ``weights``, or every model"""
+        with self._lock:
+            for key in list(self._workers):
+                if weights is None or key[0] == str(weights):
+                    self._workers.pop(key).stop()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "weights": weights,
+                    "device": device,
+                    "batches": worker.batches,
+                    "generated": worker.generated,
+                    "idle": now - worker.last_used,
+                }
+                for (weights, device), worker in self._workers.items()
+            ]
+
+
+MODEL_POOL = ModelPool()
+
+
+class ESM3LocalPredictor(StructurePredictor):
+    """Structure predictor running the open ESM-3 model locally
+
+    Args:
+        weights: Directory with the ``esm3-sm-open-v1`` weights (defaults to
+            ``PYMOLFOLD_ESM_WEIGHTS``)
+        device: Torch device, 'cpu' unless a GPU is wanted explicitly
+        arrays: Batch whose arrays saved predictions are added to
+    """
+
+    def __init__(
+        self,
+        workdir: Optional[str] = None,
+        weights: Optional[Union[str, Path]] = None,
+        device: str = "cpu",
+        arrays: Optional[str] = None,
+    ):
+        super().__init__(workdir, arrays=arrays)
+        self.weights = resolve_weights(weights)
+        self.device = device
+
+    def predict(self, sequence: str, **kwargs) -> PredictionResult:
+        """Predict structure using the local ESM-3 model
+
+        Args:
+            sequence: Amino acid sequence
+            **kwargs:
+                temperature: Sampling temperature (default: 0.7)
+                num_steps: Number of steps (default: 8)
+                num_samples: Number of independent samples (default: 1)
+
+        Returns:
+            PredictionResult with the predicted structure(s)
+        """
+        key = request_key(
+            "esm3_local",
+            sequence,
+            weights=str(self.weights),
+            num_steps=kwargs.get("num_steps", 8),
+            temperature=kwargs.get("temperature", 0.7),
+            num_samples=max(1, int(kwargs.get("num_samples", 1))),
+        )
+        return SINGLE_FLIGHT.call(
+            key,
+            self._predict,
+            sequence,
+            on_join=lambda: _log_join("local ESM-3"),
+            **kwargs,
+        )
+
+    def _predict(self, sequence: str, **kwargs) -> PredictionResult:
+        from esm.sdk.api import GenerationConfig
+
+        num_steps = int(kwargs.get("num_steps", 8))
+        temperature = float(kwargs.get("temperature", 0.7))
+        num_samples = max(1, int(kwargs.get("num_samples", 1)))
+
+        start = time.perf_counter()
+        config = GenerationConfig(
+            track="structure", num_steps=num_steps, temperature=temperature
+        )
+        # Samples go through the worker as separate requests, so they share
+        # a forward pass with each other and with other short sequences
+        futures: List[Future] = []
+        while len(futures) < num_samples:
+            worker = MODEL_POOL.get(self.weights, self.device)
+            try:
+                while len(futures) < num_samples:
+                    futures.append(worker.submit(sequence, config))
+            except WorkerStopped:
+                continue  # evicted meanwhile; the pool loads the model again
+        structures, ptms = [], []
+        for future in futures:
+            try:
+                protein = future.result(timeout=GENERATION_TIMEOUT)
+            except FutureTimeout:
+                future.cancel()
+                raise RuntimeError(
+                    "Local ESM-3 generation took longer than "
+                    f"{GENERATION_TIMEOUT:.0f} s"
+                )
+            structures.append(
+                StructurePayload(
+                    protein.to_protein_chain().to_pdb_string(),
+                    source=kwargs.get("name", "esm3_local_prediction"),
+                )
+            )
+            ptms.append(None if protein.ptm is None else float(protein.ptm))
+
+        result = PredictionResult(
+            structures,
+            sequence=sequence,
+            params={
+                "model_name": MODEL_NAME,
+                "num_steps": num_steps,
+                "temperature": temperature,
+                "num_samples": num_samples,
+            },
+            elapsed=time.perf_counter() - start,
+        )
+        result["confidence_scores"] = ptms  # pLDDT in B-factors
+        return result
@@ -0,0 +1,334 @@
+"""Compact prediction results.
+
+Predictors used to return plain dictionaries holding every structure as a
+Python string and every confidence score as a list of floats. In batch runs
+these pile up until they are saved. ``PredictionResult`` keeps structures as
+raw bytes, spilled to a temporary file above ``SPILL_THRESHOLD`` bytes, and
+decodes them only when accessed; float confidence lists, nested ones such as
+PAE matrices included, are stored as ``float32`` arrays. Once saved, a
+structure refers to its output file and holds no data in memory at all.
+
+Both classes still behave like the dictionaries they replace (``result.get``,
+``result["structures"]``, ``struct["structure"]``), so callers need not care.
+"""
+
+import math
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+SPILL_THRESHOLD = int(os.environ.get("PYMOLFOLD_SPILL_BYTES", 4 * 1024 * 1024))
+# Coalesced requests (see pymolfold.singleflight) share payloads between callers
+_SAVE_LOCK = threading.Lock()
+
+
+def _unlink(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _compact_list(value: list) -> Optional[Union[array, list]]:
+    """float32 array of a float list, or a list of them for a rectangular
+    nested list (e.g. per-sample PAE matrices); None if ``value`` is neither
+    """
+    if value and all(isinstance(v, list) for v in value):
+        rows = [_compact_list(v) for v in value]
+        if None in rows or len({len(r) for r in rows}) > 1:
+            return None
+        return rows
+    if any(isinstance(v, float) for v in value) and all(
+        v is None or isinstance(v, float) for v in value
+    ):
+        return array("f", (math.nan if v is None else v for v in value))
+    return None
+
+
+def _compact(value: Any) -> Any:
+    """Store float lists (``None`` allowed) as float32 arrays, recursively
+
+    Nested lists become lists of arrays when every row is a float list of the
+    same length. Lists holding integers are left alone; float32 would round
+    large ones.
+    """
+    if isinstance(value, dict):
+        return {k: _compact(v) for k, v in value.items()}
+    if isinstance(value, list):
+        compact = _compact_list(value)
+        return value if compact is None else compact
+    return value
+
+
+def _expand(value: Any) -> Any:
+    """Inverse of ``_compact``: arrays become lists of floats (NaN -> None)"""
+    if isinstance(value, dict):
+        return {k: _expand(v) for k, v in value.items()}
+    if isinstance(value, array):
+        # float32 keeps ~7 significant digits; drop the widening noise
+        return [None if math.isnan(v) else float(f"{v:.7g}") for v in value]
+    if isinstance(value, list) and value and isinstance(value[0], (array, list)):
+        return [_expand(v) for v in value]
+    return value
+
+
+class StructurePayload:
+    """One predicted structure, kept as bytes in memory or in a file
+
+    Args:
+        data: Structure text or its encoded bytes
+        source: Name the structure came with (used as a fallback file name)
+        format: Format reported by the predictor, if any (e.g. 'mmcif')
+        spill_threshold: Payloads larger than this many bytes are written to a
+            temporary file instead of being held in memory
+    """
+
+    __slots__ = ("source", "format", "_data", "_path", "_finalizer", "__weakref__")
+
+    def __init__(
+        self,
+        data: Union[str, bytes],
+        source: Optional[str] = None,
+        format: Optional[str] = None,
+        spill_threshold: int = SPILL_THRESHOLD,
+    ):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.source = source
+        self.format = format
+        self._data: Optional[bytes] = data
+        self._path: Optional[Path] = None
+        self._finalizer = None
+        if spill_threshold is not None and len(data) > spill_threshold:
+            self._spill()
+
+    @classmethod
+    def from_file(
+        cls, path: Union[str, Path], source: Optional[str] = None, format=None
+    ) -> "StructurePayload":
+        """Payload backed by an existing file, which it does not own"""
+        payload = cls(b"", source=source, format=format, spill_threshold=None)
+        payload._data = None
+        payload._path = Path(path)
+        return payload
+
+    @classmethod
+    def from_spill(
+        cls, path: Union[str, Path], source: Optional[str] = None, format=None
+    ) -> "StructurePayload":
+        """Payload backed by a temporary file it owns (deleted unless saved)"""
+        payload = cls.from_file(path, source=source, format=format)
+        payload._finalizer = weakref.finalize(payload, _unlink, str(path))
+        return payload
+
+    def _spill(self):
+        suffix = ".cif" if self._data.startswith(b"data_") else ".pdb"
+        fd, tmp = tempfile.mkstemp(prefix="pymolfold_", suffix=suffix)
+        with os.fdopen(fd, "wb") as handle:
+            handle.write(self._data)
+        self._data = None
+        self._path = Path(tmp)
+        self._finalizer = weakref.finalize(self, _unlink, tmp)
+
+    @property
+    def path(self) -> Optional[Path]:
+        """File holding the payload, if it is not kept in memory"""
+        return self._path
+
+    @property
+    def size(self) -> int:
+        if self._data is not None:
+            return len(self._data)
+        return self._path.stat().st_size
+
+    @property
+    def is_mmcif(self) -> bool:
+        return self.head(5) == b"data_"
+
+    def head(self, n: int) -> bytes:
+        """First ``n`` bytes of the payload, without reading the rest"""
+        if self._data is not None:
+            return self._data[:n]
+        with open(self._path, "rb") as handle:
+            return handle.read(n)
+
+    def to_bytes(self) -> bytes:
+        if self._data is not None:
+            return self._data
+        return self._path.read_bytes()
+
+    @property
+    def text(self) -> str:
+        """The structure decoded as text (read from disk if spilled)"""
+        return self.to_bytes().decode("utf-8")
+
+    def save(self, path: Union[str, Path]) -> Path:
+        """Write the payload to ``path`` and keep only a reference to that file"""
+        path = Path(path)
+        with _SAVE_LOCK:
+            if self._data is not None:
+                path.write_bytes(self._data)
+            elif self._finalizer is not None and self._finalizer.detach():
+                # Our own spill file: move it instead of copying
+                try:
+                    os.replace(self._path, path)
+                except OSError:  # e.g. a different file system
+                    shutil.copyfile(self._path, path)
+                    _unlink(str(self._path))
+                self._finalizer = None
+            else:
+                shutil.copyfile(self._path, path)
+            self.release()
+            self._data = None
+            self._path = path
+        return path
+
+    def release(self):
+        """Delete the temporary spill file, if any"""
+        if self._finalizer is not None:
+            self._finalizer()
+            self._finalizer = None
+
+    # Dictionary interface of the former ``{"structure", "source"}`` dicts
+    def __getitem__(self, key: str):
+        if key == "structure":
+            return self.text
+        if key in ("source", "format") and getattr(self, key) is not None:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __contains__(self, key: str) -> bool:
+        if key == "structure":
+            return True
+        return key in ("source", "format") and getattr(self, key) is not None
+
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __repr__(self) -> str:
+        where = f"file={str(self._path)!r}" if self._data is None else "in memory"
+        return f"<StructurePayload {self.source!r}, {self.size} bytes, {where}>"
+
+
+class PredictionResult:
+    """Result of a structure prediction
+
+    Attributes:
+        structures: Predicted structures, best first if the predictor ranks them
+        sequence: The input sequence (chains separated by ':')
+        params: Parameters used for the prediction
+        elapsed: Wall-clock seconds spent predicting
+        scores: Numeric per-sample confidence fields as float32 arrays
+            (e.g. 'complex_plddt_scores', 'confidence_scores')
+        extra: Any other method-specific fields, with numeric lists compacted
+    """
+
+    __slots__ = ("structures", "sequence", "params", "elapsed", "scores", "extra")
+
+    _ATTRIBUTES = ("structures", "sequence", "params", "elapsed")
+
+    def __init__(
+        self,
+        structures: Optional[List[StructurePayload]] = None,
+        sequence: str = "",
+        params: Optional[Dict[str, Any]] = None,
+        elapsed: Optional[float] = None,
+    ):
+        self.structures: List[StructurePayload] = structures or []
+        self.sequence = sequence
+        self.params = params
+        self.elapsed = elapsed
+        self.scores: Dict[str, array] = {}
+        self.extra: Dict[str, Any] = {}
+
+    @classmethod
+    def from_dict(
+        cls, data: Dict[str, Any], spill_threshold: int = SPILL_THRESHOLD
+    ) -> "PredictionResult":
+        """Build a result from a predictor's response dictionary"""
+        if isinstance(data, PredictionResult):
+            return data
+        result = cls()
+        for key, value in data.items():
+            if key == "structures":
+                continue
+            result[key] = value
+        for struct in data.get("structures") or []:
+            if isinstance(struct, StructurePayload):
+                result.structures.append(struct)
+            elif struct.get("structure") is not None:
+                result.structures.append(
+                    StructurePayload(
+                        struct["structure"],
+                        source=struct.get("source"),
+                        format=struct.get("format"),
+                        spill_threshold=spill_threshold,
+                    )
+                )
+        return result
+
+    @property
+    def plddts(self) -> Optional[array]:
+        """Per-sample pLDDT reported by the predictor, if any"""
+        return self.scores.get("complex_plddt_scores")
+
+    def release(self):
+        """Delete temporary spill files of structures that were not saved"""
+        for struct in self.structures:
+            struct.release()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: self[key] for key in self.keys()}
+
+    # Dictionary interface of the former result dicts
+    def keys(self) -> List[str]:
+        return [*self._ATTRIBUTES, *self.scores, *self.extra]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def __getitem__(self, key: str):
+        if key in self._ATTRIBUTES:
+            return getattr(self, key)
+        if key in self.scores:
+            return _expand(self.scores[key])
+        if key in self.extra:
+            return _expand(self.extra[key])
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value: Any):
+        if key in self._ATTRIBUTES:
+            if key == "structures":
+                value = PredictionResult.from_dict({"structures": value}).structures
+            setattr(self, key, value)
+            return
+        self.scores.pop(key, None)
+        self.extra.pop(key, None)
+        value = _compact(value)
+        if isinstance(value, array):
+            self.scores[key] = value
+        else:
+            self.extra[key] = value
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._ATTRIBUTES or key in self.scores or key in self.extra
+
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __repr__(self) -> str:
+        return (
+            f"<PredictionResult {len(self.structures)} structure(s), "
+            f"fields={self.keys()}>"
+        )
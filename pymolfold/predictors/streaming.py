@@ -0,0 +1,213 @@
+"""Incremental decoding of large JSON prediction responses.
+
+A Boltz-2 response holds every diffusion sample as one mmCIF string under
+``structures[*].structure``. Reading it with ``response.json()`` buffers the
+whole body and then builds Python strings for all samples, so peak memory is a
+multiple of the payload. ``StructureStreamDecoder`` is fed the body chunk by
+chunk instead: structure strings are unescaped and written straight to files
+as they arrive, and only the remaining (small) JSON, i.e. confidences and
+affinities, is kept and parsed at the end.
+"""
+
+import codecs
+import json
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from .result import StructurePayload
+
+_SPECIAL = re.compile(r'[\[\]{}"]')
+_HIGH_SURROGATE = re.compile(r"\\u[dD][89abAB][0-9a-fA-F]{2}$")
+_WHITESPACE = " \t\r\n"
+PLACEHOLDER = "__pymolfold_stream__"
+
+
+def _string_end(buf: str, start: int, search_from: Optional[int] = None) -> int:
+    """Index of the quote closing a JSON string whose content starts at ``start``"""
+    i = buf.find('"', start if search_from is None else search_from)
+    while i != -1:
+        k = i - 1
+        while k >= start and buf[k] == "\\":
+            k -= 1
+        if (i - 1 - k) % 2 == 0:
+            return i
+        i = buf.find('"', i + 1)
+    return -1
+
+
+def _skip_whitespace(buf: str, i: int) -> int:
+    while i < len(buf) and buf[i] in _WHITESPACE:
+        i += 1
+    return i
+
+
+class StructureStreamDecoder:
+    """Decode a JSON body incrementally, writing structure strings to files
+
+    Args:
+        directory: Where structure files are written while streaming; use the
+            output directory so saving them later is a rename, not a copy
+        array_key: Key of the list holding structure entries
+        value_key: Key, inside each entry, of the structure string
+    """
+
+    def __init__(
+        self,
+        directory: Optional[Union[str, Path]] = None,
+        array_key: str = "structures",
+        value_key: str = "structure",
+    ):
+        self.directory = str(directory) if directory else None
+        self.array_key = array_key
+        self.value_key = value_key
+        self.bytes_in = 0
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._skeleton: List[str] = []
+        self._stack: List[tuple] = []  # (bracket, key the container belongs to)
+        self._key: Optional[str] = None
+        self._expect_stream = False
+        self._search_from: Optional[int] = None
+        self._out = None
+        self._paths: List[str] = []
+
+    def feed(self, chunk: bytes):
+        self.bytes_in += len(chunk)
+        self._buf += self._utf8.decode(chunk)
+        self._scan(final=False)
+
+    def close(self) -> Dict[str, Any]:
+        """Finish decoding and return the response
+
+        Streamed structure entries are returned as ``StructurePayload`` objects
+        that own their file until it is saved.
+        """
+        self._buf += self._utf8.decode(b"", final=True)
+        self._scan(final=True)
+        if self._out is not None or self._buf.strip():
+            self.discard()
+            raise ValueError("Truncated JSON response")
+        data = json.loads("".join(self._skeleton))
+        self._skeleton = []
+        entries = data.get(self.array_key) if isinstance(data, dict) else None
+        for i, entry in enumerate(entries or []):
+            value = entry.get(self.value_key) if isinstance(entry, dict) else None
+            if isinstance(value, dict) and PLACEHOLDER in value:
+                entries[i] = StructurePayload.from_spill(
+                    self._paths[value[PLACEHOLDER]],
+                    source=entry.get("source"),
+                    format=entry.get("format"),
+                )
+        self._paths = []
+        return data
+
+    def discard(self):
+        """Remove files written so far (after an error or cancellation)"""
+        if self._out is not None:
+            self._out.close()
+            self._out = None
+        for path in self._paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._paths = []
+
+    def _in_entry(self) -> bool:
+        return (
+            len(self._stack) >= 2
+            and self._stack[-1][0] == "{"
+            and self._stack[-2] == ("[", self.array_key)
+        )
+
+    def _scan(self, final: bool):
+        buf, pos = self._buf, 0
+        while True:
+            if self._out is not None:
+                pos, done = self._stream(buf, pos)
+                if not done:
+                    break
+                continue
+
+            match = _SPECIAL.search(buf, pos)
+            if match is None:
+                self._skeleton.append(buf[pos:])
+                pos = len(buf)
+                break
+            i, char = match.start(), match.group()
+            if char != '"':
+                self._expect_stream = False
+                self._skeleton.append(buf[pos : i + 1])
+                pos = i + 1
+                if char in "[{":
+                    self._stack.append((char, self._key))
+                    self._key = None
+                elif self._stack:
+                    self._stack.pop()
+                continue
+
+            if self._expect_stream:
+                # Opening quote of a structure string: stream it to a file
+                self._expect_stream = False
+                self._skeleton.append(buf[pos:i])
+                self._skeleton.append(json.dumps({PLACEHOLDER: len(self._paths)}))
+                self._open()
+                pos = i + 1
+                continue
+
+            end = _string_end(buf, i + 1, self._search_from)
+            after = _skip_whitespace(buf, end + 1) if end >= 0 else len(buf)
+            if end < 0 or (after == len(buf) and not final):
+                # Incomplete string, or we cannot tell yet whether it is a key
+                self._search_from = max(i + 1, len(buf) - 1) if end < 0 else end
+                self._skeleton.append(buf[pos:i])
+                pos = i
+                break
+            self._search_from = None
+            self._skeleton.append(buf[pos : end + 1])
+            if after < len(buf) and buf[after] == ":":
+                self._key = json.loads(buf[i : end + 1])
+                self._expect_stream = (
+                    self._key == self.value_key and self._in_entry()
+                )
+            pos = end + 1
+
+        self._buf = buf[pos:]
+        if self._search_from is not None:
+            self._search_from -= pos
+
+    def _stream(self, buf: str, pos: int):
+        """Write string content from ``pos``; True once the closing quote is seen"""
+        end = _string_end(buf, pos)
+        if end >= 0:
+            self._write(buf[pos:end])
+            self._out.close()
+            self._out = None
+            return end + 1, True
+        # Keep a trailing escape sequence (at most 12 chars for a surrogate
+        # pair) for the next chunk so it is never split
+        cut = len(buf)
+        k = buf.rfind("\\", max(pos, cut - 12))
+        if k != -1:
+            if _HIGH_SURROGATE.match(buf, max(pos, k - 6), k):
+                k -= 6
+            while k > pos and buf[k - 1] == "\\":
+                k -= 1
+            cut = k
+        self._write(buf[pos:cut])
+        return cut, False
+
+    def _open(self):
+        fd, path = tempfile.mkstemp(
+            prefix=".pymolfold_", suffix=".part", dir=self.directory
+        )
+        self._out = os.fdopen(fd, "wb")
+        self._paths.append(path)
+
+    def _write(self, escaped: str):
+        if escaped:
+            text = json.loads(f'"{escaped}"')
+            self._out.write(text.encode("utf-8", "surrogatepass"))
@@ -0,0 +1,153 @@
+"""Thread-safe mapping between PyMOL object names and the files they came from.
+
+The registry is written from PyMOL's command thread (through the wrapped
+``cmd.load``) and from the local server thread, so every access goes through
+a lock. It keeps a reverse index (file -> objects), is bounded in size with
+least-recently-updated eviction, and can be serialized into a PyMOL session.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+
+
+def _normalize(path) -> str:
+    path = str(path)
+    if "://" in path:
+        return path
+    return os.path.abspath(os.path.expanduser(path))
+
+
+class ObjectRegistry(MutableMapping):
+    """Bounded ``object name -> file path or URL`` map with reverse lookup"""
+
+    def __init__(self, max_entries: int = 50000):
+        self._lock = threading.RLock()
+        self._files: "OrderedDict[str, str]" = OrderedDict()
+        self._objects: Dict[str, Set[str]] = {}
+        self.max_entries = max_entries
+
+    # --- MutableMapping interface ---
+    def __getitem__(self, obj: str) -> str:
+        with self._lock:
+            return self._files[obj]
+
+    def __setitem__(self, obj: str, path: str):
+        path = _normalize(path)
+        with self._lock:
+            self._unlink(obj)
+            self._files[obj] = path
+            self._objects.setdefault(path, set()).add(obj)
+            while len(self._files) > self.max_entries:
+                self._unlink(next(iter(self._files)))
+
+    def __delitem__(self, obj: str):
+        with self._lock:
+            if obj not in self._files:
+                raise KeyError(obj)
+            self._unlink(obj)
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            return iter(list(self._files))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._files)
+
+    def __contains__(self, obj) -> bool:
+        with self._lock:
+            return obj in self._files
+
+    # --- Registry operations ---
+    def objects_for(self, path: str) -> List[str]:
+        """All objects loaded from ``path``"""
+        path = _normalize(path)
+        with self._lock:
+            return sorted(self._objects.get(path, ()))
+
+    def discard(self, obj: str):
+        """Forget ``obj`` if it is registered"""
+        with self._lock:
+            self._unlink(obj)
+
+    def rename(self, old: str, new: str):
+        """Move the entry of ``old`` to ``new`` (no-op if ``old`` is unknown)"""
+        with self._lock:
+            path = self._files.get(old)
+            if path is None:
+                return
+            self._unlink(old)
+            self[new] = path
+
+    def retain(self, existing: Iterable[str]):
+        """Drop every entry whose object is not in ``existing``"""
+        existing = set(existing)
+        with self._lock:
+            for obj in [o for o in self._files if o not in existing]:
+                self._unlink(obj)
+
+    def to_dict(self) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._files)
+
+    def update_from(self, entries: Optional[Dict[str, str]]):
+        """Merge ``object -> path`` entries, e.g. restored from a session"""
+        for obj, path in (entries or {}).items():
+            self[obj] = path
+
+    def _unlink(self, obj: str):
+        path = self._files.pop(obj, None)
+        if path is None:
+            return
+        objects = self._objects.get(path)
+        if objects is not None:
+            objects.discard(obj)
+            if not objects:
+                del self._objects[path]
+
+
+class ObjectNameSet:
+    """Thread-safe set of the object names currently present in PyMOL
+
+    Maintained incrementally by the wrapped load/delete/set_name commands so
+    that finding the objects created by a load does not require listing every
+    object in the session.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._names: Set[str] = set()
+
+    def __contains__(self, name) -> bool:
+        with self._lock:
+            return name in self._names
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._names)
+
+    def add(self, name: str):
+        with self._lock:
+            self._names.add(name)
+
+    def discard(self, name: str):
+        with self._lock:
+            self._names.discard(name)
+
+    def rename(self, old: str, new: str):
+        with self._lock:
+            self._names.discard(old)
+            self._names.add(new)
+
+    def reset(self, names: Iterable[str]):
+        """Replace the whole set, e.g. after a full scan of the session"""
+        names = set(names)
+        with self._lock:
+            self._names = names
+
+    def snapshot(self) -> Set[str]:
+        with self._lock:
+            return set(self._names)
@@ -0,0 +1,186 @@
+"""Priority scheduling of prediction jobs that share provider quotas.
+
+Every job asks the scheduler for a slot of its kind (provider) before it runs.
+Kinds have a concurrency limit; when a slot frees, the waiting job with the best
+effective priority gets it:
+
+* priority classes, best first: ``interactive`` (commands typed in PyMOL,
+  GUI submissions), ``batch`` (FASTA batches), ``prefetch`` (speculative work);
+* a class may occupy at most its share of a kind's slots, so a large batch
+  always leaves room for an interactive job;
+* aging: a job gains one class for every ``aging`` seconds it has waited, so
+  batch work keeps progressing while interactive jobs keep arriving.
+
+The scheduler is thread-safe and serves any number of event loops (the plugin's
+background loop and the local server's loop share it).
+"""
+
+import asyncio
+import contextlib
+import itertools
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+PRIORITIES = ("interactive", "batch", "prefetch")
+DEFAULT_SHARES = {"interactive": 1.0, "batch": 0.75, "prefetch": 0.25}
+DEFAULT_AGING = 60.0
+
+
+def check_priority(priority: Optional[str], default: str = "interactive") -> str:
+    """Validate a priority class name; empty means ``default``"""
+    priority = (priority or default).strip().lower()
+    if priority not in PRIORITIES:
+        raise ValueError(
+            f"Unknown priority '{priority}', expected one of {', '.join(PRIORITIES)}"
+        )
+    return priority
+
+
+class _Waiter:
+    __slots__ = ("kind", "priority", "tag", "enqueued", "seq", "loop", "future")
+
+    def __init__(self, kind, priority, tag, seq, loop):
+        self.kind = kind
+        self.priority = priority
+        self.tag = tag
+        self.enqueued = time.monotonic()
+        self.seq = seq
+        self.loop = loop
+        self.future = loop.create_future()
+
+
+class PriorityScheduler:
+    """Per-kind concurrency slots handed out by priority class with aging
+
+    Args:
+        default_limit: Slots of kinds without an explicit limit
+        shares: Fraction of a kind's slots each class may occupy at most
+        aging: Seconds of waiting that raise a job by one priority class
+    """
+
+    def __init__(
+        self,
+        default_limit: int = 64,
+        shares: Optional[Dict[str, float]] = None,
+        aging: float = DEFAULT_AGING,
+    ):
+        self.default_limit = default_limit
+        self.shares = dict(DEFAULT_SHARES, **(shares or {}))
+        self.aging = aging
+        self._lock = threading.Lock()
+        self._limits: Dict[str, int] = {}
+        self._waiting: Dict[str, List[_Waiter]] = defaultdict(list)
+        self._running: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: dict.fromkeys(PRIORITIES, 0)
+        )
+        self._seq = itertools.count()
+
+    def set_limit(self, kind: str, limit: int):
+        """Run at most ``limit`` jobs of ``kind`` at the same time"""
+        with self._lock:
+            self._limits[kind] = max(1, int(limit))
+            self._dispatch(kind)
+
+    def set_share(self, priority: str, share: float):
+        """Let ``priority`` jobs use at most this fraction of each kind's slots"""
+        with self._lock:
+            self.shares[check_priority(priority)] = min(1.0, max(0.0, float(share)))
+            for kind in list(self._waiting):
+                self._dispatch(kind)
+
+    def set_priority(self, tag: str, priority: str) -> bool:
+        """Change the class of a waiting job; False if it is not waiting"""
+        priority = check_priority(priority)
+        with self._lock:
+            for kind, waiters in self._waiting.items():
+                for waiter in waiters:
+                    if waiter.tag == tag:
+                        waiter.priority = priority
+                        self._dispatch(kind)
+                        return True
+        return False
+
+    def stats(self) -> Dict[str, Dict[str, Dict[str, int]]]:
+        """Running and waiting jobs per kind and class"""
+        with self._lock:
+            kinds = set(self._running) | set(self._waiting)
+            out = {}
+            for kind in sorted(kinds):
+                waiting = dict.fromkeys(PRIORITIES, 0)
+                for waiter in self._waiting.get(kind, []):
+                    waiting[waiter.priority] += 1
+                out[kind] = {"running": dict(self._running[kind]), "waiting": waiting}
+            return out
+
+    @contextlib.asynccontextmanager
+    async def slot(self, kind: str, priority: str = "interactive", tag: str = ""):
+        """Hold one of ``kind``'s slots for the duration of the block
+
+        Args:
+            kind: Job kind (provider), e.g. 'esmfold'
+            priority: 'interactive', 'batch' or 'prefetch'
+            tag: Identifier used by ``set_priority`` (usually the job id)
+        """
+        granted = await self._acquire(kind, check_priority(priority), tag)
+        try:
+            yield
+        finally:
+            self._release(kind, granted)
+
+    async def _acquire(self, kind: str, priority: str, tag: str) -> _Waiter:
+        waiter = _Waiter(
+            kind, priority, tag, next(self._seq), asyncio.get_running_loop()
+        )
+        with self._lock:
+            self._waiting[kind].append(waiter)
+            self._dispatch(kind)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiting[kind]:
+                    self._waiting[kind].remove(waiter)
+                    waiter = None
+            if waiter is not None:  # granted just before the cancellation
+                self._release(kind, waiter)
+            raise
+        return waiter
+
+    def _release(self, kind: str, waiter: _Waiter):
+        with self._lock:
+            self._running[kind][waiter.priority] -= 1
+            self._dispatch(kind)
+
+    def _cap(self, priority: str, limit: int) -> int:
+        return max(1, int(self.shares.get(priority, 1.0) * limit))
+
+    def _dispatch(self, kind: str):
+        # Called with the lock held
+        waiting = self._waiting.get(kind)
+        running = self._running[kind]
+        limit = self._limits.get(kind, self.default_limit)
+        while waiting and sum(running.values()) < limit:
+            now = time.monotonic()
+            best, best_score = None, None
+            for waiter in waiting:
+                if running[waiter.priority] >= self._cap(waiter.priority, limit):
+                    continue
+                rank = PRIORITIES.index(waiter.priority)
+                score = (rank - (now - waiter.enqueued) / self.aging, waiter.seq)
+                if best is None or score < best_score:
+                    best, best_score = waiter, score
+            if best is None:
+                return
+            waiting.remove(best)
+            running[best.priority] += 1
+            best.loop.call_soon_threadsafe(self._grant, best)
+
+    @staticmethod
+    def _grant(waiter: _Waiter):
+        if not waiter.future.done():
+            waiter.future.set_result(None)
+
+
+SCHEDULER = PriorityScheduler()
@@ -0,0 +1,374 @@
+"""Boltz-2 ligand screening: one protein target, many ligands.
+
+A screen computes the target's MSA once and then submits one Boltz-2 complex
+per ligand, with affinity prediction for the ligand. Ligand jobs run
+concurrently but each waits for a ``boltz2`` slot of the shared scheduler, so a
+screen respects the same provider limit as every other Boltz-2 job.
+
+Everything lives in ``screen_<name>/`` of the working directory:
+
+* ``msa.json``: the filtered target MSA, reused when the screen is resumed
+  with the same MSA depth
+* ``results.jsonl``: one line per finished ligand (the checkpoint); running the
+  same screen again only submits ligands without a successful line
+* ``ranked.csv``: every ligand ranked by predicted pIC50, then by binding
+  probability, with the complex pLDDT and structure paths
+"""
+
+import asyncio
+import csv
+import json
+import os
+import re
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from .chem import canonicalize_smiles
+from .scheduler import SCHEDULER
+
+CHECKPOINT_FILENAME = "results.jsonl"
+MSA_FILENAME = "msa.json"
+TABLE_FILENAME = "ranked.csv"
+TABLE_COLUMNS = (
+    "rank",
+    "ligand_id",
+    "kind",
+    "ligand",
+    "affinity_pic50",
+    "affinity_probability",
+    "complex_plddt",
+    "paths",
+    "status",
+    "error",
+)
+TARGET_CHAIN = "A"
+LIGAND_CHAIN = "B"
+_CCD_CODE = re.compile(r"^[A-Z0-9]{1,5}$")
+
+
+def _ligand_kind(value: str) -> Optional[str]:
+    """'smiles' or 'ccd' for an unprefixed library entry, None if neither"""
+    try:
+        if canonicalize_smiles(value):
+            return "smiles"
+    except ImportError:  # No RDKit to tell: anything but a code is a SMILES
+        return "ccd" if _CCD_CODE.match(value) else "smiles"
+    return "ccd" if _CCD_CODE.match(value) else None
+
+
+def _canonical(smiles: str) -> str:
+    try:
+        return canonicalize_smiles(smiles) or smiles
+    except ImportError:
+        return smiles
+
+
+def parse_ligand_library(value: str) -> List[Dict[str, str]]:
+    """Ligands from a library file or text, one per line
+
+    Each line holds a ligand and an optional name (whitespace, tab or comma
+    separated), as in ``.smi`` files. Prefix an entry with ``ccd:`` or
+    ``smiles:`` to force its kind; otherwise entries that parse as SMILES are
+    SMILES and short upper-case codes (e.g. ``ATP``) are CCD codes. Lines
+    starting with '#' are ignored.
+
+    Returns:
+        Dictionaries with 'id', 'kind' ('smiles' or 'ccd') and 'value'
+
+    Raises:
+        ValueError: For entries that are neither, or duplicate names
+    """
+    path = Path(value.strip()).expanduser()
+    try:
+        is_file = "\n" not in value and path.is_file()
+    except OSError:  # e.g. a long inline SMILES is not a valid file name
+        is_file = False
+    if is_file:
+        value = path.read_text()
+    ligands, seen = [], set()
+    for number, line in enumerate(value.splitlines(), start=1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        fields = line.replace(",", " ").split()
+        entry = fields[0]
+        prefix, _, rest = entry.partition(":")
+        if prefix.lower() in ("ccd", "smiles") and rest:
+            kind, entry = prefix.lower(), rest
+        else:
+            kind = _ligand_kind(entry)
+            if kind is None:
+                raise ValueError(f"Line {number}: not a SMILES or CCD code: {entry}")
+        if kind == "smiles":
+            entry = _canonical(entry)
+        else:
+            entry = entry.upper()
+        if len(fields) > 1:
+            ligand_id = re.sub(r"[^\w.-]", "_", fields[1])
+        else:
+            ligand_id = entry if kind == "ccd" else f"lig{len(ligands) + 1}"
+        if ligand_id in seen:
+            raise ValueError(f"Line {number}: duplicate ligand name {ligand_id}")
+        seen.add(ligand_id)
+        ligands.append({"id": ligand_id, "kind": kind, "value": entry})
+    return ligands
+
+
+def _first(values: Any) -> Optional[float]:
+    """First value of a per-sample list (or the value itself)"""
+    if isinstance(values, (list, tuple)):
+        values = next((v for v in values if v is not None), None)
+    return None if values is None else float(values)
+
+
+def rank_results(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Successful ligands by pIC50, then binding probability; failures last"""
+
+    def key(row):
+        pic50 = row.get("affinity_pic50")
+        probability = row.get("affinity_probability")
+        return (
+            row.get("status") != "ok",
+            pic50 is None,
+            -(pic50 or 0.0),
+            -(probability or 0.0),
+        )
+
+    ranked = sorted(results, key=key)
+    for rank, row in enumerate(ranked, start=1):
+        row["rank"] = rank
+    return ranked
+
+
+class LigandScreen:
+    """Screen a ligand library against one protein target with Boltz-2
+
+    Args:
+        predictor: ``Boltz2Predictor`` whose working directory holds the screen
+        target: Target protein sequence
+        ligands: Library entries, see ``parse_ligand_library``
+        name: Screen name; structures are saved as ``<name>_<ligand id>``
+        diffusion_samples: Boltz-2 samples per complex
+        msa_depth: Maximum target MSA depth (0 keeps the full MSA)
+        concurrency: Ligand jobs waiting for or holding a scheduler slot
+        priority: Scheduler class of the ligand jobs
+    """
+
+    def __init__(
+        self,
+        predictor,
+        target: str,
+        ligands: List[Dict[str, str]],
+        name: str = "screen",
+        diffusion_samples: int = 1,
+        msa_depth: Optional[int] = None,
+        concurrency: int = 4,
+        priority: str = "batch",
+    ):
+        self.predictor = predictor
+        self.target = target
+        self.ligands = ligands
+        self.name = name
+        self.diffusion_samples = int(diffusion_samples)
+        self.msa_depth = msa_depth
+        self.concurrency = max(1, int(concurrency))
+        self.priority = priority
+        self.directory = Path(predictor.workdir) / f"screen_{name}"
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.results: Dict[str, Dict[str, Any]] = self._load_checkpoint()
+
+    @property
+    def table_path(self) -> Path:
+        return self.directory / TABLE_FILENAME
+
+    def _load_checkpoint(self) -> Dict[str, Dict[str, Any]]:
+        results = {}
+        try:
+            with open(self.directory / CHECKPOINT_FILENAME) as handle:
+                for line in handle:
+                    try:
+                        row = json.loads(line)
+                    except ValueError:  # a line cut short by a crash
+                        continue
+                    results[row["ligand_id"]] = row
+        except OSError:
+            pass
+        return results
+
+    def _checkpoint(self, row: Dict[str, Any]):
+        with self._lock:
+            self.results[row["ligand_id"]] = row
+            with open(self.directory / CHECKPOINT_FILENAME, "a") as handle:
+                handle.write(json.dumps(row) + "\n")
+                handle.flush()
+                os.fsync(handle.fileno())
+            self._write_table()
+
+    def _result(self, ligand: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        """Checkpointed result of ``ligand``, unless its name was reused"""
+        row = self.results.get(ligand["id"])
+        if row is None or row.get("ligand") != ligand["value"]:
+            return None
+        return row
+
+    def _ranked(self) -> List[Dict[str, Any]]:
+        # Called with the lock held; results of ligands no longer in the
+        # library (e.g. an earlier run of a larger screen) are left out
+        rows = [self._result(ligand) for ligand in self.ligands]
+        return rank_results([dict(row) for row in rows if row is not None])
+
+    def _write_table(self):
+        # Called with the lock held
+        ranked = self._ranked()
+        fd, tmp = tempfile.mkstemp(dir=str(self.directory), suffix=".tmp")
+        with os.fdopen(fd, "w", newline="") as handle:
+            writer = csv.DictWriter(
+                handle, fieldnames=TABLE_COLUMNS, extrasaction="ignore"
+            )
+            writer.writeheader()
+            for row in ranked:
+                writer.writerow(dict(row, paths=";".join(row.get("paths") or [])))
+        os.replace(tmp, self.table_path)
+
+    def pending(self) -> List[Dict[str, str]]:
+        """Ligands without a successful result in the checkpoint"""
+        with self._lock:
+            return [
+                ligand
+                for ligand in self.ligands
+                if (self._result(ligand) or {}).get("status") != "ok"
+            ]
+
+    async def target_msa(self, progress=None) -> Dict[str, Any]:
+        """The filtered target MSA, searched once and kept with the screen"""
+        path = self.directory / MSA_FILENAME
+        try:
+            cached = json.loads(path.read_text())
+            if (
+                cached.get("sequence") == self.target
+                and cached.get("msa_depth") == self.msa_depth
+            ):
+                return cached["msa"]
+        except (OSError, ValueError):
+            pass
+        if progress:
+            progress("msa", "Searching the target MSA (once for all ligands)")
+        msa = await self.predictor.get_filtered_msa(
+            self.target, max_depth=self.msa_depth, progress=progress
+        )
+        path.write_text(
+            json.dumps(
+                {"sequence": self.target, "msa_depth": self.msa_depth, "msa": msa}
+            )
+        )
+        return msa
+
+    def complex_json(self, ligand: Dict[str, str], msa: Dict[str, Any]):
+        return {
+            "polymers": [
+                {
+                    "id": TARGET_CHAIN,
+                    "molecule_type": "protein",
+                    "sequence": self.target,
+                    "cyclic": False,
+                    "modifications": [],
+                    "msa": msa,
+                }
+            ],
+            "ligands": [
+                {
+                    ligand["kind"]: ligand["value"],
+                    "id": LIGAND_CHAIN,
+                    "predict_affinity": True,
+                }
+            ],
+        }
+
+    async def _screen_one(self, ligand, msa, gate: asyncio.Semaphore, tag: str):
+        row = {
+            "ligand_id": ligand["id"],
+            "kind": ligand["kind"],
+            "ligand": ligand["value"],
+        }
+        async with gate:
+            try:
+                async with SCHEDULER.slot("boltz2", self.priority, tag=tag):
+                    result = await self.predictor.predict(
+                        self.complex_json(ligand, msa),
+                        diffusion_samples=self.diffusion_samples,
+                    )
+                paths = self.predictor.save_structures(
+                    result, f"{self.name}_{ligand['id']}"
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                row.update(status="failed", error=str(getattr(e, "detail", e)))
+                self._checkpoint(row)
+                return row
+        affinity = (result.get("affinities") or {}).get(LIGAND_CHAIN) or {}
+        plddts = [v for v in result.get("complex_plddt_scores") or [] if v is not None]
+        row.update(
+            status="ok",
+            affinity_pic50=_first(affinity.get("affinity_pic50")),
+            affinity_probability=_first(affinity.get("affinity_probability_binary")),
+            complex_plddt=max(plddts) if plddts else None,
+            paths=[str(p) for p in paths],
+        )
+        self._checkpoint(row)
+        return row
+
+    async def run(
+        self, progress: Optional[Callable[[str, str], None]] = None
+    ) -> List[Dict[str, Any]]:
+        """Screen every pending ligand and return all results, ranked"""
+        todo = self.pending()
+        done = len(self.ligands) - len(todo)
+        if todo:
+            msa = await self.target_msa(progress)
+            gate = asyncio.Semaphore(self.concurrency)
+            tasks = [
+                asyncio.ensure_future(
+                    self._screen_one(ligand, msa, gate, f"{self.name}:{ligand['id']}")
+                )
+                for ligand in todo
+            ]
+            try:
+                for task in asyncio.as_completed(tasks):
+                    row = await task
+                    done += 1
+                    if progress:
+                        progress(
+                            "predicting",
+                            f"{done}/{len(self.ligands)} ligands ({row['ligand_id']}: "
+                            f"{row['status']})",
+                        )
+            finally:
+                for task in tasks:
+                    task.cancel()
+        with self._lock:
+            self._write_table()
+            return self._ranked()
+
+
+def format_table(rows: List[Dict[str, Any]], limit: Optional[int] = None) -> str:
+    """Plain-text ranking for the PyMOL console"""
+
+    def number(value, digits):
+        return "-" if value is None else f"{value:.{digits}f}"
+
+    lines = [f"{'rank':>4}  {'ligand':<20}  {'pIC50':>6}  {'P(bind)':>7}  pLDDT"]
+    for row in rows[:limit]:
+        if row.get("status") != "ok":
+            lines.append(f"{row['rank']:>4}  {row['ligand_id']:<20}  failed")
+            continue
+        lines.append(
+            f"{row['rank']:>4}  {row['ligand_id'][:20]:<20}  "
+            f"{number(row.get('affinity_pic50'), 2):>6}  "
+            f"{number(row.get('affinity_probability'), 2):>7}  "
+            f"{number(row.get('complex_plddt'), 2)}"
+        )
+    return "\n".join(lines)
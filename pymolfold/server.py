@@ -4,14 +4,26 @@ This module intentionally avoids importing Flask at import time so the package
 doesn't hard-require Flask for users who don't use the web UI. If Flask is
 available it will provide a /run_boltz2 endpoint that forwards parameters to a
 registered handler (the plugin's query_boltz2 function).
+
+Besides the blocking ``/run_*`` endpoints, every prediction can be submitted as
+a background job through ``/jobs/<kind>``; the call returns a job id at once and
+progress is polled from ``/jobs``. All of them wait for a slot of the shared
+priority scheduler, so they compete fairly with jobs started from PyMOL.
 """
 
+import asyncio
+import functools
 import uvicorn
 from fastapi import FastAPI, HTTPException
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from pydantic import BaseModel
 from .predictors import Boltz2Predictor, ESMFoldPredictor, ESM3Predictor
 from . import utils
+from .arraystore import get_array_store, list_batches
+from .catalog import get_catalog
+from .jobs import JOBS
+from .scheduler import SCHEDULER, check_priority
+from .screening import LigandScreen, parse_ligand_library
 from pymol import cmd as pymol_cmd
 
 
@@ -22,49 +34,216 @@ class Payload(BaseModel):
 class EsmFoldPayload(BaseModel):
     sequence: str
     name: Optional[str] = None
+    priority: str = "interactive"
+    hedge: Optional[str] = None
 
 
 class Esm3Payload(BaseModel):
     sequence: str
     name: Optional[str] = None
     num_samples: int = 1
+    multistate: bool = True
+    priority: str = "interactive"
+
+
+class ScreenPayload(BaseModel):
+    target: str
+    ligands: str
+    name: str = "screen"
+    diffusion_samples: int = 1
+    msa_depth: Optional[int] = None
+    concurrency: int = 4
+    priority: str = "batch"
+
+
+class PriorityPayload(BaseModel):
+    priority: str
 
 
 # --- FastAPI Server Application ---
 app = FastAPI()
 server_instance = None
+# Strong references to running job tasks so they are not garbage collected
+_job_tasks = set()
 
 
-@app.post("/run_esmfold")
-async def run_esmfold_prediction(payload: EsmFoldPayload):
-    """Endpoint to receive data from Streamlit for ESMFold."""
-    try:
-        sequence = utils.clean_sequence(payload.sequence)
-        name = payload.name or (sequence[:3] + sequence[-3:])
+def _workdir() -> str:
+    """Working directory selected in the plugin (set_workdir)."""
+    from . import plugin
 
-        predictor = ESMFoldPredictor()
-        result = predictor.predict(sequence, name=name)
-        saved_files = predictor.save_structures(result, name)
+    return plugin.ABS_PATH
 
-        if not saved_files:
-            return {"status": "warning", "message": "No structures were generated."}
 
+def _print_plddt(file_path):
+    try:
+        pdb_string = file_path.read_text()
+        plddt = utils.cal_plddt(pdb_string)
+        print(f"Structure saved in {file_path}.")
+        print("=" * 40)
+        print(f"    pLDDT: {plddt: .2f}")
+        print("=" * 40)
+    except Exception:
+        print("Could not calculate pLDDT score")
+
+
+async def _esmfold(payload: EsmFoldPayload, progress=None) -> Dict[str, Any]:
+    sequence = utils.clean_sequence(payload.sequence)
+    name = payload.name or (sequence[:3] + sequence[-3:])
+
+    if progress:
+        progress("predicting", "Folding with ESMFold")
+    predictor = ESMFoldPredictor(workdir=_workdir())
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(
+        None,
+        functools.partial(predictor.predict, sequence, name=name, hedge=payload.hedge),
+    )
+    if progress:
+        progress("saving", "Saving structures")
+    saved_files = predictor.save_structures(result, name)
+
+    if not saved_files:
+        return {"status": "warning", "message": "No structures were generated."}
+
+    for file_path in saved_files:
+        pymol_cmd.load(str(file_path))
+        _print_plddt(file_path)
+
+    return {
+        "status": "success",
+        "message": f"Loaded {len(saved_files)} files into PyMOL.",
+        "files": [str(p) for p in saved_files],
+    }
+
+
+async def _esm3(payload: Esm3Payload, progress=None) -> Dict[str, Any]:
+    sequence = utils.clean_sequence(payload.sequence)
+    name = payload.name or (sequence[:3] + sequence[-3:])
+
+    if progress:
+        progress("predicting", "Generating with ESM-3")
+    predictor = ESM3Predictor(workdir=_workdir())
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(
+        None,
+        functools.partial(
+            predictor.predict,
+            sequence,
+            name=name,
+            num_steps=8,  # Default, can be exposed in UI later
+            temperature=0.7,  # Default
+            num_samples=payload.num_samples,
+        ),
+    )
+    if progress:
+        progress("saving", "Saving structures")
+    saved_files = predictor.save_structures(result, name)
+
+    if not saved_files:
+        return {"status": "warning", "message": "No structures were generated."}
+
+    if payload.multistate and len(saved_files) > 1:
+        utils.load_samples(saved_files, name)
+        print(f'Loaded {len(saved_files)} samples as states of "{name}".')
+    else:
         for file_path in saved_files:
             pymol_cmd.load(str(file_path))
-            try:
-                pdb_string = file_path.read_text()
-                plddt = utils.cal_plddt(pdb_string)
-                print(f"Structure saved in {file_path}.")
-                print("=" * 40)
-                print(f"    pLDDT: {plddt: .2f}")
-                print("=" * 40)
-            except Exception:
-                print("Could not calculate pLDDT score")
-
-        return {
-            "status": "success",
-            "message": f"Loaded {len(saved_files)} files into PyMOL.",
-        }
+    for file_path in saved_files:
+        _print_plddt(file_path)
+
+    return {
+        "status": "success",
+        "message": f"Loaded {len(saved_files)} files into PyMOL.",
+        "files": [str(p) for p in saved_files],
+    }
+
+
+async def _boltz2(payload: Payload, progress=None) -> Dict[str, Any]:
+    predictor = Boltz2Predictor(workdir=_workdir())
+    boltz_json, name, affinity_target_id, diffusion_samples = (
+        await predictor.convert_to_boltz_json(payload.sub_data, progress=progress)
+    )
+
+    loader = {
+        "multistate": bool(payload.sub_data.get("multistate", True)),
+        "affinity_target_id": affinity_target_id,
+    }
+    result = await predictor.predict(
+        boltz_json,
+        diffusion_samples=diffusion_samples,
+        progress=progress,
+        pending={"name": name, "workdir": str(_workdir()), "loader": loader},
+    )
+    if progress:
+        progress("saving", "Saving structures")
+    saved_files = predictor.save_structures(result, name)
+
+    if not saved_files:
+        return {"status": "warning", "message": "No structures were generated."}
+
+    plddts = result.get("complex_plddt_scores", [])
+    affinity = (
+        result.get("affinities", {}).get(affinity_target_id, {})
+        if affinity_target_id
+        else {}
+    )
+
+    def per_sample(key, i):
+        values = affinity.get(key) or [None]
+        return values[i] if i < len(values) else values[0]
+
+    multistate = payload.sub_data.get("multistate", True) and len(saved_files) > 1
+    if multistate:
+        state_properties = [
+            {
+                "affinity_pic50": per_sample("affinity_pic50", i),
+                "affinity_probability": per_sample("affinity_probability_binary", i),
+            }
+            for i in range(len(saved_files))
+        ]
+        utils.load_samples(
+            saved_files,
+            name,
+            plddts=plddts or None,
+            state_properties=state_properties,
+        )
+        print(f'Loaded {len(saved_files)} samples as states of "{name}".')
+
+    for i, file_path in enumerate(saved_files):
+        if not multistate:
+            pymol_cmd.load(str(file_path))
+        plddt = plddts[i]
+        affinity_pic50 = per_sample("affinity_pic50", i)
+        print(f"Structure saved in {file_path}.")
+        print("=" * 40)
+        print(f"    pLDDT: {plddt: .2f}")
+        print("=" * 40)
+        if affinity_target_id:
+            print(f"    pic50 with {affinity_target_id}: {affinity_pic50: .3f}")
+            print("=" * 40)
+
+    return {
+        "status": "success",
+        "message": f"Loaded {len(saved_files)} files into PyMOL.",
+        "files": [str(p) for p in saved_files],
+    }
+
+
+def _priority(value: Optional[str], default: str = "interactive") -> str:
+    """Validated priority class; an unknown class is a 422 for the client"""
+    try:
+        return check_priority(value, default=default)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+@app.post("/run_esmfold")
+async def run_esmfold_prediction(payload: EsmFoldPayload):
+    """Endpoint to receive data from Streamlit for ESMFold."""
+    priority = _priority(payload.priority)
+    try:
+        async with SCHEDULER.slot("esmfold", priority):
+            return await _esmfold(payload)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -72,41 +251,10 @@ async def run_esmfold_prediction(payload: EsmFoldPayload):
 @app.post("/run_esm3")
 async def run_esm3_prediction(payload: Esm3Payload):
     """Endpoint to receive data from Streamlit for ESM-3."""
+    priority = _priority(payload.priority)
     try:
-        sequence = utils.clean_sequence(payload.sequence)
-        name = payload.name or (sequence[:3] + sequence[-3:])
-
-        predictor = ESM3Predictor()
-        # Note: ESM-3 SDK might not support multiple samples directly in one call.
-        # We loop here to simulate it if needed, but the current SDK generates one structure.
-        # The `num_samples` is handled by the predictor's internal logic if supported.
-        result = predictor.predict(
-            sequence,
-            name=name,
-            num_steps=8,  # Default, can be exposed in UI later
-            temperature=0.7,  # Default
-        )
-        saved_files = predictor.save_structures(result, name)
-
-        if not saved_files:
-            return {"status": "warning", "message": "No structures were generated."}
-
-        for file_path in saved_files:
-            pymol_cmd.load(str(file_path))
-            try:
-                pdb_string = file_path.read_text()
-                plddt = utils.cal_plddt(pdb_string)
-                print(f"Structure saved in {file_path}.")
-                print("=" * 40)
-                print(f"    pLDDT: {plddt: .2f}")
-                print("=" * 40)
-            except Exception:
-                print("Could not calculate pLDDT score")
-
-        return {
-            "status": "success",
-            "message": f"Loaded {len(saved_files)} files into PyMOL.",
-        }
+        async with SCHEDULER.slot("esm3", priority):
+            return await _esm3(payload)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -114,46 +262,198 @@ async def run_esm3_prediction(payload: Esm3Payload):
 @app.post("/run_boltz2")
 async def run_boltz2_prediction(payload: Payload):
     """Endpoint to receive data from Streamlit, run prediction, and load into PyMOL."""
+    priority = _priority(payload.sub_data.get("priority", ""))
     try:
-        predictor = Boltz2Predictor()
-        boltz_json, name, affinity_target_id, diffusion_samples = (
-            await predictor.convert_to_boltz_json(payload.sub_data)
+        async with SCHEDULER.slot("boltz2", priority):
+            return await _boltz2(payload)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# --- Background jobs ---
+def _submit_job(
+    kind: str, name: str, runner, payload, priority: Optional[str] = None
+) -> Dict[str, Any]:
+    """Start ``runner(payload, progress)`` as a background task and return its id."""
+    priority = _priority(priority)
+    job = JOBS.create(kind, name, priority=priority)
+    progress = JOBS.progress_callback(job.id)
+
+    async def execute():
+        try:
+            async with SCHEDULER.slot(kind, job.priority, tag=job.id):
+                progress("running", "Started")
+                response = await runner(payload, progress=progress)
+            JOBS.finish(job.id, result=response, message=response.get("message", ""))
+        except asyncio.CancelledError:
+            JOBS.cancel(job.id)
+        except Exception as e:
+            JOBS.fail(job.id, str(getattr(e, "detail", e)))
+
+    task = asyncio.get_running_loop().create_task(execute())
+    _job_tasks.add(task)
+    task.add_done_callback(_job_tasks.discard)
+    return {"status": "queued", "job_id": job.id}
+
+
+@app.post("/jobs/esmfold")
+async def submit_esmfold_job(payload: EsmFoldPayload):
+    """Queue an ESMFold prediction and return its job id immediately."""
+    return _submit_job(
+        "esmfold", payload.name or "esmfold", _esmfold, payload, payload.priority
+    )
+
+
+@app.post("/jobs/esm3")
+async def submit_esm3_job(payload: Esm3Payload):
+    """Queue an ESM-3 prediction and return its job id immediately."""
+    return _submit_job("esm3", payload.name or "esm3", _esm3, payload, payload.priority)
+
+
+@app.post("/jobs/boltz2")
+async def submit_boltz2_job(payload: Payload):
+    """Queue a Boltz-2 prediction and return its job id immediately."""
+    name = payload.sub_data.get("name") or "boltz2"
+    priority = payload.sub_data.get("priority")
+    return _submit_job("boltz2", name, _boltz2, payload, priority)
+
+
+async def _screen(
+    payload: ScreenPayload,
+    target: str,
+    ligands: List[Dict[str, str]],
+    priority: str,
+    progress=None,
+) -> Dict[str, Any]:
+    screen = LigandScreen(
+        Boltz2Predictor(workdir=_workdir()),
+        target,
+        ligands,
+        name=payload.name,
+        diffusion_samples=payload.diffusion_samples,
+        msa_depth=payload.msa_depth,
+        concurrency=payload.concurrency,
+        priority=priority,
+    )
+    rows = await screen.run(progress)
+    return {
+        "status": "success",
+        "message": f"Screened {len(rows)} ligands, ranking in {screen.table_path}",
+        "table": str(screen.table_path),
+        "results": rows,
+    }
+
+
+@app.post("/jobs/screen")
+async def submit_screen_job(payload: ScreenPayload):
+    """Queue a Boltz-2 ligand screen and return its job id immediately."""
+    # Invalid input is a 422 for the client, not a job failing in the queue
+    target = utils.clean_sequence(payload.target)
+    if not target:
+        raise HTTPException(status_code=422, detail="Empty target sequence")
+    try:
+        ligands = parse_ligand_library(payload.ligands)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    priority = _priority(payload.priority, default="batch")
+    runner = functools.partial(
+        _screen, target=target, ligands=ligands, priority=priority
+    )
+    return _submit_job("screen", payload.name, runner, payload, priority)
+
+
+@app.get("/jobs")
+async def list_jobs(ids: Optional[str] = None) -> List[Dict[str, Any]]:
+    """List jobs (optionally a comma-separated subset) with elapsed time and ETA."""
+    selected = [i for i in ids.split(",") if i] if ids else None
+    return JOBS.snapshot(selected)
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Return the state of one job."""
+    job = JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job.to_dict(eta=JOBS.eta(job))
+
+
+@app.post("/jobs/{job_id}/priority")
+async def set_job_priority(job_id: str, payload: PriorityPayload):
+    """Move a queued job to another priority class (interactive, batch, prefetch)."""
+    priority = _priority(payload.priority)
+    if not SCHEDULER.set_priority(job_id, priority):
+        raise HTTPException(
+            status_code=409, detail=f"Job {job_id} is not waiting for a slot"
         )
+    JOBS.set_priority(job_id, priority)
+    return JOBS.get(job_id).to_dict(eta=JOBS.eta(JOBS.get(job_id)))
 
-        result = await predictor.predict(
-            boltz_json, diffusion_samples=diffusion_samples
-        )  # Assuming predict is now async
-        saved_files = predictor.save_structures(result, name)
 
-        if not saved_files:
-            return {"status": "warning", "message": "No structures were generated."}
+@app.get("/scheduler")
+async def scheduler_stats() -> Dict[str, Any]:
+    """Running and waiting jobs per provider and priority class."""
+    return SCHEDULER.stats()
 
-        # Load into PyMOL from the main thread
-        for i, file_path in enumerate(saved_files):
-            pymol_cmd.load(str(file_path))
-            plddt = result.get("complex_plddt_scores", [])[i]
-            affinity_pic50 = (
-                result.get("affinities", {})
-                .get(affinity_target_id, {})
-                .get("affinity_pic50", [])[0]
-                if affinity_target_id
-                else None
-            )
-            print(f"Structure saved in {file_path}.")
-            print("=" * 40)
-            print(f"    pLDDT: {plddt: .2f}")
-            print("=" * 40)
-            if affinity_target_id:
-                print(f"    pic50 with {affinity_target_id}: {affinity_pic50: .3f}")
-                print("=" * 40)
 
-        return {
-            "status": "success",
-            "message": f"Loaded {len(saved_files)} files into PyMOL.",
-        }
+@app.get("/catalog")
+async def search_catalog(
+    query: str = "",
+    predictor: str = "",
+    min_plddt: Optional[float] = None,
+    limit: int = 50,
+) -> List[Dict[str, Any]]:
+    """Search the prediction catalog of the plugin's working directory."""
+    return get_catalog(_workdir()).find(
+        query=query, predictor=predictor, min_plddt=min_plddt, limit=limit
+    )
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+
+def _array_store(batch: str):
+    if batch not in list_batches(_workdir()):
+        raise HTTPException(status_code=404, detail=f"No arrays for batch: {batch}")
+    return get_array_store(_workdir(), batch)
+
+
+@app.get("/arrays")
+async def list_array_batches() -> List[Dict[str, Any]]:
+    """Batches with memory-mapped arrays in the plugin's working directory."""
+    return [
+        {"batch": batch, "models": len(get_array_store(_workdir(), batch))}
+        for batch in list_batches(_workdir())
+    ]
+
+
+@app.get("/arrays/{batch}")
+async def array_index(
+    batch: str, name: str = "", limit: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """Index rows of a batch's arrays (name wildcards allowed)."""
+    return _array_store(batch).rows(name=name, limit=limit)
+
+
+@app.get("/arrays/{batch}/plddt")
+async def array_plddt(batch: str, ids: str) -> Dict[str, List[float]]:
+    """Per-residue pLDDT of the given (comma-separated) models."""
+    store = _array_store(batch)
+    try:
+        return {i: store.plddt(int(i)).tolist() for i in ids.split(",") if i}
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=f"Unknown model: {e}")
+
+
+@app.get("/arrays/{batch}/{model_id}/{matrix}")
+async def array_matrix(batch: str, model_id: int, matrix: str) -> List[List[float]]:
+    """PAE or PDE matrix of one model."""
+    if matrix not in ("pae", "pde"):
+        raise HTTPException(status_code=404, detail=f"Unknown matrix: {matrix}")
+    try:
+        values = getattr(_array_store(batch), matrix)(model_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown model: {model_id}")
+    if values is None:
+        raise HTTPException(status_code=404, detail=f"No {matrix} for {model_id}")
+    return values.astype(float).tolist()
 
 
 @app.post("/shutdown")
@@ -0,0 +1,151 @@
+"""Coalescing of identical in-flight requests ("single flight").
+
+The Streamlit app, the Qt dialog and scripts may all submit the same sequence
+with the same parameters at once, e.g. when several people share one server.
+Requests are keyed by their normalized input and parameters; while one is in
+flight, identical requests attach to it instead of starting another remote job
+and receive the same result, or the same exception.
+
+Callers may live on different event loops (the FastAPI server, the plugin's
+background loop) or in worker threads, so the shared state is a thread-safe
+``concurrent.futures.Future``. A coalesced coroutine is cancelled only once
+every caller waiting for it has been cancelled.
+"""
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .pending import payload_hash
+
+
+def normalize_sequence(sequence: str) -> str:
+    return "".join(sequence.split()).upper()
+
+
+def request_key(kind: str, sequence: str = "", **params) -> str:
+    """Key identifying a request by its kind, normalized sequence and parameters"""
+    return payload_hash(
+        {"kind": kind, "sequence": normalize_sequence(sequence), "params": params}
+    )
+
+
+class _Flight:
+    __slots__ = ("future", "waiters", "task", "loop")
+
+    def __init__(self):
+        self.future: Future = Future()
+        self.waiters = 1
+        self.task: Optional[asyncio.Task] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+class SingleFlight:
+    """Registry of in-flight calls by key"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[str, _Flight] = {}
+        self.coalesced = 0
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._flights)
+
+    def _join(self, key: str) -> Tuple[_Flight, bool]:
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.waiters += 1
+                self.coalesced += 1
+                return flight, False
+            flight = self._flights[key] = _Flight()
+            return flight, True
+
+    def _forget(self, key: str, flight: _Flight):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    async def run(
+        self,
+        key: str,
+        fn: Callable,
+        *args,
+        on_join: Optional[Callable[[], Any]] = None,
+        **kwargs,
+    ) -> Any:
+        """Await ``fn(*args, **kwargs)``, or the identical call already in flight
+
+        Args:
+            key: Request key, see ``request_key``
+            fn: Coroutine function doing the actual work
+            on_join: Called when attaching to a call started by someone else
+        """
+        flight, leader = self._join(key)
+        if leader:
+            flight.loop = asyncio.get_running_loop()
+            flight.task = flight.loop.create_task(fn(*args, **kwargs))
+            flight.task.add_done_callback(functools.partial(self._settle, key, flight))
+        elif on_join is not None:
+            on_join()
+
+        try:
+            # Shielded: one caller being cancelled must not cancel the others
+            return await asyncio.shield(asyncio.wrap_future(flight.future))
+        except asyncio.CancelledError:
+            if not flight.future.done():
+                self._leave(key, flight)
+            raise
+
+    def _leave(self, key: str, flight: _Flight):
+        with self._lock:
+            flight.waiters -= 1
+            last = flight.waiters == 0
+            if last and self._flights.get(key) is flight:
+                # New callers start afresh instead of joining a cancelled call
+                del self._flights[key]
+        if last and flight.task is not None:
+            flight.loop.call_soon_threadsafe(flight.task.cancel)
+
+    def _settle(self, key: str, flight: _Flight, task: asyncio.Task):
+        self._forget(key, flight)
+        if task.cancelled():
+            flight.future.cancel()
+        elif task.exception() is not None:
+            flight.future.set_exception(task.exception())
+        else:
+            flight.future.set_result(task.result())
+
+    def call(
+        self,
+        key: str,
+        fn: Callable,
+        *args,
+        on_join: Optional[Callable[[], Any]] = None,
+        **kwargs,
+    ) -> Any:
+        """Blocking counterpart of ``run`` for synchronous work
+
+        The first caller runs ``fn`` in its own thread; identical calls made
+        meanwhile block until it returns and share its result.
+        """
+        flight, leader = self._join(key)
+        if not leader:
+            if on_join is not None:
+                on_join()
+            return flight.future.result()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._forget(key, flight)
+            flight.future.set_exception(e)
+            raise
+        self._forget(key, flight)
+        flight.future.set_result(result)
+        return result
+
+
+SINGLE_FLIGHT = SingleFlight()
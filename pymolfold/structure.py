@@ -0,0 +1,146 @@
+"""Minimal PDB coordinate handling and superposition helpers"""
+
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+
+class PDBResidues:
+    """ATOM records of a single-chain PDB string grouped by residue number"""
+
+    def __init__(self, pdb_string: str):
+        self.residues: Dict[int, List[str]] = {}
+        for line in pdb_string.splitlines():
+            if not line.startswith("ATOM"):
+                continue
+            try:
+                resseq = int(line[22:26])
+            except ValueError:
+                continue
+            self.residues.setdefault(resseq, []).append(line)
+
+    def ca_coords(self, resseqs: Sequence[int]) -> np.ndarray:
+        """Coordinates of the CA atoms of the given residues (N x 3)"""
+        coords = []
+        for resseq in resseqs:
+            for line in self.residues.get(resseq, []):
+                if line[12:16].strip() == "CA":
+                    coords.append(_line_coords(line))
+                    break
+            else:
+                raise KeyError(f"No CA atom for residue {resseq}")
+        return np.array(coords, dtype=float)
+
+
+def _line_coords(line: str) -> Tuple[float, float, float]:
+    return float(line[30:38]), float(line[38:46]), float(line[46:54])
+
+
+def kabsch(mobile: np.ndarray, target: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Optimal rigid transform superposing ``mobile`` onto ``target``
+
+    Args:
+        mobile: N x 3 coordinates to move
+        target: N x 3 reference coordinates
+
+    Returns:
+        (rotation, translation) such that ``mobile @ rotation.T + translation``
+        is the superposed copy of ``mobile``
+    """
+    mobile_center = mobile.mean(axis=0)
+    target_center = target.mean(axis=0)
+    h = (mobile - mobile_center).T @ (target - target_center)
+    u, _, vt = np.linalg.svd(h)
+    d = np.sign(np.linalg.det(vt.T @ u.T))
+    rotation = vt.T @ np.diag([1.0, 1.0, d]) @ u.T
+    translation = target_center - mobile_center @ rotation.T
+    return rotation, translation
+
+
+def rmsd(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.sqrt(((a - b) ** 2).sum(axis=1).mean()))
+
+
+def stitch_segments(
+    segments: Sequence[str], starts: Sequence[int], chain_id: str = "A"
+) -> Tuple[str, List[float]]:
+    """Stitch overlapping single-chain PDB segments into one model
+
+    Every segment is superposed onto the already assembled model using the CA
+    atoms of the residues both share, and the overlap is split at its midpoint
+    so each half comes from the segment whose window center is closer. B-factors
+    (per-residue pLDDT) are kept from the segment a residue is taken from.
+
+    Args:
+        segments: PDB strings, each numbered from residue 1
+        starts: 0-based offset of each segment in the full sequence
+        chain_id: Chain identifier for the output model
+
+    Returns:
+        (PDB string of the stitched model, CA RMSD of each overlap after superposition)
+    """
+    assembled: Dict[int, List[Tuple[str, np.ndarray]]] = {}
+    overlap_rmsds = []
+    previous_end = None
+
+    for segment, start in zip(segments, starts):
+        residues = PDBResidues(segment)
+        local = sorted(residues.residues)
+        rotation, translation = np.eye(3), np.zeros(3)
+
+        if previous_end is not None:
+            shared = [r for r in local if start + r <= previous_end]
+            if len(shared) < 3:
+                raise ValueError("Segments must overlap by at least three residues")
+            target = np.array(
+                [
+                    coords
+                    for r in shared
+                    for line, coords in assembled[start + r]
+                    if line[12:16].strip() == "CA"
+                ]
+            )
+            mobile = residues.ca_coords(shared)
+            rotation, translation = kabsch(mobile, target)
+            overlap_rmsds.append(rmsd(mobile @ rotation.T + translation, target))
+            # Residues past the midpoint of the overlap come from this segment
+            split = start + shared[len(shared) // 2]
+        else:
+            split = None
+
+        for r in local:
+            global_resseq = start + r
+            if split is not None and global_resseq < split:
+                continue
+            lines = residues.residues[r]
+            coords = np.array([_line_coords(line) for line in lines])
+            coords = coords @ rotation.T + translation
+            assembled[global_resseq] = list(zip(lines, coords))
+        previous_end = start + local[-1]
+
+    out = []
+    serial = 1
+    for resseq in sorted(assembled):
+        for line, (x, y, z) in assembled[resseq]:
+            line = line.ljust(80)
+            out.append(
+                f"{line[:6]}{serial:5d}{line[11:21]}{chain_id}{resseq:4d}{line[26:30]}"
+                f"{x:8.3f}{y:8.3f}{z:8.3f}{line[54:]}".rstrip()
+            )
+            serial += 1
+    last = out[-1]
+    out.append(f"TER   {serial:5d}      {last[17:20]} {chain_id}{last[22:26]}")
+    out.append("END")
+    return "\n".join(out) + "\n", overlap_rmsds
+
+
+def window_starts(length: int, window: int, overlap: int) -> List[int]:
+    """Start offsets of overlapping windows covering a sequence of ``length``"""
+    if overlap >= window:
+        raise ValueError("Window overlap must be smaller than the window size")
+    if length <= window:
+        return [0]
+    step = window - overlap
+    starts = list(range(0, length - window, step))
+    starts.append(length - window)
+    return starts
@@ -5,7 +5,7 @@ import json
 from pathlib import Path
 import subprocess
 import sys
-from typing import Union, Dict, Any
+from typing import Union, Dict, Any, List, Optional, Sequence, Tuple
 from pymol import cmd as pymol_cmd
 
 
@@ -121,6 +121,68 @@ def color_plddt(selection="all"):
     pymol_cmd.bg_color("white")
 
 
+def load_samples(
+    files: Sequence[Union[str, Path]],
+    name: str,
+    plddts: Optional[Sequence[Optional[float]]] = None,
+    state_properties: Optional[Sequence[Dict[str, Any]]] = None,
+) -> List[int]:
+    """Load prediction samples as the states of a single object
+
+    Samples are ordered by confidence (highest pLDDT first), so state 1 is the
+    best model. Each state keeps its pLDDT, source file and any extra values
+    as PyMOL properties (``pf_plddt``, ``pf_source``, ``pf_<key>``).
+
+    Args:
+        files: Structure files of the samples, all of the same system
+        name: Object name
+        plddts: Mean pLDDT of each sample; computed from B-factors if omitted
+        state_properties: Extra per-sample properties, e.g. affinity values
+
+    Returns:
+        Sample indices in state order
+    """
+    files = [Path(f) for f in files]
+    if plddts is None:
+        plddts = [
+            cal_plddt(f.read_text()) if f.suffix.lower() == ".pdb" else None
+            for f in files
+        ]
+    order = sorted(
+        range(len(files)),
+        key=lambda i: -plddts[i] if plddts[i] is not None else float("inf"),
+    )
+
+    for state, i in enumerate(order, start=1):
+        pymol_cmd.load(str(files[i]), name, state=state)
+        properties = {"plddt": plddts[i], "source": str(files[i])}
+        if state_properties:
+            properties.update(state_properties[i])
+        for key, value in properties.items():
+            if value is not None:
+                pymol_cmd.set_property(f"pf_{key}", value, name, state=state)
+    return order
+
+
+def split_state(obj: str, state: int = 1, name: str = ""):
+    """
+    DESCRIPTION
+    Copy one state of a multi-state prediction into its own object,
+    keeping its pf_* properties.
+
+    USAGE
+    pf_split_state obj [, state [, name]]
+    """
+    state = int(state)
+    name = name or f"{obj}_s{state}"
+    pymol_cmd.create(name, obj, state, 1)
+    for key in pymol_cmd.get_property_list(obj, state) or []:
+        if key.startswith("pf_"):
+            value = pymol_cmd.get_property(key, obj, state)
+            pymol_cmd.set_property(key, value, name, state=1)
+    return name
+
+
 def clean_sequence(sequence: str) -> str:
     """Clean amino acid sequence string
 
@@ -139,6 +201,65 @@ def clean_sequence(sequence: str) -> str:
     return sequence
 
 
+FASTA_SUFFIXES = (".fa", ".fasta", ".faa", ".fas")
+
+
+def parse_fasta(text: str) -> List[Tuple[str, str]]:
+    """Parse FASTA text into ``(identifier, sequence)`` records
+
+    The identifier is the first word of the header, made safe for file and
+    object names and unique within the file. Records without a header line or
+    with an empty sequence are skipped.
+    """
+    records = []
+    header, chunks = None, []
+    for line in text.splitlines() + [">"]:
+        line = line.strip()
+        if line.startswith(">"):
+            if header is not None:
+                records.append((header, clean_sequence("".join(chunks))))
+            header, chunks = line[1:].strip(), []
+        elif header is not None:
+            chunks.append(line)
+
+    out, seen = [], {}
+    for i, (header, sequence) in enumerate(records, start=1):
+        if not sequence:
+            continue
+        words = header.split()
+        ident = re.sub(r"[^\w.-]", "_", words[0]) if words else f"seq{i}"
+        seen[ident] = seen.get(ident, 0) + 1
+        if seen[ident] > 1:
+            ident = f"{ident}_{seen[ident]}"
+        out.append((ident, sequence))
+    return out
+
+
+def read_fasta_input(value: str) -> Optional[List[Tuple[str, str]]]:
+    """FASTA records from FASTA text or the path of a FASTA file
+
+    Returns None for a plain sequence, so callers can treat it as one input.
+
+    Raises:
+        FileNotFoundError: If ``value`` names a FASTA file that does not exist
+        OSError: If the FASTA file cannot be read
+    """
+    value = (value or "").strip()
+    if ">" not in value and "\n" not in value:
+        path = Path(value).expanduser()
+        try:
+            is_file = path.is_file()
+        except OSError:  # e.g. a long sequence is not a valid file name
+            is_file = False
+        if is_file:
+            value = path.read_text()
+        elif path.suffix.lower() in FASTA_SUFFIXES:
+            raise FileNotFoundError(f"FASTA file not found: {path}")
+    if ">" not in value:
+        return None
+    return parse_fasta(value)
+
+
 def safe_filename(name: str) -> str:
     """Convert string to safe filename
 